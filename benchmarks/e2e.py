@@ -0,0 +1,131 @@
+"""
+Run the full runner pipeline with the fake clang-tidy and idf.py under "benchmarks/fake", and report the throughput
+and the tail latency. Runs offline, clang-tidy and ESP-IDF are not required.
+
+    python -m benchmarks.e2e --projects 4 --sources 250 --jobs 8 --latency pareto:0.02,2.5
+
+The fake tools are configured by the PYCLANG_FAKE_* environment variables, see "benchmarks/fake/_common.py".
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import typing as t
+
+from pyclang import Runner
+
+FAKE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake')
+
+
+def percentile(values: t.List[float], ratio: float) -> float:
+    """
+    :param values: sorted values
+    """
+    if not values:
+        return 0.0
+
+    return values[max(math.ceil(ratio * len(values)) - 1, 0)]
+
+
+def run(dirs: t.List[str], work_dir: str, jobs: int, use_run_clang_tidy: bool, **kwargs: t.Any) -> float:
+    """
+    :return: seconds the pipeline takes
+    """
+    runner = Runner(
+        dirs,
+        cores=jobs,
+        log_path=os.path.join(work_dir, 'logs'),
+        base_dir=work_dir,
+        filter_summary=True,
+        idf_py=os.path.join(FAKE_DIR, 'idf.py'),
+        clang_tidy=os.path.join(FAKE_DIR, 'clang-tidy'),
+        run_clang_tidy_py=os.path.join(FAKE_DIR, 'run-clang-tidy') if use_run_clang_tidy else None,
+        duration_history=os.path.join(work_dir, 'durations.json'),
+        **kwargs,
+    )
+    runner.idf_reconfigure().remove_command_flags().filter_cmd().run_clang_tidy().postprocess()
+
+    start = time.perf_counter()
+    runner()
+    return time.perf_counter() - start
+
+
+def read_latencies(dirs: t.List[str]) -> t.Tuple[t.List[float], int]:
+    """
+    :return: sorted elapsed seconds of the analysed files, and the number of the failed ones
+    """
+    latencies = []
+    failures = 0
+    for folder in dirs:
+        with open(os.path.join(folder, Runner.TIMINGS_FILENAME)) as fr:
+            for tu in json.load(fr)['translation_units']:
+                if 'elapsed' in tu:
+                    latencies.append(tu['elapsed'])
+                    failures += bool(tu['failure'] or tu['returncode'] not in (0, 1))
+
+    return sorted(latencies), failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--projects', type=int, default=2, help='number of the projects')
+    parser.add_argument('--sources', type=int, default=200, help='number of the source files of each project')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='number of the clang-tidy workers')
+    parser.add_argument('--latency', help='latency distribution of each file, PYCLANG_FAKE_LATENCY')
+    parser.add_argument('--crash-rate', type=float, help='ratio of the crashing files, PYCLANG_FAKE_CRASH_RATE')
+    parser.add_argument('--hang-rate', type=float, help='ratio of the hanging files, PYCLANG_FAKE_HANG_RATE')
+    parser.add_argument('--tu-timeout', type=float, help='timeout of each file, required to recover from the hangs')
+    parser.add_argument('--seed', type=int, help='seed of the fake tools, PYCLANG_FAKE_SEED')
+    parser.add_argument('--run-clang-tidy', action='store_true', help='run the fake run-clang-tidy in each project')
+    parser.add_argument('--progress', action='store_true', help='show the progress instead of logging every file')
+    parser.add_argument('--work-dir', help='where the projects are created, a temporary dir if not specified')
+    args = parser.parse_args()
+
+    for name, value in (
+        ('PYCLANG_FAKE_LATENCY', args.latency),
+        ('PYCLANG_FAKE_CRASH_RATE', args.crash_rate),
+        ('PYCLANG_FAKE_HANG_RATE', args.hang_rate),
+        ('PYCLANG_FAKE_SEED', args.seed),
+    ):
+        if value is not None:
+            os.environ[name] = str(value)
+    os.environ['PYCLANG_FAKE_SOURCES'] = str(args.sources)
+
+    if args.hang_rate and not args.tu_timeout:
+        parser.error('--hang-rate requires --tu-timeout')
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='pyclang-e2e-')
+    try:
+        dirs = [os.path.join(work_dir, f'project_{i}') for i in range(args.projects)]
+        for folder in dirs + [os.path.join(work_dir, 'logs')]:
+            os.makedirs(folder, exist_ok=True)
+
+        seconds = run(dirs, work_dir, args.jobs, args.run_clang_tidy, tu_timeout=args.tu_timeout, progress=args.progress)
+        if args.run_clang_tidy:
+            # run-clang-tidy doesn't record the resources of each file
+            print(f'{args.projects * args.sources} files in {seconds:.2f}s')
+            return 0
+
+        latencies, failures = read_latencies(dirs)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f'{len(latencies)} files in {seconds:.2f}s, {len(latencies) / seconds:.1f} files/s, {failures} failed')
+    print(
+        'latency: '
+        + ', '.join(f'p{int(ratio * 100)} {percentile(latencies, ratio):.3f}s' for ratio in (0.5, 0.9, 0.99))
+        + f', max {percentile(latencies, 1):.3f}s'
+    )
+    # time not spent in clang-tidy: scheduling, reconfigure, filtering, postprocessing
+    print(f'overhead: {max(seconds - sum(latencies) / args.jobs, 0):.2f}s over the ideal {args.jobs} workers schedule')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Shared behavior of the fake tools, configured by environment variables:
+
+- PYCLANG_FAKE_LATENCY: latency of each file, "const:SECONDS", "uniform:MIN,MAX", "lognormal:MU,SIGMA"
+  or "pareto:SCALE,ALPHA" (heavy tail). Default "lognormal:-3,0.5", about 50ms
+- PYCLANG_FAKE_DIAGNOSTICS: average number of diagnostics in each file, 0 for none. Default 3
+- PYCLANG_FAKE_HEADER_DIAGNOSTICS: number of diagnostics in the shared headers reported by each file. Default 2
+- PYCLANG_FAKE_CRASH_RATE: ratio of the files crashing clang-tidy. Default 0
+- PYCLANG_FAKE_HANG_RATE: ratio of the files hanging clang-tidy until it's killed. Default 0
+- PYCLANG_FAKE_COLOR: "0" to disable the colored output. Default "1"
+- PYCLANG_FAKE_SEED: seed of the random numbers, the same file gets the same result with the same seed. Default 0
+- PYCLANG_FAKE_SOURCES: number of the source files "idf.py reconfigure" creates if the project has none. Default 100
+- PYCLANG_FAKE_RECONFIGURE_LATENCY: seconds "idf.py reconfigure" takes. Default 0
+"""
+import hashlib
+import json
+import os
+import random
+import signal
+import sys
+import time
+
+import typing as t
+
+VERSION = 'fake LLVM version 17.0.1'
+
+CHECKS = [
+    'bugprone-narrowing-conversions',
+    'bugprone-branch-clone',
+    'readability-else-after-return',
+    'performance-no-int-to-ptr',
+    'clang-analyzer-core.NullDereference',
+    'clang-analyzer-unix.Malloc',
+]
+
+BOLD = '\x1b[1m'
+MAGENTA = '\x1b[0;1;35m'
+GREEN = '\x1b[0;1;32m'
+RESET = '\x1b[0m'
+
+
+def get_call_cmd(filepath: str) -> t.List[str]:
+    """
+    The fake tools are python scripts without the ".py" suffix, call them with the interpreter
+    """
+    try:
+        with open(filepath, 'rb') as fr:
+            first_line = fr.readline(128)
+    except OSError:
+        return [filepath]
+
+    return [sys.executable, filepath] if first_line.startswith(b'#!') and b'python' in first_line else [filepath]
+
+
+def getenv_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def get_rng(*keys: str) -> random.Random:
+    """
+    Random numbers depending on the seed and the keys only, so the runs are reproducible
+    """
+    h = hashlib.sha256(os.getenv('PYCLANG_FAKE_SEED', '0').encode())
+    for key in keys:
+        h.update(key.encode() + b'\0')
+    return random.Random(int.from_bytes(h.digest()[:8], 'little'))
+
+
+def sample_latency(rng: random.Random) -> float:
+    kind, _, params = os.getenv('PYCLANG_FAKE_LATENCY', 'lognormal:-3,0.5').partition(':')
+    values = [float(v) for v in params.split(',') if v]
+    if kind == 'const':
+        return values[0]
+    if kind == 'uniform':
+        return rng.uniform(values[0], values[1])
+    if kind == 'lognormal':
+        return rng.lognormvariate(values[0], values[1])
+    if kind == 'pareto':
+        return values[0] * rng.paretovariate(values[1])
+
+    raise ValueError(f'Unknown latency distribution "{kind}"')
+
+
+def format_diagnostic(path: str, line: int, col: int, message: str, check: str, color: bool) -> str:
+    code = f'  int value_{line} = compute(value_{line - 1}, {col});'
+    caret = ' ' * (col + 1) + '^'
+    if color:
+        return (
+            f'{BOLD}{path}:{line}:{col}: {RESET}{MAGENTA}warning: {RESET}{BOLD}{message} [{check}]{RESET}\n'
+            f'{code}\n{GREEN}{caret}{RESET}\n'
+        )
+
+    return f'{path}:{line}:{col}: warning: {message} [{check}]\n{code}\n{caret}\n'
+
+
+def get_diagnostics(file: str, color: bool) -> t.List[str]:
+    """
+    Diagnostics of the file, and the ones in the shared headers under the current dir, which are reported
+    by many files like the real ones
+    """
+    rng = get_rng('diagnostics', file)
+    res = []
+    average = getenv_float('PYCLANG_FAKE_DIAGNOSTICS', 3)
+    for _ in range(int(rng.expovariate(1 / average)) if average > 0 else 0):
+        res.append(
+            format_diagnostic(
+                file,
+                rng.randint(1, 500),
+                rng.randint(1, 40),
+                f'fake issue {rng.randint(0, 100)}',
+                rng.choice(CHECKS),
+                color,
+            )
+        )
+
+    for _ in range(int(getenv_float('PYCLANG_FAKE_HEADER_DIAGNOSTICS', 2))):
+        index = rng.randint(0, 19)
+        header_rng = get_rng('header', str(index))
+        res.append(
+            format_diagnostic(
+                os.path.join(os.getcwd(), 'include', f'fake_{index}.h'),
+                header_rng.randint(1, 100),
+                header_rng.randint(1, 40),
+                f'fake header issue {index}',
+                header_rng.choice(CHECKS),
+                color,
+            )
+        )
+
+    return res
+
+
+def analyse(file: str, profile_dir: t.Optional[str] = None) -> int:
+    """
+    Act like clang-tidy on the file: sleep, then print the diagnostics, or crash, or hang
+
+    :return: exit code, 0 with warnings like the real clang-tidy
+    """
+    rng = get_rng('run', file)
+    time.sleep(sample_latency(rng))
+
+    if rng.random() < getenv_float('PYCLANG_FAKE_HANG_RATE', 0):
+        while True:
+            time.sleep(3600)
+
+    if rng.random() < getenv_float('PYCLANG_FAKE_CRASH_RATE', 0):
+        sys.stderr.write(f'Stack dump:\n0.\tProgram arguments: clang-tidy {file}\nSegmentation fault\n')
+        sys.stderr.flush()
+        os.kill(os.getpid(), getattr(signal, 'SIGSEGV', signal.SIGTERM))
+        return 139
+
+    diagnostics = get_diagnostics(file, os.getenv('PYCLANG_FAKE_COLOR', '1') != '0')
+    sys.stdout.write(''.join(diagnostics))
+    if diagnostics:
+        sys.stderr.write(f'{len(diagnostics)} warnings generated.\n')
+
+    if profile_dir:
+        with open(os.path.join(profile_dir, f'{time.time():.6f}-{os.path.basename(file)}.json'), 'w') as fw:
+            json.dump(
+                {
+                    'file': file,
+                    'profile': {f'time.clang-tidy.{check}.wall': rng.uniform(0, 0.01) for check in CHECKS},
+                },
+                fw,
+            )
+
+    return 0
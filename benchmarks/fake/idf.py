@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Fake idf.py, accepting the same global arguments, only "reconfigure" does something: writes the compile commands
+of the C/C++ files of the project, like the ones generated by ESP-IDF. If the project has no source files,
+PYCLANG_FAKE_SOURCES files are created under "main/" first. See "_common.py" for the configurations
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from _common import getenv_float
+
+SOURCE_SUFFIXES = ('.c', '.cpp', '.cc')
+COMPILER = '/opt/xtensa-esp-elf/bin/xtensa-esp32-elf-gcc'
+FLAGS = (
+    '-mlongcalls -ffunction-sections -fdata-sections -Wall -Werror=all -fstrict-volatile-bitfields '
+    '-fno-tree-switch-conversion -Og -ggdb -std=gnu17 -DESP_PLATFORM -D_GNU_SOURCE'
+)
+
+
+def create_sources(project_dir: str, count: int) -> None:
+    os.makedirs(os.path.join(project_dir, 'main'), exist_ok=True)
+    for i in range(count):
+        with open(os.path.join(project_dir, 'main', f'file_{i}.c'), 'w') as fw:
+            # various sizes, the runner estimates the durations by them before they are recorded
+            fw.write('#include "fake.h"\n\n')
+            fw.write(''.join(f'int func_{i}_{j}(int v) {{ return v + {j}; }}\n' for j in range(1 + i % 50)))
+
+
+def find_sources(project_dir: str, build_dir: str) -> list:
+    res = []
+    for root, dirs, files in os.walk(project_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and os.path.join(root, d) != build_dir)
+        res.extend(os.path.join(root, f) for f in sorted(files) if f.endswith(SOURCE_SUFFIXES))
+
+    return res
+
+
+def reconfigure(project_dir: str, build_dir: str) -> None:
+    time.sleep(getenv_float('PYCLANG_FAKE_RECONFIGURE_LATENCY', 0))
+
+    sources = find_sources(project_dir, build_dir)
+    if not sources:
+        create_sources(project_dir, int(getenv_float('PYCLANG_FAKE_SOURCES', 100)))
+        sources = find_sources(project_dir, build_dir)
+
+    os.makedirs(build_dir, exist_ok=True)
+    include_flags = f'-I{project_dir}/include -I{project_dir}/main -I{build_dir}/config'
+    commands = [
+        {
+            'directory': build_dir,
+            'command': f'{COMPILER} {include_flags} {FLAGS} -o {os.path.relpath(f, project_dir)}.obj -c {f}',
+            'file': f,
+            'output': f'{os.path.relpath(f, project_dir)}.obj',
+        }
+        for f in sources
+    ]
+    with open(os.path.join(build_dir, 'compile_commands.json'), 'w') as fw:
+        json.dump(commands, fw, indent=2)
+
+    # the inputs triggering a CMake re-run, like the ninja generator writes
+    cmake_inputs = [p for p in ('CMakeLists.txt', 'main/CMakeLists.txt') if os.path.isfile(os.path.join(project_dir, p))]
+    with open(os.path.join(build_dir, 'build.ninja'), 'w') as fw:
+        fw.write('build build.ninja: RERUN_CMAKE |')
+        fw.write(''.join(f' {os.path.relpath(os.path.join(project_dir, p), build_dir)}' for p in cmake_inputs))
+        fw.write('\n')
+
+    print(f'-- Configuring done\n-- Generating done\n-- Build files have been written to: {build_dir}')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-C', '--project-dir', default=os.getcwd())
+    parser.add_argument('-B', '--build-dir')
+    parser.add_argument('actions', nargs='*')
+    args, _ = parser.parse_known_args()
+
+    project_dir = os.path.abspath(args.project_dir)
+    build_dir = os.path.join(project_dir, args.build_dir or 'build')
+
+    for action in args.actions:
+        if action == 'reconfigure':
+            reconfigure(project_dir, build_dir)
+        else:
+            print(f'fake idf.py: "{action}" does nothing')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Generators of the synthetic inputs of the benchmarks, deterministic for the same arguments
+"""
+import json
+import os
+import random
+
+import typing as t
+
+# diagnostics in the headers are reported by every file including them
+HEADERS = [f'components/common/include/common_{i}.h' for i in range(20)]
+
+CHECKS = [
+    'bugprone-narrowing-conversions',
+    'bugprone-branch-clone',
+    'readability-else-after-return',
+    'readability-inconsistent-declaration-parameter-name',
+    'performance-no-int-to-ptr',
+    'clang-analyzer-core.NullDereference',
+    'clang-analyzer-unix.Malloc',
+    'clang-diagnostic-error',
+]
+
+BOLD = '\x1b[1m'
+MAGENTA = '\x1b[0;1;35m'
+GREEN = '\x1b[0;1;32m'
+RESET = '\x1b[0m'
+
+
+def get_source_file(index: int) -> str:
+    return f'components/comp_{index // 50}/src/file_{index}.c'
+
+
+def generate_compile_commands(project_dir: str, count: int, idf_path: str = '/opt/esp-idf', seed: int = 0) -> str:
+    """
+    Write ``count`` compile commands into ``<project_dir>/build/compile_commands.json``, like the ones generated
+    by ESP-IDF: GCC only flags, prefix maps, dozens of include dirs. A quarter of the files are ESP-IDF components
+    outside the project, which are filtered out by ``filter_cmd``.
+
+    :return: path of the written compile commands
+    """
+    rng = random.Random(seed)
+    build_dir = os.path.join(project_dir, 'build')
+    os.makedirs(build_dir, exist_ok=True)
+
+    include_dirs = [f'-I{idf_path}/components/comp_{i}/include' for i in range(40)] + [f'-I{build_dir}/config']
+    common_flags = (
+        '-mlongcalls -ffunction-sections -fdata-sections -Wall -Werror=all -Wno-error=unused-function '
+        '-fstrict-volatile-bitfields -fno-tree-switch-conversion -fno-jump-tables -Og -ggdb -std=gnu17 '
+        '-DESP_PLATFORM -DIDF_VER=\\"v5.3\\" -D_GNU_SOURCE '
+        f'-fmacro-prefix-map={project_dir}=. -fmacro-prefix-map={idf_path}=/IDF'
+    )
+
+    fp = os.path.join(build_dir, 'compile_commands.json')
+    with open(fp, 'w') as fw:
+        fw.write('[\n')
+        for i in range(count):
+            root = idf_path if rng.random() < 0.25 else project_dir
+            file = os.path.join(root, get_source_file(i))
+            command = {
+                'directory': build_dir,
+                'command': (
+                    f'/opt/xtensa-esp-elf/bin/xtensa-esp32-elf-gcc {" ".join(include_dirs)} {common_flags} '
+                    f'-o esp-idf/comp_{i // 50}/CMakeFiles/file_{i}.c.obj -c {file}'
+                ),
+                'file': file,
+                'output': f'esp-idf/comp_{i // 50}/CMakeFiles/file_{i}.c.obj',
+            }
+            fw.write(json.dumps(command, indent=2))
+            fw.write(',\n' if i < count - 1 else '\n')
+        fw.write(']\n')
+
+    return fp
+
+
+def _diagnostic(rng: random.Random, path: str, colored: bool) -> t.List[str]:
+    line = rng.randint(1, 2000)
+    col = rng.randint(1, 80)
+    check = rng.choice(CHECKS)
+    message = f'synthetic issue {rng.randint(0, 500)} found here'
+    code = f'    int value_{line} = compute(value_{line - 1}, {col});'
+    caret = ' ' * (col - 1) + '^'
+
+    if colored:
+        header = f'{BOLD}{path}:{line}:{col}: {RESET}{MAGENTA}warning: {RESET}{BOLD}{message} [{check}]{RESET}'
+        caret = f'{GREEN}{caret}{RESET}'
+    else:
+        header = f'{path}:{line}:{col}: warning: {message} [{check}]'
+
+    lines = [header, code, caret]
+    if rng.random() < 0.3:
+        lines.extend([f'{path}:{max(line - 3, 1)}:{col}: note: assigned here', code, caret])
+
+    return lines
+
+
+def generate_warnings(output_dir: str, lines: int, project_dir: str, seed: int = 0) -> str:
+    """
+    Write about ``lines`` lines of clang-tidy output into ``<output_dir>/warnings.txt``, half of them colored.
+    The paths are absolute, or relative to the build dir with ``../``, and the diagnostics in the headers are
+    duplicated many times.
+
+    :return: path of the written file
+    """
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+
+    header_blocks = [
+        _diagnostic(rng, os.path.join(project_dir, header), colored=rng.random() < 0.5)
+        for header in HEADERS
+        for _ in range(10)
+    ]
+
+    fp = os.path.join(output_dir, 'warnings.txt')
+    written = 0
+    with open(fp, 'w') as fw:
+        while written < lines:
+            index = rng.randint(0, 5000)
+            if rng.random() < 0.3:
+                block = rng.choice(header_blocks)
+            elif rng.random() < 0.5:
+                path = os.path.join('..', '..', os.path.basename(project_dir), get_source_file(index))
+                block = _diagnostic(rng, path, colored=rng.random() < 0.5)
+            else:
+                block = _diagnostic(rng, os.path.join(project_dir, get_source_file(index)), colored=rng.random() < 0.5)
+
+            fw.write('\n'.join(block) + '\n')
+            written += len(block)
+
+            if rng.random() < 0.1:
+                fw.write(f'{rng.randint(1, 30)} warnings generated.\n')
+                written += 1
+
+    return fp
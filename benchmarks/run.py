@@ -0,0 +1,166 @@
+"""
+Time the runner steps on synthetic inputs, and compare with the reference numbers.
+Runs offline, clang-tidy and ESP-IDF are not required.
+
+    python -m benchmarks.run --commands 10000 --lines 1000000
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import typing as t
+
+from pyclang import Runner
+
+from .generate import CHECKS, generate_compile_commands, generate_warnings
+
+REFERENCE_FILE = os.path.join(os.path.dirname(__file__), 'reference.json')
+
+# the steps reading the compile commands, and the ones reading "warnings.txt"
+COMPILE_COMMANDS_STEPS = ['remove_command_flags', 'filter_cmd']
+WARNINGS_STEPS = ['remove_color_output', 'normalize', 'check_limits', 'postprocess', 'make_html_report']
+
+
+class Result(t.NamedTuple):
+    seconds: float
+    peak_mib: float
+
+
+def _prepare(project_dir: str) -> None:
+    """
+    Restore the pristine "warnings.txt", and remove the outputs of the previous steps
+    """
+    shutil.copyfile(os.path.join(project_dir, 'warnings.orig.txt'), os.path.join(project_dir, Runner.WARN_FILENAME))
+    for name in (Runner.RESULTS_DB_FILENAME, Runner.TU_COUNTS_FILENAME):
+        if os.path.isfile(os.path.join(project_dir, name)):
+            os.remove(os.path.join(project_dir, name))
+    shutil.rmtree(os.path.join(project_dir, 'html_report'), ignore_errors=True)
+
+
+def _run_step(project_dir: str, name: str, log_dir: str) -> None:
+    runner = Runner(
+        [project_dir],
+        cores=1,
+        log_path=log_dir,
+        base_dir=project_dir,
+        filter_summary=True,
+        checks_limitations={check: sys.maxsize for check in CHECKS},
+    )
+    getattr(runner, name)()
+    runner()
+
+
+def measure(project_dir: str, name: str, log_dir: str, repeat: int = 1, memory: bool = True) -> Result:
+    """
+    :return: the best time of ``repeat`` runs, and the peak memory allocated by python in another run
+    """
+    seconds = float('inf')
+    for _ in range(repeat):
+        _prepare(project_dir)
+        start = time.perf_counter()
+        _run_step(project_dir, name, log_dir)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    peak = 0
+    if memory:
+        _prepare(project_dir)
+        tracemalloc.start()
+        try:
+            _run_step(project_dir, name, log_dir)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return Result(round(seconds, 3), round(peak / 1024 / 1024, 1))
+
+
+def compare(
+    results: t.Dict[str, Result], reference: t.Dict[str, t.Dict[str, float]], tolerance: float
+) -> t.List[str]:
+    """
+    :return: descriptions of the regressions, slower or using more memory than the reference by ``tolerance``
+    """
+    regressions = []
+    for name, res in results.items():
+        ref = reference.get(name)
+        if not ref:
+            continue
+
+        for field, unit in (('seconds', 's'), ('peak_mib', ' MiB')):
+            value, ref_value = getattr(res, field), ref.get(field)
+            # ignore the noise of the tiny numbers
+            if ref_value and value > ref_value * (1 + tolerance) and value - ref_value > 0.05:
+                regressions.append(f'{name}: {value}{unit} > {ref_value}{unit} (reference) * {1 + tolerance}')
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--commands', type=int, default=10000, help='number of the compile commands')
+    parser.add_argument('--lines', type=int, default=1000000, help='number of the lines of "warnings.txt"')
+    parser.add_argument('--steps', nargs='+', choices=COMPILE_COMMANDS_STEPS + WARNINGS_STEPS, help='steps to run')
+    parser.add_argument('--repeat', type=int, default=1, help='run each step this many times, take the best time')
+    parser.add_argument('--no-memory', action='store_true', help="don't measure the peak memory, which is slow")
+    parser.add_argument('--reference', default=REFERENCE_FILE, help='file of the reference numbers')
+    parser.add_argument('--update-reference', action='store_true', help='write the results as the reference numbers')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed regression ratio, 0.5 means 50%%')
+    parser.add_argument('--work-dir', help='where the inputs are generated, a temporary dir if not specified')
+    args = parser.parse_args()
+
+    steps = args.steps or COMPILE_COMMANDS_STEPS + WARNINGS_STEPS
+    scale = f'{args.commands}x{args.lines}'
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='pyclang-bench-')
+    try:
+        project_dir = os.path.join(work_dir, 'project')
+        log_dir = os.path.join(work_dir, 'logs')
+        os.makedirs(log_dir, exist_ok=True)
+
+        start = time.perf_counter()
+        generate_compile_commands(project_dir, args.commands)
+        os.replace(
+            generate_warnings(project_dir, args.lines, project_dir), os.path.join(project_dir, 'warnings.orig.txt')
+        )
+        print(f'Generated the inputs of {scale} in {time.perf_counter() - start:.1f}s')
+
+        results = {}
+        for name in steps:
+            results[name] = measure(project_dir, name, log_dir, args.repeat, not args.no_memory)
+            print(f'{name:<24}{results[name].seconds:>10.3f}s{results[name].peak_mib:>10.1f} MiB')
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    try:
+        with open(args.reference) as fr:
+            references = json.load(fr)
+    except (OSError, ValueError):
+        references = {}
+
+    if args.update_reference:
+        references.setdefault(scale, {}).update({name: res._asdict() for name, res in results.items()})
+        with open(args.reference, 'w') as fw:
+            json.dump(references, fw, indent=2, sort_keys=True)
+            fw.write('\n')
+        print(f'Reference numbers of {scale} written into {args.reference}')
+        return 0
+
+    if scale not in references:
+        print(f'No reference numbers of {scale} in {args.reference}')
+        return 0
+
+    regressions = compare(results, references[scale], args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION: {regression}')
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,9 @@
-from .runner import Runner
+from .runner import ClangdDriver, ClangTidyDriver, Runner, TranslationUnit, TUResult
 
 __all__ = [
+    'ClangdDriver',
+    'ClangTidyDriver',
     'Runner',
+    'TranslationUnit',
+    'TUResult',
 ]
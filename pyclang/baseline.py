@@ -0,0 +1,98 @@
+import hashlib
+import os
+import sys
+from array import array
+from collections import Counter
+from functools import lru_cache
+
+import typing as t
+
+from .diagnostics import Diagnostic
+from .utils import atomic_write
+
+BASELINE_MAGIC = b'PYCLANG-BASELINE-1\n'
+
+
+class Baseline:
+    """
+    Accepted diagnostics, stored as 64-bit fingerprints in a compact binary file.
+
+    The fingerprint of a diagnostic is a hash of its check, path, message and the code around it,
+    the line number is not included, so the diagnostics are still matched after the code above them changes.
+    The same fingerprint could be accepted many times, like the same issue on identical lines.
+
+    >> baseline = Baseline.load('baseline.bin', base_dir)
+    >> new_diags = [diag for diag in diags if not baseline.consume(diag)]
+    """
+
+    # lines before and after the line of the diagnostic included in the fingerprint
+    CONTEXT_LINES = 1
+
+    def __init__(self, base_dir: str, counts: t.Optional[t.Counter[int]] = None) -> None:
+        self.base_dir = base_dir
+        self.counts: t.Counter[int] = counts if counts is not None else Counter()
+
+        # the diagnostics of one file mostly come together
+        self._read_lines = lru_cache(maxsize=256)(self._read_lines)
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+    def _read_lines(self, path: str) -> t.Tuple[str, ...]:
+        try:
+            with open(os.path.join(self.base_dir, path), errors='replace') as fr:
+                return tuple(line.strip() for line in fr)
+        except OSError:
+            return ()
+
+    def get_code(self, diag: Diagnostic) -> str:
+        lines = self._read_lines(diag.path)
+        start = max(diag.line - 1 - self.CONTEXT_LINES, 0)
+        return '\n'.join(lines[start : diag.line + self.CONTEXT_LINES])
+
+    def fingerprint(self, diag: Diagnostic) -> int:
+        return int.from_bytes(
+            hashlib.blake2b(
+                f'{diag.check}\0{diag.path}\0{diag.message}\0{self.get_code(diag)}'.encode(), digest_size=8
+            ).digest(),
+            'little',
+            signed=True,
+        )
+
+    def add(self, diag: Diagnostic) -> None:
+        self.counts[self.fingerprint(diag)] += 1
+
+    def consume(self, diag: Diagnostic) -> bool:
+        """
+        :return: True if the diagnostic is accepted by the baseline, each accepted fingerprint matches only once
+        """
+        fingerprint = self.fingerprint(diag)
+        count = self.counts.get(fingerprint, 0)
+        if not count:
+            return False
+
+        self.counts[fingerprint] = count - 1
+        return True
+
+    @classmethod
+    def load(cls, filepath: str, base_dir: str) -> 'Baseline':
+        with open(filepath, 'rb') as fr:
+            if fr.read(len(BASELINE_MAGIC)) != BASELINE_MAGIC:
+                raise ValueError(f'{filepath} is not a baseline file')
+
+            fingerprints = array('q')
+            fingerprints.frombytes(fr.read())
+
+        if sys.byteorder == 'big':
+            fingerprints.byteswap()
+
+        return cls(base_dir, Counter(fingerprints))
+
+    def save(self, filepath: str) -> None:
+        fingerprints = array('q', sorted(self.counts.elements()))
+        if sys.byteorder == 'big':
+            fingerprints.byteswap()
+
+        with atomic_write(filepath, 'wb') as fw:
+            fw.write(BASELINE_MAGIC)
+            fw.write(fingerprints.tobytes())
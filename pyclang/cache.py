@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import subprocess
+
+import typing as t
+
+from .deps import IncludeScanner, get_include_dirs, remove_output_file
+from .utils import FileDigests, atomic_write, to_str
+
+if t.TYPE_CHECKING:
+    from .runner import TranslationUnit
+
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024  # bytes
+
+CLANG_TIDY_CONFIG_FILENAME = '.clang-tidy'
+
+
+def get_clang_tidy_salt(clang_tidy_cmd: t.List[str], clang_tidy_args: t.List[str]) -> str:
+    """
+    Hash of everything that is shared by all the translation units and affects the clang-tidy results:
+    the clang-tidy version, the clang-tidy arguments, and the config file passed by ``-config-file``
+    """
+    h = hashlib.sha256()
+    h.update(to_str(subprocess.run(clang_tidy_cmd + ['--version'], stdout=subprocess.PIPE).stdout).encode())
+    for arg in clang_tidy_args:
+        h.update(arg.encode() + b'\0')
+        opt, sep, value = arg.lstrip('-').partition('=')
+        if opt == 'config-file' and os.path.isfile(value):
+            with open(value, 'rb') as fr:
+                h.update(fr.read())
+
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent on-disk cache of the clang-tidy output of translation units.
+
+    The key of a translation unit is a hash of the source file, its transitive headers, its compile command,
+    the ``.clang-tidy`` config files applying to it and the ``salt`` (see ``get_clang_tidy_salt``).
+    The cache size is capped by ``max_size`` bytes, the least recently used entries are evicted first.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_size: int = DEFAULT_CACHE_SIZE,
+        scanner: t.Optional[IncludeScanner] = None,
+        digests: t.Optional[FileDigests] = None,
+    ) -> None:
+        """
+        :param scanner: share the scanned includes with the other users of them, like ``TUCanonicalizer``
+        :param digests: share the file digests with the other users of them
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+        self._scanner = scanner or IncludeScanner()
+        self._digests = FileDigests() if digests is None else digests
+        self._configs: t.Dict[str, t.List[str]] = {}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _get_config_files(self, folder: str) -> t.List[str]:
+        """
+        ``.clang-tidy`` files in the folder and all its parents, since configs could be inherited
+        """
+        if folder not in self._configs:
+            parent = os.path.dirname(folder)
+            configs = self._get_config_files(parent) if parent != folder else []
+            config = os.path.join(folder, CLANG_TIDY_CONFIG_FILENAME)
+            if os.path.isfile(config):
+                configs = [config, *configs]
+            self._configs[folder] = configs
+
+        return self._configs[folder]
+
+    def get_key(self, tu: 'TranslationUnit', salt: str) -> str:
+        args = remove_output_file(tu.arguments)
+
+        h = hashlib.sha256()
+        h.update(salt.encode())
+        h.update(json.dumps([tu.file, tu.directory, args]).encode())
+
+        headers = self._scanner.scan(tu.file, get_include_dirs(tu.arguments, tu.directory))
+        for path in [tu.file, *sorted(headers), *self._get_config_files(os.path.dirname(tu.file))]:
+            h.update(path.encode() + b'\0' + self._digests[path].encode())
+
+        return h.hexdigest()
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+    def get(self, key: str) -> t.Optional[str]:
+        """
+        :return: the stored clang-tidy output, None if not cached
+        """
+        path = self._get_path(key)
+        try:
+            with open(path) as fr:
+                output = json.load(fr)['stdout']
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # mark as recently used
+        os.utime(path)
+        return output
+
+    def put(self, key: str, stdout: str) -> None:
+        with atomic_write(self._get_path(key)) as fw:
+            json.dump({'stdout': stdout}, fw)
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used entries until the cache size is within ``max_size``
+
+        :return: number of removed entries
+        """
+        entries = []
+        total_size = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for fn in files:
+                path = os.path.join(root, fn)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total_size += st.st_size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+            removed += 1
+
+        return removed
@@ -0,0 +1,320 @@
+import json
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+import typing as t
+
+# LSP DiagnosticSeverity
+SEVERITIES = {1: 'error', 2: 'warning'}
+
+CLANGD_ARGS = [
+    '--background-index=false',
+    '--clang-tidy',
+    '--header-insertion=never',
+    '--pch-storage=memory',
+    '--log=error',
+    # one clangd process analyses one file at a time, the pool has ``jobs`` processes
+    '-j=1',
+]
+
+
+class ClangdError(Exception):
+    """clangd exited, or sent an error response"""
+
+
+def uri_to_path(uri: str) -> str:
+    return unquote(urlparse(uri).path)
+
+
+def get_clangd_config(clang_tidy_args: t.List[str]) -> str:
+    """
+    clangd user config enabling the checks of ``-checks`` in the clang-tidy arguments, written in the JSON flavor
+    of YAML. clangd applies the checks of the ``.clang-tidy`` files first, then the added and the removed ones of each
+    document in order, so the checks are split into documents of the added ones followed by the removed ones.
+    The order of ``-checks`` is kept, like a leading ``-*`` disabling the checks of the ``.clang-tidy`` files.
+    """
+    fragments: t.List[t.Dict[str, t.List[str]]] = [{'Add': [], 'Remove': []}]
+    for arg in clang_tidy_args:
+        opt, _, value = arg.lstrip('-').partition('=')
+        if opt != 'checks':
+            continue
+
+        for check in (c.strip() for c in value.split(',')):
+            if not check:
+                continue
+            if check.startswith('-'):
+                fragments[-1]['Remove'].append(check[1:])
+            else:
+                # the removed ones are applied after the added ones of the same document
+                if fragments[-1]['Remove']:
+                    fragments.append({'Add': [], 'Remove': []})
+                fragments[-1]['Add'].append(check)
+
+    documents = [
+        {
+            'Diagnostics': {
+                'ClangTidy': dict(fragments[0], FastCheckFilter='None'),
+                'UnusedIncludes': 'None',
+                'MissingIncludes': 'None',
+            },
+            'Index': {'Background': 'Skip', 'StandardLibrary': False},
+        },
+        *({'Diagnostics': {'ClangTidy': fragment}} for fragment in fragments[1:]),
+    ]
+    return '---\n'.join(json.dumps(document, indent=2) + '\n' for document in documents)
+
+
+def format_diagnostics(filepath: str, diagnostics: t.List[t.Dict[str, t.Any]]) -> str:
+    """
+    Format the LSP diagnostics of the file like the clang-tidy output, with the code snippets.
+    Only the clang-tidy diagnostics and the compiler errors are kept, like clang-tidy does by default.
+    The positions are expected in UTF-8 offsets.
+    """
+    lines_cache: t.Dict[str, t.List[str]] = {}
+
+    def _snippet(path: str, line: int, col: int) -> str:
+        if path not in lines_cache:
+            try:
+                with open(path, errors='replace') as fr:
+                    lines_cache[path] = fr.read().splitlines()
+            except OSError:
+                lines_cache[path] = []
+
+        lines = lines_cache[path]
+        if line >= len(lines):
+            return ''
+
+        return f'{lines[line]}\n{" " * col}^\n'
+
+    res = []
+    for diag in diagnostics:
+        severity = SEVERITIES.get(diag.get('severity', 1))
+        if diag.get('source') == 'clang-tidy' and severity:
+            check = diag.get('code', '')
+        elif diag.get('source') == 'clang' and severity == 'error':
+            check = 'clang-diagnostic-error'
+        else:
+            continue
+
+        path = filepath
+        start = diag['range']['start']
+        message, *extra_lines = diag['message'].split('\n')
+        related = diag.get('relatedInformation') or []
+        # the diagnostics in the headers are reported at the include line by clangd
+        if message.startswith('In included file: ') and related:
+            message = message[len('In included file: ') :]
+            path = uri_to_path(related[0]['location']['uri'])
+            start = related[0]['location']['range']['start']
+            related = related[1:]
+
+        res.append(f'{path}:{start["line"] + 1}:{start["character"] + 1}: {severity}: {message} [{check}]\n')
+        res.append(_snippet(path, start['line'], start['character']))
+        res.extend(f'{line}\n' for line in extra_lines if line)
+        for info in related:
+            note_path = uri_to_path(info['location']['uri'])
+            note_start = info['location']['range']['start']
+            res.append(
+                f'{note_path}:{note_start["line"] + 1}:{note_start["character"] + 1}: note: {info["message"]}\n'
+            )
+            res.append(_snippet(note_path, note_start['line'], note_start['character']))
+
+    return ''.join(res)
+
+
+class ClangdClient:
+    """
+    One clangd process, driven over LSP (JSON-RPC on stdio).
+    A reader thread receives the responses and the published diagnostics.
+
+    >> client = ClangdClient(['clangd', '--compile-commands-dir=build'])
+    >> diagnostics = client.analyse('/path/to/file.c', timeout=60)
+    >> client.close()
+    """
+
+    def __init__(self, cmd: t.List[str], env: t.Optional[t.Dict[str, str]] = None) -> None:
+        self.cmd = cmd
+        self.proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env
+        )
+
+        self._next_id = 0
+        self._version = 0
+        self._cond = threading.Condition()
+        self._responses: t.Dict[int, t.Dict[str, t.Any]] = {}
+        self._diagnostics: t.Dict[str, t.Tuple[t.Optional[int], t.List[t.Dict[str, t.Any]]]] = {}
+        self._closed = False
+        # requests from clangd are answered by the reader thread
+        self._send_lock = threading.Lock()
+
+        try:
+            self._reader = threading.Thread(target=self._read_loop, daemon=True)
+            self._reader.start()
+
+            self.request(
+                'initialize',
+                {
+                    'processId': os.getpid(),
+                    'rootUri': None,
+                    'capabilities': {
+                        'general': {'positionEncodings': ['utf-8']},
+                        # clangd extension, for the versions before LSP 3.17
+                        'offsetEncoding': ['utf-8'],
+                        'textDocument': {'publishDiagnostics': {'relatedInformation': True, 'versionSupport': True}},
+                    },
+                },
+            )
+            self.notify('initialized', {})
+        except BaseException:
+            # the caller gets no client to close
+            self.kill()
+            raise
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def _send(self, message: t.Dict[str, t.Any]) -> None:
+        body = json.dumps(dict(message, jsonrpc='2.0')).encode()
+        try:
+            with self._send_lock:
+                self.proc.stdin.write(f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+                self.proc.stdin.flush()
+        except OSError as e:
+            raise ClangdError(f'clangd exited with code {self.proc.poll()}') from e
+
+    def _read_message(self) -> t.Optional[t.Dict[str, t.Any]]:
+        length = None
+        while True:
+            line = self.proc.stdout.readline()
+            if not line:
+                return None
+            line = line.strip()
+            if not line:
+                break
+            name, _, value = line.decode('ascii', errors='ignore').partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+
+        if length is None:
+            return {}
+
+        try:
+            return json.loads(self.proc.stdout.read(length))
+        except ValueError:
+            return {}
+
+    def _read_loop(self) -> None:
+        while True:
+            message = self._read_message()
+            if message is None:
+                break
+
+            method = message.get('method')
+            if method and 'id' in message:
+                # requests from clangd, like ``window/workDoneProgress/create``
+                try:
+                    self._send({'id': message['id'], 'result': None})
+                except ClangdError:
+                    pass
+            elif method == 'textDocument/publishDiagnostics':
+                params = message['params']
+                with self._cond:
+                    self._diagnostics[params['uri']] = (params.get('version'), params['diagnostics'])
+                    self._cond.notify_all()
+            elif 'id' in message:
+                with self._cond:
+                    self._responses[message['id']] = message
+                    self._cond.notify_all()
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _wait(self, predicate: t.Callable[[], t.Any], timeout: t.Optional[float]) -> t.Any:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                res = predicate()
+                if res is not None:
+                    return res
+                if self._closed:
+                    self.proc.wait()
+                    raise ClangdError(f'clangd exited with code {self.proc.returncode}')
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError
+                self._cond.wait(remaining)
+
+    def notify(self, method: str, params: t.Dict[str, t.Any]) -> None:
+        self._send({'method': method, 'params': params})
+
+    def request(self, method: str, params: t.Any, timeout: t.Optional[float] = None) -> t.Any:
+        self._next_id += 1
+        request_id = self._next_id
+        self._send({'id': request_id, 'method': method, 'params': params})
+
+        response = self._wait(lambda: self._responses.pop(request_id, None), timeout)
+        if 'error' in response:
+            raise ClangdError(f'{method} failed: {response["error"].get("message")}')
+
+        return response.get('result')
+
+    def analyse(self, filepath: str, timeout: t.Optional[float] = None) -> t.List[t.Dict[str, t.Any]]:
+        """
+        Open the file, wait for its diagnostics, then close it
+
+        :raises TimeoutError: if the diagnostics are not published in ``timeout`` seconds
+        :raises ClangdError: if clangd exits
+        """
+        with open(filepath, errors='replace') as fr:
+            text = fr.read()
+
+        uri = Path(os.path.abspath(filepath)).as_uri()
+        self._version += 1
+        version = self._version
+        with self._cond:
+            self._diagnostics.pop(uri, None)
+
+        self.notify(
+            'textDocument/didOpen',
+            {
+                'textDocument': {
+                    'uri': uri,
+                    'languageId': 'c' if filepath.endswith('.c') else 'cpp',
+                    'version': version,
+                    'text': text,
+                }
+            },
+        )
+
+        def _published() -> t.Optional[t.List[t.Dict[str, t.Any]]]:
+            published = self._diagnostics.get(uri)
+            if published is None or published[0] not in (None, version):
+                return None
+            return published[1]
+
+        try:
+            return self._wait(_published, timeout)
+        finally:
+            if self.alive:
+                self.notify('textDocument/didClose', {'textDocument': {'uri': uri}})
+
+    def kill(self) -> None:
+        self.proc.kill()
+        self.proc.wait()
+
+    def close(self, timeout: float = 5) -> None:
+        if not self.alive:
+            return
+
+        try:
+            self.request('shutdown', None, timeout=timeout)
+            self.notify('exit', None)
+            self.proc.wait(timeout=timeout)
+        except (ClangdError, TimeoutError, subprocess.TimeoutExpired):
+            self.kill()
@@ -0,0 +1,387 @@
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+
+import typing as t
+
+from .utils import FileDigests, file_digest, get_command_args, to_str
+
+INCLUDE_REGEX = re.compile(rb'^[ \t]*#[ \t]*(?:include|include_next|import)[ \t]*([<"])([^>"\r\n]+)[>"]', re.MULTILINE)
+
+# options taking an include directory, and whether the directory is searched for <...> includes as well
+INCLUDE_DIR_OPTIONS = {
+    '-I': True,
+    '-isystem': True,
+    '-idirafter': True,
+    '-iquote': False,
+}
+
+FORCED_INCLUDE_OPTIONS = ('-include', '-imacros')
+
+
+class IncludeDirs(t.NamedTuple):
+    quote: t.Tuple[str, ...]
+    angle: t.Tuple[str, ...]
+    forced: t.Tuple[str, ...]
+
+
+def get_output_file(args: t.Sequence[str]) -> t.Optional[str]:
+    """
+    Get the output file of the compiler arguments, the value of ``-o``
+    """
+    if '-o' in args[:-1]:
+        return args[args.index('-o') + 1]
+
+    return None
+
+
+def remove_output_file(args: t.Sequence[str]) -> t.List[str]:
+    """
+    Remove ``-o`` and its value from the compiler arguments, the output file doesn't affect the analysis
+    """
+    args = list(args)
+    if '-o' in args[:-1]:
+        index = args.index('-o')
+        del args[index : index + 2]
+
+    return args
+
+
+def get_include_dirs(args: t.List[str], directory: str) -> IncludeDirs:
+    """
+    Get the include directories and the forced included files from the compiler arguments
+
+    :param args: compiler arguments
+    :param directory: working directory of the compiler, relative paths are resolved against it
+    """
+    quote = []
+    angle = []
+    forced = []
+
+    args_iter = iter(args)
+    for arg in args_iter:
+        for opt, is_angle in INCLUDE_DIR_OPTIONS.items():
+            if arg.startswith(opt):
+                value = arg[len(opt) :] or next(args_iter, '')
+                if value:
+                    value = os.path.normpath(os.path.join(directory, value))
+                    quote.append(value)
+                    if is_angle:
+                        angle.append(value)
+                break
+        else:
+            if arg in FORCED_INCLUDE_OPTIONS:
+                value = next(args_iter, '')
+                if value:
+                    forced.append(os.path.normpath(os.path.join(directory, value)))
+
+    return IncludeDirs(tuple(quote), tuple(angle), tuple(forced))
+
+
+class IncludeScanner:
+    """
+    Find the headers included by a source file transitively, by scanning the ``#include`` lines.
+
+    All the ``#include`` lines are taken into account, no matter the preprocessor conditions,
+    so the result is a superset of the headers really used. Headers that can't be found are ignored.
+    The scanned files and the resolved paths are memoized, so one instance should be shared by all the files.
+    """
+
+    def __init__(self) -> None:
+        self._includes: t.Dict[str, t.List[t.Tuple[bool, str]]] = {}
+        self._resolved: t.Dict[t.Tuple[str, bool, str, IncludeDirs], t.Optional[str]] = {}
+
+    def get_direct_includes(self, path: str) -> t.List[t.Tuple[bool, str]]:
+        """
+        :return: list of (is quoted include, included name)
+        """
+        if path not in self._includes:
+            try:
+                with open(path, 'rb') as fr:
+                    content = fr.read()
+            except OSError:
+                content = b''
+
+            self._includes[path] = [
+                (quote == b'"', name.decode('utf-8', errors='ignore').strip())
+                for quote, name in INCLUDE_REGEX.findall(content)
+            ]
+
+        return self._includes[path]
+
+    def _resolve(self, name: str, quoted: bool, cur_dir: str, include_dirs: IncludeDirs) -> t.Optional[str]:
+        key = (name, quoted, cur_dir, include_dirs)
+        if key not in self._resolved:
+            if os.path.isabs(name):
+                search_dirs = ['']
+            elif quoted:
+                search_dirs = [cur_dir, *include_dirs.quote]
+            else:
+                search_dirs = include_dirs.angle
+
+            self._resolved[key] = None
+            for search_dir in search_dirs:
+                path = os.path.normpath(os.path.join(search_dir, name))
+                if os.path.isfile(path):
+                    self._resolved[key] = path
+                    break
+
+        return self._resolved[key]
+
+    def scan(self, file: str, include_dirs: IncludeDirs) -> t.Set[str]:
+        """
+        :return: paths of the headers included by ``file`` transitively, ``file`` itself is not included
+        """
+        headers = set(p for p in include_dirs.forced if os.path.isfile(p))
+        todo = [file, *headers]
+        while todo:
+            path = todo.pop()
+            cur_dir = os.path.dirname(path)
+            for quoted, name in self.get_direct_includes(path):
+                header = self._resolve(name, quoted, cur_dir, include_dirs)
+                if header and header not in headers and header != file:
+                    headers.add(header)
+                    todo.append(header)
+
+        return headers
+
+
+class TUCanonicalizer:
+    """
+    Get a key of translation units, which is the same for the same file compiled with the same flags
+    in different build dirs, like the ESP-IDF components shared by many projects.
+
+    The build dir in the compile arguments is replaced by a placeholder, and the content of the headers under
+    the build dir (like ``sdkconfig.h``) is part of the key, since it may differ between the projects.
+    """
+
+    BUILD_DIR_PLACEHOLDER = '<build>'
+
+    def __init__(self, scanner: t.Optional['IncludeScanner'] = None, digests: t.Optional[FileDigests] = None) -> None:
+        """
+        :param scanner: share the scanned includes with the other users of them, like ``ResultCache``
+        :param digests: share the file digests with the other users of them
+        """
+        self._scanner = scanner or IncludeScanner()
+        self._digests = FileDigests() if digests is None else digests
+
+    def get_key(self, file: str, arguments: t.Sequence[str], directory: str) -> str:
+        args = remove_output_file(arguments)
+
+        build_dir = os.path.normpath(directory)
+        h = hashlib.sha256()
+        h.update(file.encode() + b'\0')
+        for arg in args:
+            h.update(arg.replace(build_dir, self.BUILD_DIR_PLACEHOLDER).encode() + b'\0')
+
+        for header in sorted(self._scanner.scan(file, get_include_dirs(args, directory))):
+            if header.startswith(build_dir + os.sep):
+                h.update(header.replace(build_dir, self.BUILD_DIR_PLACEHOLDER).encode() + b'\0')
+                h.update(self._digests[header].encode())
+
+        return h.hexdigest()
+
+
+def parse_depfile(content: str) -> t.Dict[str, t.List[str]]:
+    """
+    Parse a make-style dependency file generated by the compiler (``-MD``)
+
+    :return: dict of target: dependencies
+    """
+    res = {}
+    # join the escaped newlines, then split the rules
+    for rule in content.replace('\\\n', ' ').splitlines():
+        target, sep, deps = rule.partition(': ')
+        if not sep:
+            continue
+        # escaped spaces are part of the path
+        paths = [p.replace('\0', ' ') for p in deps.replace('\\ ', '\0').split()]
+        res.setdefault(target.strip().replace('\\ ', ' '), []).extend(paths)
+
+    return res
+
+
+def read_ninja_deps(build_dir: str) -> t.Dict[str, t.List[str]]:
+    """
+    Read the dependencies recorded by ninja in ``.ninja_deps``. Ninja removes the depfiles after reading them.
+
+    :return: dict of target: dependencies, empty if not a ninja build dir or ninja is not available
+    """
+    ninja = shutil.which('ninja')
+    if not ninja or not os.path.isfile(os.path.join(build_dir, '.ninja_deps')):
+        return {}
+
+    p = subprocess.run([ninja, '-C', build_dir, '-t', 'deps'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if p.returncode != 0:
+        return {}
+
+    res = {}
+    deps = None
+    for line in to_str(p.stdout).splitlines():
+        if not line.strip():
+            deps = None
+        elif not line[0].isspace():
+            # <target>: #deps 123, deps mtime 456 (VALID)
+            deps = res.setdefault(line.split(': #deps', 1)[0], [])
+        elif deps is not None:
+            deps.append(line.strip())
+
+    return res
+
+
+def read_depfiles(build_dir: str) -> t.Dict[str, t.List[str]]:
+    """
+    Read all the depfiles under the build dir, generated by the other generators than ninja
+
+    :return: dict of target: dependencies
+    """
+    res = {}
+    for root, _, files in os.walk(build_dir):
+        for fn in files:
+            if not fn.endswith('.d'):
+                continue
+            try:
+                with open(os.path.join(root, fn), errors='ignore') as fr:
+                    res.update(parse_depfile(fr.read()))
+            except OSError:
+                continue
+
+    return res
+
+
+def get_tu_dependencies(build_dir: str, commands: t.List[t.Dict[str, t.Any]]) -> t.Dict[str, t.Set[str]]:
+    """
+    Get the files that each translation unit in the compile commands depends on, the translation unit included.
+
+    The dependencies recorded by ninja, or the depfiles under the build dir are used.
+    The translation units not built yet are scanned by ``IncludeScanner``.
+
+    :return: dict of translation unit real path: dependencies real paths
+    """
+    build_dir = os.path.realpath(build_dir)
+    targets = read_ninja_deps(build_dir) or read_depfiles(build_dir)
+
+    res = {}
+    scanner = IncludeScanner()
+    for command in commands:
+        directory = command['directory']
+        _file = os.path.realpath(os.path.join(directory, command['file']))
+        args = get_command_args(command)
+
+        deps = None
+        output = get_output_file(args)
+        if output:
+            output = os.path.realpath(os.path.join(directory, output))
+            deps = targets.get(os.path.relpath(output, build_dir), targets.get(output))
+
+        if deps is not None:
+            deps = set(os.path.realpath(os.path.join(build_dir, p)) for p in deps)
+        else:
+            deps = set(os.path.realpath(p) for p in scanner.scan(_file, get_include_dirs(args, directory)))
+
+        deps.add(_file)
+        res[_file] = deps
+
+    return res
+
+
+def get_changed_files(path: str, rev: str) -> t.Set[str]:
+    """
+    Get the files changed since the git revision, in the git repository containing the path
+
+    :return: real paths of the changed files, uncommitted changes included
+    """
+    toplevel = subprocess.run(
+        ['git', 'rev-parse', '--show-toplevel'], cwd=path, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+    )
+    toplevel = to_str(toplevel.stdout).strip()
+
+    p = subprocess.run(
+        ['git', 'diff', '--name-only', rev, '--'], cwd=toplevel, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+    )
+    return set(os.path.realpath(os.path.join(toplevel, line)) for line in to_str(p.stdout).splitlines() if line)
+
+
+def _unescape_ninja_path(path: str) -> str:
+    return path.replace('$ ', ' ').replace('$:', ':').replace('$$', '$')
+
+
+def read_cmake_inputs(build_dir: str) -> t.List[str]:
+    """
+    Read the files that trigger a CMake re-run, from the ``RERUN_CMAKE`` rule in ``build.ninja``
+
+    :return: paths of the CMake inputs, empty if not a ninja build dir
+    """
+    build_ninja = os.path.join(build_dir, 'build.ninja')
+    if not os.path.isfile(build_ninja):
+        return []
+
+    rule = None
+    with open(build_ninja, errors='ignore') as fr:
+        for line in fr:
+            if rule is None:
+                if line.startswith('build build.ninja:'):
+                    rule = ''
+                else:
+                    continue
+
+            line = line.rstrip('\r\n')
+            if line.endswith('$') and not line.endswith('$$'):
+                rule += line[:-1]
+                continue
+
+            rule += line
+            break
+
+    if not rule:
+        return []
+
+    # build build.ninja: RERUN_CMAKE | <implicit inputs> || <order-only inputs>
+    implicit_inputs = rule.partition(' | ')[2].partition(' || ')[0]
+    paths = re.split(r'(?<!\$) +', implicit_inputs.strip())
+    return [os.path.normpath(os.path.join(build_dir, _unescape_ninja_path(p))) for p in paths if p]
+
+
+def get_reconfigure_stamp(project_dir: str, build_dir: str) -> str:
+    """
+    Hash of everything that makes a reconfigure necessary: the CMake inputs, the sdkconfig files,
+    ``CMakeCache.txt`` and the ESP-IDF version.
+
+    The modification time of the directories of the CMake inputs is taken into account as well,
+    so adding a new component directory changes the stamp.
+    """
+    h = hashlib.sha256()
+
+    def _update_stat(path: str) -> None:
+        try:
+            st = os.stat(path)
+            h.update(f'{path}\0{st.st_mtime_ns}\0{st.st_size}\0'.encode())
+        except OSError:
+            h.update(f'{path}\0missing\0'.encode())
+
+    cmake_inputs = read_cmake_inputs(build_dir)
+    if not cmake_inputs:
+        # not a ninja build dir, use the CMakeLists.txt files of the project
+        for root, dirs, files in os.walk(project_dir):
+            dirs[:] = [d for d in dirs if os.path.join(root, d) != os.path.normpath(build_dir)]
+            if 'CMakeLists.txt' in files:
+                cmake_inputs.append(os.path.join(root, 'CMakeLists.txt'))
+
+    for path in sorted(set(cmake_inputs) | set(os.path.dirname(p) for p in cmake_inputs)):
+        _update_stat(path)
+
+    sdkconfig_files = [fn for fn in os.listdir(project_dir) if fn.startswith('sdkconfig')]
+    for path in [
+        *sorted(os.path.join(project_dir, fn) for fn in sdkconfig_files),
+        os.path.join(build_dir, 'CMakeCache.txt'),
+    ]:
+        h.update(f'{path}\0{file_digest(path)}\0'.encode())
+
+    idf_path = os.getenv('IDF_PATH', '')
+    h.update(f'{idf_path}\0'.encode())
+    if idf_path:
+        h.update(file_digest(os.path.join(idf_path, 'tools', 'cmake', 'version.cmake')).encode())
+
+    return h.hexdigest()
@@ -0,0 +1,215 @@
+import hashlib
+import re
+from collections import OrderedDict
+
+import typing as t
+
+ANSI_ESCAPE_REGEX = re.compile(
+    r'''
+    \x1B  # ESC
+    (?:   # 7-bit C1 Fe (except CSI)
+        [@-Z\\-_]
+    |     # or [ for CSI, followed by a control sequence
+        \[
+        [0-?]*  # Parameter bytes
+        [ -/]*  # Intermediate bytes
+        [@-~]   # Final byte
+    )
+''',
+    re.VERBOSE,
+)
+
+DIAGNOSTIC_REGEX = re.compile(
+    # FILE_PATH:  LINENO:  COL:SEVERITY:MSG [ERROR IDENTIFIER]
+    r'^([\w/.\- ]+):(\d+):(\d+): (\w[\w ]*?): (.*?)(?: \[([\w\-,.]+)])?$'
+)
+
+# lines printed by clang-tidy which are not part of any diagnostic
+SUMMARY_REGEX = re.compile(
+    r'^(\d+ (warnings?|errors?)( and \d+ errors?)? generated\.'
+    r'|Suppressed \d+ warnings'
+    r'|Use -header-filter=.* to display errors'
+    r'|Error while processing )'
+)
+
+
+# the caret line under the source excerpt, with the ``|`` gutter of clang 18 and later
+CARET_REGEX = re.compile(r'^\s*(?:\|\s*)?[~^][\s~^]*$')
+# a source excerpt line with the line number, printed by clang 18 and later
+NUMBERED_EXCERPT_REGEX = re.compile(r'^\s*\d+ \|')
+
+
+class Diagnostic(t.NamedTuple):
+    """
+    A clang-tidy diagnostic, ``check`` is empty for the ones without an error identifier.
+    ``notes`` are the following lines that belong to it: notes, code snippets and fix-it hints.
+    ``tu_count`` is the number of translation units reporting it, like a warning in a widely included header.
+    """
+
+    path: str
+    line: int
+    col: int
+    severity: str
+    message: str
+    check: str
+    notes: t.Tuple[str, ...] = ()
+    tu_count: int = 1
+
+    @property
+    def fingerprint(self) -> int:
+        return int.from_bytes(
+            hashlib.blake2b(
+                f'{self.path}\0{self.line}\0{self.col}\0{self.check}\0{self.message}'.encode(), digest_size=8
+            ).digest(),
+            'little',
+            signed=True,  # fits in a SQLite INTEGER
+        )
+
+    @property
+    def location(self) -> str:
+        return f'{self.path}:{self.line}:{self.col}'
+
+    def header(self) -> str:
+        header = f'{self.location}: {self.severity}: {self.message}'
+        if self.check:
+            header += f' [{self.check}]'
+        return header
+
+    def to_text(self) -> str:
+        return ''.join(f'{line}\n' for line in (self.header(), *self.notes))
+
+
+class DiagnosticParser:
+    """
+    Parse the clang-tidy output incrementally, line by line, color codes are stripped.
+
+    The lines kept as the notes of a diagnostic are the ``note:`` lines, the source excerpts followed by a caret line,
+    and the fix-it hints under the carets. Any other line finishes the diagnostic, and is not part of any.
+
+    >> parser = DiagnosticParser()
+    >> for line in lines:
+    >>     diag = parser.feed(line)
+    >>     if diag:
+    >>         ...
+    >> diag = parser.close()
+    """
+
+    def __init__(self) -> None:
+        self._current: t.Optional[Diagnostic] = None
+        self._notes: t.List[str] = []
+        # the line after a header, kept only if a caret line follows
+        self._excerpt: t.Optional[str] = None
+        # what the next line could be: "excerpt", "caret", "fixit", or None if only a header
+        self._expect: t.Optional[str] = None
+
+    def _flush(self) -> t.Optional[Diagnostic]:
+        diag = self._current
+        if diag is not None and self._notes:
+            diag = diag._replace(notes=tuple(self._notes))
+
+        self._current = None
+        self._notes = []
+        self._excerpt = None
+        self._expect = None
+        return diag
+
+    def feed(self, line: str) -> t.Optional[Diagnostic]:
+        """
+        :return: the previous diagnostic if it is finished by this line, otherwise None
+        """
+        line = ANSI_ESCAPE_REGEX.sub('', line).rstrip('\r\n')
+
+        res = DIAGNOSTIC_REGEX.match(line)
+        if res and res.group(4) != 'note':
+            diag = self._flush()
+            path, lineno, col, severity, msg, check = res.groups()
+            self._current = Diagnostic(path, int(lineno), int(col), severity, msg, check or '')
+            self._expect = 'excerpt'
+            return diag
+
+        if self._current is None:
+            return None
+
+        if res:
+            self._notes.append(line)
+            self._excerpt = None
+            self._expect = 'excerpt'
+        elif SUMMARY_REGEX.match(line):
+            return self._flush()
+        elif self._expect == 'excerpt' or (self._expect == 'fixit' and NUMBERED_EXCERPT_REGEX.match(line)):
+            self._excerpt = line
+            self._expect = 'caret'
+        elif self._expect == 'caret' and CARET_REGEX.match(line):
+            self._notes.extend((self._excerpt or '', line))
+            self._excerpt = None
+            self._expect = 'fixit'
+        elif self._expect == 'fixit' and line[:1].isspace() and line.strip():
+            self._notes.append(line)
+            self._expect = None
+        else:
+            return self._flush()
+
+        return None
+
+    def close(self) -> t.Optional[Diagnostic]:
+        """
+        :return: the last diagnostic, if any
+        """
+        return self._flush()
+
+
+def parse_lines(lines: t.Iterable[str]) -> t.Iterator[Diagnostic]:
+    parser = DiagnosticParser()
+    for line in lines:
+        diag = parser.feed(line)
+        if diag:
+            yield diag
+
+    diag = parser.close()
+    if diag:
+        yield diag
+
+
+def parse_file(filepath: str) -> t.Iterator[Diagnostic]:
+    """
+    Parse the clang-tidy output file line by line, the file is never loaded into memory as a whole
+    """
+    with open(filepath, errors='ignore') as fr:
+        yield from parse_lines(fr)
+
+
+class DiagnosticDeduplicator:
+    """
+    Remember the fingerprints of the seen diagnostics, and how many times each of them is seen.
+
+    Memory is bounded by ``max_size`` fingerprints, the least recently seen ones are forgotten first,
+    so a duplicate could pass only if it's far away from the previous one.
+    """
+
+    DEFAULT_MAX_SIZE = 1000000
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.max_size = max_size
+        self._counts = OrderedDict()  # fingerprint: count
+
+    def add(self, diag: Diagnostic) -> bool:
+        """
+        :return: True if the diagnostic is seen for the first time
+        """
+        fingerprint = diag.fingerprint
+        count = self._counts.pop(fingerprint, 0)
+        self._counts[fingerprint] = count + diag.tu_count
+        if count:
+            return False
+
+        if len(self._counts) > self.max_size:
+            self._counts.popitem(last=False)
+
+        return True
+
+    @property
+    def duplicated_counts(self) -> t.Dict[int, int]:
+        """
+        Counts of the fingerprints seen more than once
+        """
+        return {k: v for k, v in self._counts.items() if v > 1}
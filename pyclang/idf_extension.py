@@ -1,6 +1,7 @@
 import os.path
 import shutil
 
+import click
 from esp_pylib.errors import FatalError
 from esp_pylib.logger import log
 from rich.markup import escape
@@ -45,15 +46,18 @@ def action_extensions(base_actions, project_path):
         # idf extension don't need default values
         kwargs['clang_extra_args'] = kwargs.pop('run_clang_tidy_options', None)
         kwargs['check_files_regex'] = kwargs.pop('patterns', None)
+        kwargs['check_profile'] = kwargs.pop('enable_check_profile', False)
+        if kwargs.get('tu_memory_limit') is not None:
+            kwargs['tu_memory_limit'] *= 1024 * 1024
 
         useful_kwargs = {k: v for k, v in kwargs.items() if v is not None}
-        runner = Runner(
-            [args.project_dir],
-            build_dir=args.build_dir,
-            **useful_kwargs
-        )
-
         try:
+            runner = Runner(
+                [args.project_dir],
+                build_dir=args.build_dir,
+                **useful_kwargs
+            )
+
             if subcommand_name == 'clang-check':
                 runner.idf_reconfigure().filter_cmd().remove_command_flags().run_clang_tidy().remove_color_output()
             elif subcommand_name == 'clang-html-report':
@@ -87,7 +91,48 @@ def action_extensions(base_actions, project_path):
                     {
                         'names': ['--run-clang-tidy-py'],
                         'help': 'run-clang-tidy.py path, this file could be downloaded from llvm. '
-                        'will use "run-clang-tidy.py" if not specified.',
+                        'will run clang-tidy directly if not specified.',
+                    },
+                    {
+                        'names': ['--clang-tidy'],
+                        'help': 'clang-tidy path. will use "clang-tidy" in your PATH if not specified.',
+                    },
+                    {
+                        'names': ['--cache-dir'],
+                        'help': 'where the clang-tidy results of the files are cached. '
+                        'unchanged files would be replayed from the cache instead of running clang-tidy again.',
+                    },
+                    {
+                        'names': ['--backend'],
+                        'type': click.Choice(Runner.BACKENDS),
+                        'help': 'how the files are analysed, "clang-tidy" (default) or "clangd", '
+                        'which drives a pool of clangd processes with the clang-tidy checks enabled.',
+                    },
+                    {
+                        'names': ['--tu-timeout'],
+                        'type': float,
+                        'help': 'kill clang-tidy if it runs longer than this many seconds on one file.',
+                    },
+                    {
+                        'names': ['--tu-memory-limit'],
+                        'type': int,
+                        'help': 'limit the address space of clang-tidy on one file to this many MB.',
+                    },
+                    {
+                        'names': ['--retry-isolated'],
+                        'help': 'retry the files exceeding the time or memory limit once, alone, without '
+                        'the memory limit and with twice the timeout.',
+                        'is_flag': True,
+                    },
+                    {
+                        'names': ['--progress'],
+                        'help': 'show the progress of clang-tidy instead of logging every file.',
+                        'is_flag': True,
+                    },
+                    {
+                        'names': ['--enable-check-profile'],
+                        'help': 'record the time spent in each clang-tidy check into "timings.json".',
+                        'is_flag': True,
                     },
                     {
                         'names': ['--run-clang-tidy-options'],
@@ -106,6 +151,16 @@ def action_extensions(base_actions, project_path):
                         'help': 'exclude extra files besides of the project dir. '
                         'This option can be used for multiple times.',
                     },
+                    {
+                        'names': ['--changed-since'],
+                        'help': 'only analyse the files changed since this git revision, '
+                        'and the files including any changed file.',
+                    },
+                    {
+                        'names': ['--force-reconfigure'],
+                        'help': 'always run "idf.py reconfigure", even if the compile commands are up to date.',
+                        'is_flag': True,
+                    },
                     {
                         'names': ['--exit-code'],
                         'help': 'Exit with code based on the results of the code analysis. '
@@ -116,10 +171,8 @@ def action_extensions(base_actions, project_path):
             },
             'clang-html-report': {
                 'callback': call_runner,
-                'help': 'generate html report to "html_report" folder by reading "warnings.txt" '
-                '(may take a few minutes). '
-                'This feature requires extra dependency "codereport". '
-                'Please install this by running "pip install codereport"',
+                'help': 'generate html report to "html_report" folder by reading "warnings.txt". '
+                'Only the pages of the files whose source or findings changed are generated again.',
             },
         }
     }
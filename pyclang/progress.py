@@ -0,0 +1,60 @@
+import time
+from collections import Counter
+
+import typing as t
+
+from rich.console import Console
+from rich.progress import BarColumn, MofNCompleteColumn, Progress, TaskID, TextColumn, TimeRemainingColumn
+from rich.text import Text
+
+
+class ClangTidyProgress(Progress):
+    """
+    Live progress of the clang-tidy run on the console: files completed of the total, throughput, ETA,
+    and the running count of the diagnostics of the most frequent checks.
+
+    >> with ClangTidyProgress(total=len(tus)) as progress:
+    >>     for res in results:
+    >>         progress.advance_file(checks_of_res)
+    """
+
+    def __init__(self, total: t.Optional[int], top_checks: int = 5, console: t.Optional[Console] = None) -> None:
+        # rendered in ``super().__init__`` already
+        self.top_checks = top_checks
+        self.checks: t.Counter[str] = Counter()
+
+        super().__init__(
+            TextColumn('clang-tidy'),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TextColumn('{task.fields[rate]}'),
+            TimeRemainingColumn(),
+            console=console or Console(stderr=True),
+        )
+        self._start = time.monotonic()
+        self._task: TaskID = self.add_task('clang-tidy', total=total, rate='')
+
+    def advance_file(self, checks: t.Optional[t.Iterable[str]] = None) -> None:
+        """
+        One more file is completed, with the checks of its new diagnostics
+        """
+        self.add_checks(checks or [])
+        completed = self.tasks[0].completed + 1
+        self.update(self._task, completed=completed, rate=f'{completed / (time.monotonic() - self._start):.1f} files/s')
+
+    def add_checks(self, checks: t.Iterable[str]) -> None:
+        # the live display renders from its own thread
+        with self._lock:
+            self.checks.update(checks)
+
+    def get_renderables(self) -> t.Iterable[t.Any]:
+        yield self.make_tasks_table(self.tasks)
+        with self._lock:
+            total = sum(self.checks.values())
+            top_checks = self.checks.most_common(self.top_checks)
+        if top_checks:
+            yield Text(
+                f'{total} diagnostics: ' + ', '.join(f'{check or "(no check)"} {count}' for check, count in top_checks),
+                overflow='ellipsis',
+                no_wrap=True,
+            )
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+from collections import Counter
+from functools import partial
+from html import escape as html_escape
+from itertools import groupby
+
+import typing as t
+
+from .diagnostics import Diagnostic
+from .utils import file_digest
+
+STYLE = '''
+body { font-family: sans-serif; margin: 2em; }
+table { border-collapse: collapse; }
+th, td { padding: 2px 8px; text-align: left; vertical-align: top; }
+.nav a { margin-right: 1em; }
+.src td { font-family: monospace; white-space: pre; padding: 0 8px; }
+.src .ln { color: #888; text-align: right; user-select: none; }
+.diag td { font-family: sans-serif; white-space: pre-wrap; background: #fff3cd; }
+.diag.error td { background: #f8d7da; }
+'''
+
+
+def _page(title: str, body: str) -> str:
+    return (
+        '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+        f'<title>{html_escape(title)}</title>\n<style>{STYLE}</style>\n</head>\n'
+        f'<body>\n<h1>{html_escape(title)}</h1>\n{body}</body>\n</html>\n'
+    )
+
+
+def _digest(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode() + b'\0')
+    return h.hexdigest()
+
+
+class HtmlReport:
+    """
+    Static html report of the diagnostics: paginated index pages listing the files with findings,
+    and one page for each of these files, showing the source with the findings inline.
+
+    The digests of the pages are recorded in the manifest, only the pages whose source file or findings changed
+    since the previous report are rendered again.
+
+    >> report = HtmlReport('html_report', base_dir)
+    >> report.write(diagnostics_sorted_by_path)
+    """
+
+    INDEX_FILENAME = 'index.html'
+    MANIFEST_FILENAME = 'manifest.json'
+    FILES_DIRNAME = 'files'
+
+    def __init__(self, report_dir: str, base_dir: str, page_size: int = 100) -> None:
+        self.report_dir = report_dir
+        self.base_dir = base_dir
+        self.page_size = page_size
+
+        self.written = 0
+        self.skipped = 0
+
+        self._old_manifest: t.Dict[str, str] = {}
+        self._manifest: t.Dict[str, str] = {}
+
+    @classmethod
+    def get_index_page_name(cls, page: int) -> str:
+        return cls.INDEX_FILENAME if page == 1 else f'index_{page}.html'
+
+    def get_file_page_name(self, path: str) -> str:
+        return f'{self.FILES_DIRNAME}/{hashlib.sha1(path.encode()).hexdigest()[:16]}.html'
+
+    def _write_page(self, name: str, digest: str, render: t.Callable[[], str]) -> None:
+        self._manifest[name] = digest
+        if self._old_manifest.get(name) == digest and os.path.isfile(os.path.join(self.report_dir, name)):
+            self.skipped += 1
+            return
+
+        with open(os.path.join(self.report_dir, name), 'w') as fw:
+            fw.write(render())
+        self.written += 1
+
+    def _render_file_page(self, path: str, src_path: str, diags: t.List[Diagnostic]) -> str:
+        by_line: t.Dict[int, t.List[Diagnostic]] = {}
+        for diag in diags:
+            by_line.setdefault(diag.line, []).append(diag)
+
+        def _diag_row(_diag: Diagnostic) -> str:
+            text = '\n'.join((_diag.header(), *_diag.notes))
+            return f'<tr class="diag {html_escape(_diag.severity)}"><td></td><td>{html_escape(text)}</td></tr>\n'
+
+        rows = []
+        try:
+            with open(src_path, errors='replace') as fr:
+                for lineno, line in enumerate(fr, start=1):
+                    rows.append(
+                        f'<tr id="L{lineno}"><td class="ln">{lineno}</td><td>{html_escape(line.rstrip())}</td></tr>\n'
+                    )
+                    rows.extend(_diag_row(diag) for diag in by_line.pop(lineno, []))
+        except OSError:
+            pass
+
+        # the findings out of the source, or the source is not found
+        rows[0:0] = [_diag_row(diag) for line in sorted(by_line) for diag in by_line[line]]
+
+        return _page(
+            path,
+            f'<p class="nav"><a href="../{self.INDEX_FILENAME}">index</a></p>\n'
+            f'<table class="src">\n{"".join(rows)}</table>\n',
+        )
+
+    def _render_index_page(
+        self,
+        page: int,
+        pages: int,
+        entries: t.List[t.Tuple[str, str, t.Counter[str]]],
+        checks: t.Counter[str],
+        files: int,
+    ) -> str:
+        nav = ''.join(
+            f'<a href="{self.get_index_page_name(i)}">{i}</a>' if i != page else f'<b>{i}</b>'
+            for i in range(1, pages + 1)
+        )
+        body = f'<p class="nav">{nav}</p>\n' if pages > 1 else ''
+
+        if page == 1:
+            body += f'<p>{sum(checks.values())} findings in {files} files</p>\n'
+            body += '<h2>Checks</h2>\n<table>\n<tr><th>Check</th><th>Findings</th></tr>\n'
+            body += ''.join(
+                f'<tr><td>{html_escape(check or "(no check)")}</td><td>{count}</td></tr>\n'
+                for check, count in checks.most_common()
+            )
+            body += '</table>\n<h2>Files</h2>\n'
+
+        body += '<table>\n<tr><th>File</th><th>Findings</th></tr>\n'
+        body += ''.join(
+            f'<tr><td><a href="{name}">{html_escape(path)}</a></td>'
+            f'<td>{", ".join(f"{count} {html_escape(sev)}" for sev, count in sorted(severities.items()))}</td></tr>\n'
+            for path, name, severities in entries
+        )
+        body += '</table>\n'
+
+        return _page('clang-tidy report', body)
+
+    def write(self, diags: t.Iterable[Diagnostic]) -> int:
+        """
+        Write the report, the diagnostics should be sorted by path, so the ones of one file are read together
+
+        :return: number of the files with findings
+        """
+        os.makedirs(os.path.join(self.report_dir, self.FILES_DIRNAME), exist_ok=True)
+        manifest_fp = os.path.join(self.report_dir, self.MANIFEST_FILENAME)
+        try:
+            with open(manifest_fp) as fr:
+                self._old_manifest = json.load(fr)
+        except (OSError, ValueError):
+            self._old_manifest = {}
+
+        entries = []
+        checks = Counter()
+        for path, group in groupby(diags, key=lambda d: d.path):
+            file_diags = list(group)
+            src_path = os.path.join(self.base_dir, path)
+            name = self.get_file_page_name(path)
+
+            checks.update(diag.check for diag in file_diags)
+            entries.append((path, name, Counter(diag.severity for diag in file_diags)))
+            self._write_page(
+                name,
+                _digest(path, file_digest(src_path), *(diag.to_text() for diag in file_diags)),
+                partial(self._render_file_page, path, src_path, file_diags),
+            )
+
+        pages = max((len(entries) + self.page_size - 1) // self.page_size, 1)
+        for page in range(1, pages + 1):
+            page_entries = entries[(page - 1) * self.page_size : page * self.page_size]
+            content = self._render_index_page(page, pages, page_entries, checks, len(entries))
+            self._write_page(self.get_index_page_name(page), _digest(content), partial(str, content))
+
+        # remove the pages of the files without findings anymore
+        for name in set(self._old_manifest) - set(self._manifest):
+            try:
+                os.remove(os.path.join(self.report_dir, name))
+            except OSError:
+                pass
+
+        with open(manifest_fp, 'w') as fw:
+            json.dump(self._manifest, fw, indent=2, sort_keys=True)
+
+        return len(entries)
@@ -1,20 +1,54 @@
 import json
 import os
+import queue
 import re
 import shutil
 import sys
 import shlex
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
+from contextlib import contextmanager, nullcontext
 from functools import wraps
 from functools import lru_cache
 
 import typing as t
 
+try:
+    import resource
+except ImportError:
+    resource = None
+
 from rich.markup import escape
 from esp_pylib.errors import FatalError
 from esp_pylib.logger import log
 
-from .utils import to_path, run_cmd, to_realpath, FileNotFoundSystemExit, KnownIssue
+from .baseline import Baseline
+from .cache import DEFAULT_CACHE_SIZE, ResultCache, get_clang_tidy_salt
+from .clangd import CLANGD_ARGS, ClangdClient, ClangdError, format_diagnostics, get_clangd_config
+from .deps import IncludeDirs, IncludeScanner, TUCanonicalizer, get_changed_files, get_include_dirs, get_reconfigure_stamp, get_tu_dependencies
+from .progress import ClangTidyProgress
+from .report import HtmlReport
+from .schedule import DurationHistory, estimate_costs, get_default_history_path, longest_first, partition
+from .store import ResultsStore
+from .diagnostics import ANSI_ESCAPE_REGEX, Diagnostic, DiagnosticDeduplicator, DiagnosticParser, parse_file, parse_lines
+from .utils import (
+    atomic_write,
+    to_path,
+    run_cmd,
+    to_realpath,
+    to_str,
+    get_command_args,
+    resolve_file,
+    PathPrefixIndex,
+    FileNotFoundSystemExit,
+    FileDigests,
+)
 
 
 def _remove_prefix(s: str, prefix: str) -> str:
@@ -23,11 +57,35 @@ def _remove_prefix(s: str, prefix: str) -> str:
     return s
 
 
-def _is_exe(filepath: str) -> bool:
-    if sys.platform == 'win32' and os.path.splitext(filepath)[-1].lower() == '.exe':
+@lru_cache(maxsize=None)
+def _normalize_path(path: str, base_dir: str) -> str:
+    norm_path = os.path.relpath(_remove_prefix(os.path.normpath(path), '../'), base_dir)
+    # if still have ../, then it's a system file, should not in idf path
+    if '../' in norm_path:
+        norm_path = '/' + _remove_prefix(norm_path, '../')
+
+    return norm_path
+
+
+def _is_python_script(filepath: str) -> bool:
+    if filepath.endswith('.py'):
         return True
 
-    return False
+    try:
+        with open(filepath, 'rb') as fr:
+            first_line = fr.readline(128)
+    except OSError:
+        return False
+
+    return first_line.startswith(b'#!') and b'python' in first_line
+
+
+def _is_exe(filepath: str) -> bool:
+    if sys.platform == 'win32':
+        return os.path.splitext(filepath)[-1].lower() == '.exe'
+
+    # native binaries like clang-tidy could be called directly, scripts like idf.py need the interpreter
+    return not _is_python_script(filepath)
 
 
 # Modify PATHEXT only once
@@ -59,6 +117,541 @@ def _get_call_cmd(filepath: str) -> t.List[str]:
     return [fullpath] if _is_exe(fullpath) else [sys.executable, fullpath]
 
 
+CHECK_PROFILE_KEY_REGEX = re.compile(r'^time\.clang-tidy\.(.+)\.wall$')
+OUT_OF_MEMORY_REGEX = re.compile(r'out of memory|std::bad_alloc|Cannot allocate memory|MemoryError', re.IGNORECASE)
+
+# categories of the translation units that clang-tidy failed on because of the resource limits
+FAILURE_TIMEOUT = 'timeout'
+FAILURE_OOM = 'oom'
+
+_SIGKILL = getattr(signal, 'SIGKILL', 9)
+
+
+class _ProcessResult(t.NamedTuple):
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+    # in seconds, 0 if the resource usage is not available
+    cpu_time: float = 0.0
+    # in bytes, 0 if the resource usage is not available
+    max_rss: int = 0
+    timed_out: bool = False
+
+
+# sets the address space limit and execs the command, ``preexec_fn`` is not safe to use from the worker threads
+_MEMORY_LIMIT_WRAPPER = (
+    'import os, resource, sys; '
+    'resource.setrlimit(resource.RLIMIT_AS, (int(sys.argv[1]), int(sys.argv[1]))); '
+    'os.execvp(sys.argv[2], sys.argv[2:])'
+)
+
+
+class _WaitedProcess:
+    """
+    A process waited by ``os.wait4``, which could be killed from the other threads until it's reaped.
+
+    ``Popen.kill`` is not used, since it may reap the process by ``poll`` before ``os.wait4``,
+    or signal another process reusing the pid once it's reaped.
+    """
+
+    def __init__(self, cmd: t.List[str], **kwargs) -> None:
+        self.popen = subprocess.Popen(cmd, **kwargs)
+        self._lock = threading.Lock()
+        self._reaped = False
+
+    def kill(self) -> None:
+        with self._lock:
+            if not self._reaped:
+                os.kill(self.popen.pid, _SIGKILL)
+
+    def wait4(self) -> t.Tuple[int, t.Any]:
+        """
+        :return: return code, resource usage, which is None if the process is already reaped by ``Popen``
+        """
+        try:
+            _, status, rusage = os.wait4(self.popen.pid, 0)
+        except ChildProcessError:
+            return self.popen.wait(), None
+        finally:
+            with self._lock:
+                self._reaped = True
+
+        return (-os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)), rusage
+
+
+class _RunningProcesses:
+    """
+    The processes started by the threads of a driver, which could be all killed at once when the driver stops early.
+    The ones started after ``kill_all`` are killed right away.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._procs: t.Set[t.Union[subprocess.Popen, _WaitedProcess]] = set()
+        self._killed = False
+
+    @contextmanager
+    def track(self, proc: t.Union[subprocess.Popen, _WaitedProcess]) -> t.Iterator[None]:
+        with self._lock:
+            self._procs.add(proc)
+            killed = self._killed
+
+        if killed:
+            proc.kill()
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._procs.discard(proc)
+
+    def kill_all(self) -> None:
+        with self._lock:
+            self._killed = True
+            procs = list(self._procs)
+
+        for proc in procs:
+            proc.kill()
+
+
+def _run_with_rusage(
+    cmd: t.List[str],
+    cwd: t.Optional[str] = None,
+    timeout: t.Optional[float] = None,
+    memory_limit: t.Optional[int] = None,
+    running: t.Optional[_RunningProcesses] = None,
+) -> _ProcessResult:
+    """
+    Run the command and measure the resources used by it
+
+    :param timeout: kill the process after this many seconds
+    :param memory_limit: address space limit of the process in bytes, ignored if ``resource`` is not available
+    :param running: track the process in it while it's running
+    """
+    if memory_limit and resource is not None:
+        cmd = [sys.executable, '-c', _MEMORY_LIMIT_WRAPPER, str(memory_limit), *cmd]
+
+    if not hasattr(os, 'wait4'):
+        p = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with running.track(p) if running else nullcontext():
+            try:
+                stdout, stderr = p.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                p.kill()
+                stdout, stderr = p.communicate()
+                return _ProcessResult(-_SIGKILL, stdout, stderr, timed_out=True)
+
+        return _ProcessResult(p.returncode, stdout, stderr)
+
+    # the output is buffered in files instead of pipes, so the process could be waited by ``os.wait4`` directly
+    with tempfile.TemporaryFile() as fout, tempfile.TemporaryFile() as ferr:
+        p = _WaitedProcess(cmd, cwd=cwd, stdout=fout, stderr=ferr)
+
+        timed_out = threading.Event()
+
+        def _kill() -> None:
+            timed_out.set()
+            p.kill()
+
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, _kill)
+            timer.start()
+
+        try:
+            with running.track(p) if running else nullcontext():
+                returncode, rusage = p.wait4()
+        finally:
+            if timer:
+                timer.cancel()
+
+        fout.seek(0)
+        ferr.seek(0)
+        stdout, stderr = fout.read(), ferr.read()
+
+    cpu_time, max_rss = 0.0, 0
+    if rusage is not None:
+        cpu_time = rusage.ru_utime + rusage.ru_stime
+        # ru_maxrss is in kilobytes on linux, in bytes on macOS
+        max_rss = rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+
+    return _ProcessResult(
+        returncode,
+        stdout,
+        stderr,
+        cpu_time,
+        max_rss,
+        # the timer may fire right after the process exits by itself
+        timed_out.is_set() and returncode == -_SIGKILL,
+    )
+
+
+def _read_check_profile(profile_dir: str) -> t.Dict[str, float]:
+    """
+    Read the wall time of each check from the files written by clang-tidy ``-store-check-profile``
+    """
+    res: t.Dict[str, float] = {}
+    for fn in os.listdir(profile_dir):
+        if not fn.endswith('.json'):
+            continue
+
+        with open(os.path.join(profile_dir, fn)) as fr:
+            profile = json.load(fr).get('profile', {})
+
+        for key, value in profile.items():
+            match = CHECK_PROFILE_KEY_REGEX.match(key)
+            if match:
+                res[match.group(1)] = res.get(match.group(1), 0.0) + value
+
+    return res
+
+
+class TranslationUnit(t.NamedTuple):
+    """
+    A file in the compilation database. clang-tidy runs under ``cwd`` with ``-p db_dir``.
+    ``arguments`` and ``directory`` are the compile command of the file.
+    """
+
+    file: str
+    db_dir: str
+    cwd: str
+    arguments: t.Tuple[str, ...] = ()
+    directory: str = ''
+
+
+class TUResult(t.NamedTuple):
+    tu: TranslationUnit
+    returncode: int
+    stdout: str
+    stderr: str
+    elapsed: float
+    cached: bool = False
+    cpu_time: float = 0.0
+    # in bytes
+    max_rss: int = 0
+    # wall time of each check in seconds, only set if ``check_profile`` is enabled in the driver
+    check_profile: t.Optional[t.Dict[str, float]] = None
+    # ``FAILURE_TIMEOUT`` or ``FAILURE_OOM`` if clang-tidy is stopped by the resource limits, kept if the retry succeeds
+    failure: t.Optional[str] = None
+    # if it's the result of the isolated retry
+    retried: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+class _CachingDriver:
+    """
+    Base of the drivers, the output of unchanged translation units is replayed from ``cache`` if it's set
+    """
+
+    cache: t.Optional[ResultCache]
+    clang_tidy_args: t.List[str]
+    _cache_salt: t.Optional[str]
+
+    def _load_cache_salt(self, cmd: t.List[str]) -> None:
+        """
+        Get the salt of the cache keys once, before analysing any translation unit
+
+        :param cmd: command of the analysing tool, its version is part of the salt
+        """
+        if self.cache and self._cache_salt is None:
+            self._cache_salt = get_clang_tidy_salt(cmd, self.clang_tidy_args)
+
+    def _run_cached(self, tu: TranslationUnit, analyse: t.Callable[[], TUResult]) -> TUResult:
+        """
+        Replay the output of the translation unit from the cache, otherwise ``analyse`` it and cache the output
+        """
+        if not self.cache:
+            return analyse()
+
+        cache_key = self.cache.get_key(tu, self._cache_salt)
+        stdout = self.cache.get(cache_key)
+        if stdout is not None:
+            return TUResult(tu, 0, stdout, '', 0.0, cached=True)
+
+        res = analyse()
+        # failed runs are not cached, they may be caused by the environment, like missing generated headers
+        if res.ok:
+            self.cache.put(cache_key, res.stdout)
+
+        return res
+
+
+class ClangTidyDriver(_CachingDriver):
+    """
+    Run clang-tidy directly, one process per translation unit, at most ``jobs`` processes at the same time.
+    If ``cache`` is set, the output of unchanged translation units is replayed from it instead.
+    If ``check_profile`` is set, clang-tidy runs with ``--enable-check-profile`` to record the time spent in each check.
+
+    Each clang-tidy process is killed after ``timeout`` seconds, and limited to ``memory_limit`` bytes of address space.
+    If ``retry_isolated`` is set, the translation units failed because of these limits are retried once after all the
+    others are done, one by one, without the memory limit and with ``RETRY_TIMEOUT_SCALE`` times the timeout.
+
+    >> driver = ClangTidyDriver(['clang-tidy'], ['-checks=bugprone-*'], jobs=8)
+    >> for res in driver.run(translation_units):
+    >>     print(res.tu.file, res.returncode, res.stdout)
+    """
+
+    RETRY_TIMEOUT_SCALE = 2
+
+    def __init__(
+        self,
+        clang_tidy_cmd: t.List[str],
+        clang_tidy_args: t.Optional[t.List[str]] = None,
+        jobs: int = os.cpu_count(),
+        cache: t.Optional[ResultCache] = None,
+        check_profile: bool = False,
+        timeout: t.Optional[float] = None,
+        memory_limit: t.Optional[int] = None,
+        retry_isolated: bool = False,
+    ):
+        self.clang_tidy_cmd = clang_tidy_cmd
+        self.clang_tidy_args = clang_tidy_args or []
+        self.jobs = jobs
+        self.cache = cache
+        self.check_profile = check_profile
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.retry_isolated = retry_isolated
+
+        self._cache_salt: t.Optional[str] = None
+
+    def get_cmd(self, tu: TranslationUnit) -> t.List[str]:
+        return self.clang_tidy_cmd + ['-p', tu.db_dir] + self.clang_tidy_args + [tu.file]
+
+    def run_one(
+        self, tu: TranslationUnit, isolated: bool = False, running: t.Optional[_RunningProcesses] = None
+    ) -> TUResult:
+        """
+        :param isolated: run without the memory limit and with a longer timeout, for the isolated retry
+        :param running: track the clang-tidy process in it while it's running
+        """
+        return self._run_cached(tu, lambda: self._run_clang_tidy(tu, isolated, running))
+
+    def _run_clang_tidy(
+        self, tu: TranslationUnit, isolated: bool, running: t.Optional[_RunningProcesses]
+    ) -> TUResult:
+        cmd = self.get_cmd(tu)
+        check_profile = None
+        with tempfile.TemporaryDirectory() if self.check_profile else nullcontext() as profile_dir:
+            if profile_dir:
+                cmd[len(self.clang_tidy_cmd) : len(self.clang_tidy_cmd)] = [
+                    '--enable-check-profile',
+                    f'--store-check-profile={profile_dir}',
+                ]
+
+            timeout = self.timeout
+            if isolated and timeout:
+                timeout *= self.RETRY_TIMEOUT_SCALE
+
+            start = time.monotonic()
+            p = _run_with_rusage(
+                cmd,
+                cwd=tu.cwd,
+                timeout=timeout,
+                memory_limit=None if isolated else self.memory_limit,
+                running=running,
+            )
+            elapsed = time.monotonic() - start
+
+            if profile_dir:
+                check_profile = _read_check_profile(profile_dir)
+
+        stderr = to_str(p.stderr)
+        failure = None
+        if p.timed_out:
+            failure = FAILURE_TIMEOUT
+        elif p.returncode != 0 and not isolated and self.memory_limit:
+            # std::bad_alloc when reaching the address space limit, or SIGKILL from the OOM killer
+            if OUT_OF_MEMORY_REGEX.search(stderr) or p.returncode == -_SIGKILL:
+                failure = FAILURE_OOM
+
+        return TUResult(
+            tu,
+            p.returncode,
+            to_str(p.stdout),
+            stderr,
+            elapsed,
+            cpu_time=p.cpu_time,
+            max_rss=p.max_rss,
+            check_profile=check_profile,
+            failure=failure,
+            retried=isolated,
+        )
+
+    def run(self, tus: t.Iterable[TranslationUnit]) -> t.Iterator[TUResult]:
+        """
+        Yield the results in the order of completion, the results of the isolated retries come last
+        """
+        self._load_cache_salt(self.clang_tidy_cmd)
+
+        to_retry = []
+        running = _RunningProcesses()
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [executor.submit(self.run_one, tu, running=running) for tu in tus]
+            try:
+                for future in as_completed(futures):
+                    res = future.result()
+                    if res.failure and self.retry_isolated:
+                        to_retry.append(res)
+                        continue
+
+                    yield res
+            finally:
+                # if the consumer stops early, the executor shouldn't wait for the remaining translation units
+                for future in futures:
+                    future.cancel()
+                running.kill_all()
+
+        # keep the failure of the first run, even if the retry succeeds
+        for res in to_retry:
+            retried_res = self.run_one(res.tu, isolated=True)
+            yield retried_res._replace(failure=retried_res.failure or res.failure)
+
+
+class ClangdDriver(_CachingDriver):
+    """
+    Analyse the translation units with a pool of ``jobs`` long-lived clangd processes over LSP, with the clang-tidy
+    checks enabled and the background index off. The ``-checks`` in ``clang_tidy_args`` are passed to clangd by a
+    temporary user config, see ``get_clangd_config``. The diagnostics are formatted like the clang-tidy output.
+
+    The translation units with the same compilation database and include dirs, which mostly include the same headers,
+    are analysed one after another by the same clangd process, while the headers are hot in the caches.
+    The groups are split into chunks, so the load is still balanced among the processes. Each worker runs one clangd
+    process at a time, which is restarted for the chunks of another compilation database.
+
+    If ``cache`` is set, the output of unchanged translation units is replayed from it instead.
+    Each translation unit waits at most ``timeout`` seconds for its diagnostics, the clangd process is restarted after.
+
+    >> driver = ClangdDriver(['clangd'], ['-checks=bugprone-*'], jobs=8)
+    >> for res in driver.run(translation_units):
+    >>     print(res.tu.file, res.returncode, res.stdout)
+    """
+
+    CONFIG_FILENAME = 'config.yaml'
+
+    def __init__(
+        self,
+        clangd_cmd: t.List[str],
+        clang_tidy_args: t.Optional[t.List[str]] = None,
+        jobs: int = os.cpu_count(),
+        cache: t.Optional[ResultCache] = None,
+        timeout: t.Optional[float] = None,
+    ):
+        self.clangd_cmd = clangd_cmd
+        self.clang_tidy_args = clang_tidy_args or []
+        self.jobs = jobs
+        self.cache = cache
+        self.timeout = timeout
+
+        self._cache_salt: t.Optional[str] = None
+
+    def _get_client(self, clients: t.Dict[str, ClangdClient], db_dir: str, env: t.Dict[str, str]) -> ClangdClient:
+        """
+        Get the clangd process of the compilation database, started if it's not running.
+        Each worker keeps at most one, the one of the previous compilation database is closed.
+        """
+        client = clients.get(db_dir)
+        if client is None or not client.alive:
+            for other in clients.values():
+                other.close()
+            clients.clear()
+
+            client = clients[db_dir] = ClangdClient(
+                self.clangd_cmd + CLANGD_ARGS + [f'--compile-commands-dir={db_dir}'], env=env
+            )
+
+        return client
+
+    def _analyse(
+        self, clients: t.Dict[str, ClangdClient], tu: TranslationUnit, env: t.Dict[str, str]
+    ) -> TUResult:
+        start = time.monotonic()
+        client = None
+        try:
+            client = self._get_client(clients, tu.db_dir, env)
+            diagnostics = client.analyse(tu.file, self.timeout)
+        except TimeoutError:
+            clients.pop(tu.db_dir).kill()
+            return TUResult(
+                tu, -_SIGKILL, '', 'clangd timed out', time.monotonic() - start, failure=FAILURE_TIMEOUT
+            )
+        except (ClangdError, OSError) as e:
+            # a dead clangd process is restarted by the next translation unit
+            return TUResult(tu, (client and client.proc.poll()) or 1, '', str(e), time.monotonic() - start)
+
+        stdout = format_diagnostics(tu.file, diagnostics)
+        # same as clang-tidy
+        compiler_error = any(d.get('source') == 'clang' and d.get('severity') == 1 for d in diagnostics)
+        return TUResult(
+            tu,
+            1 if compiler_error else 0,
+            stdout,
+            'Found compiler error(s).\n' if compiler_error else '',
+            time.monotonic() - start,
+        )
+
+    def _work(self, chunks: queue.Queue, results: queue.Queue, env: t.Dict[str, str]) -> None:
+        clients: t.Dict[str, ClangdClient] = {}
+        try:
+            while True:
+                try:
+                    chunk = chunks.get_nowait()
+                except queue.Empty:
+                    break
+
+                for tu in chunk:
+                    results.put(self._run_cached(tu, lambda: self._analyse(clients, tu, env)))
+        finally:
+            for client in clients.values():
+                client.close()
+            results.put(None)
+
+    def run(self, tus: t.Iterable[TranslationUnit]) -> t.Iterator[TUResult]:
+        """
+        Yield the results in the order of completion. The groups start in the order of their first translation unit.
+        """
+        self._load_cache_salt(self.clangd_cmd)
+
+        groups: t.Dict[t.Tuple[str, IncludeDirs], t.List[TranslationUnit]] = {}
+        for tu in tus:
+            groups.setdefault((tu.db_dir, get_include_dirs(list(tu.arguments), tu.directory)), []).append(tu)
+
+        chunk_size = max(sum(len(group) for group in groups.values()) // (self.jobs * 4), 1)
+        chunks = queue.Queue()
+        for group in groups.values():
+            for i in range(0, len(group), chunk_size):
+                chunks.put(group[i : i + chunk_size])
+
+        with tempfile.TemporaryDirectory() as config_home:
+            os.makedirs(os.path.join(config_home, 'clangd'))
+            with open(os.path.join(config_home, 'clangd', self.CONFIG_FILENAME), 'w') as fw:
+                fw.write(get_clangd_config(self.clang_tidy_args))
+            env = dict(os.environ, XDG_CONFIG_HOME=config_home)
+
+            results = queue.Queue()
+            workers = [
+                threading.Thread(target=self._work, args=(chunks, results, env), daemon=True)
+                for _ in range(min(self.jobs, chunks.qsize()))
+            ]
+            for worker in workers:
+                worker.start()
+
+            running = len(workers)
+            while running:
+                res = results.get()
+                if res is None:
+                    running -= 1
+                    continue
+
+                yield res
+
+            for worker in workers:
+                worker.join()
+
+
 class Runner:
     """
     Should be used with:
@@ -70,11 +663,6 @@ class Runner:
     all related other params should be passed by ``__init__`` function to the Runner itself
     """
 
-    CLANG_TIDY_WARNING_REGEX = re.compile(
-        # FILE_PATH:  LINENO:  COL:SEVERITY:MSG [ERROR IDENTIFIER]
-        r'([\w/.\- ]+):(\d+):(\d+): (.+): (.+) \[([\w\-,.]+)]'
-    )
-
     CLANG_TIDY_PATH_REGEX = re.compile(
         # FILE_PATH:  LINENO:  COL:SEVERITY:
         r'([\w/.\- ]+):(\d+):(\d+): (.+):'
@@ -82,21 +670,21 @@ class Runner:
 
     WARN_FILENAME = 'warnings.txt'
     COMPILE_COMMANDS_FILENAME = 'compile_commands.json'
-
-    ANSI_ESCAPE_REGEX = re.compile(
-        r'''
-        \x1B  # ESC
-        (?:   # 7-bit C1 Fe (except CSI)
-            [@-Z\\-_]
-        |     # or [ for CSI, followed by a control sequence
-            \[
-            [0-?]*  # Parameter bytes
-            [ -/]*  # Intermediate bytes
-            [@-~]   # Final byte
-        )
-    ''',
-        re.VERBOSE,
-    )
+    # the rewritten and filtered compile commands are written under the build dir, the one generated by CMake is kept
+    ANALYSIS_DB_DIRNAME = 'pyclang'
+    RECONFIGURE_STAMP_FILENAME = 'reconfigure.stamp'
+    # steps writing the analysis database, the old one is removed before running them
+    ANALYSIS_DB_STEPS = ('remove_command_flags', 'filter_cmd')
+    RESULTS_DB_FILENAME = 'results.db'
+    # fingerprint: number of translation units reporting the diagnostic, only the ones reported more than once
+    TU_COUNTS_FILENAME = 'tu_counts.json'
+    TIMINGS_FILENAME = 'timings.json'
+    SHARD_MANIFEST_FILENAME = 'shard.json'
+    NEW_WARN_FILENAME = 'new_warnings.txt'
+
+    BACKENDS = ('clang-tidy', 'clangd')
+
+    ANSI_ESCAPE_REGEX = ANSI_ESCAPE_REGEX
 
     GCC_FLAGS_MAPPING = {
         '-fstrict-volatile-bitfields': '',
@@ -119,15 +707,35 @@ class Runner:
         build_dir: str = 'build',
         output_path: t.Optional[str] = None,
         log_path: t.Optional[str] = None,
+        progress: bool = False,
+        force_reconfigure: bool = False,
+        idf_py: t.Optional[str] = None,
         # filter arguments
         all_files: bool = False,
         include_paths: t.Optional[t.List[str]] = None,
         exclude_paths: t.Optional[t.List[str]] = None,
         ignore_clang_checks: t.Optional[t.List[str]] = None,
         checks_limitations: t.Optional[t.Dict[str, int]] = None,
+        baseline: t.Optional[str] = None,
+        update_baseline: bool = False,
+        changed_since: t.Optional[str] = None,
+        filter_summary: bool = False,
         xtensa_include_dirs: t.Optional[str] = None,
         # run_clang_tidy related
         run_clang_tidy_py: t.Optional[str] = None,
+        clang_tidy: t.Optional[str] = None,
+        backend: str = 'clang-tidy',
+        clangd: t.Optional[str] = None,
+        cache_dir: t.Optional[str] = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        check_profile: bool = False,
+        profile_top: int = 10,
+        tu_timeout: t.Optional[float] = None,
+        tu_memory_limit: t.Optional[int] = None,
+        retry_isolated: bool = False,
+        shard_index: int = 0,
+        shard_count: int = 1,
+        duration_history: t.Optional[str] = None,
         check_files_regex: t.Optional[t.List[str]] = None,
         clang_extra_args: str = (
             r'-header-filter=".*\..*" '
@@ -137,18 +745,23 @@ class Runner:
         ),
         # normalize arguments
         base_dir: str = os.getenv('IDF_PATH', os.getcwd()),
+        # merge arguments
+        merge_dir: t.Optional[str] = None,
+        merge_report: bool = False,
         **kwargs,
     ):
         self.dirs = dirs
 
-        # TODO: multi-process support. currently the closure function in ``chain`` can't be serialized by pickle,
-        #   so we can't use ProcessPoolExecutor
-        self.cores = len(dirs) if len(dirs) < cores else cores
+        # each folder runs its call chain in a separate process, clang-tidy jobs of all folders share one pool
+        self.cores = cores
 
         # general arguments
         self.build_dir = build_dir
         self.output_path = output_path
         self.log_path = log_path
+        self.progress = progress
+        self.force_reconfigure = force_reconfigure
+        self._idf_py = idf_py
 
         # filter arguments
         self.all_files = all_files
@@ -158,13 +771,35 @@ class Runner:
         self.exclude_paths = (
             [to_path(p) for p in exclude_paths] if exclude_paths else []
         )
+        self.exclude_index = PathPrefixIndex(self.exclude_paths)
         self.ignore_clang_checks = ignore_clang_checks
         self.checks_limitations = checks_limitations
+        self.baseline = baseline
+        self.update_baseline = update_baseline
+        self.changed_since = changed_since
+        self.filter_summary = filter_summary
 
         self.xtensa_include_dir = xtensa_include_dirs
 
         # run_clang_tidy arguments
         self._run_clang_tidy_py = run_clang_tidy_py
+        self._clang_tidy = clang_tidy
+        if backend not in self.BACKENDS:
+            raise FatalError(f'Invalid backend "{backend}", should be one of {", ".join(self.BACKENDS)}')
+        self.backend = backend
+        self._clangd = clangd
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.check_profile = check_profile
+        self.profile_top = profile_top
+        self.tu_timeout = tu_timeout
+        self.tu_memory_limit = tu_memory_limit
+        self.retry_isolated = retry_isolated
+        if not 0 <= shard_index < shard_count:
+            raise FatalError(f'Invalid shard index {shard_index} of {shard_count} shards')
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.duration_history = duration_history
 
         self.check_files_regex = check_files_regex if check_files_regex else ['.*']
         self.clang_extra_args = clang_extra_args
@@ -172,6 +807,10 @@ class Runner:
         # normalize arguments
         self.base_dir = base_dir
 
+        # merge arguments
+        self.merge_dir = merge_dir
+        self.merge_report = merge_report
+
         # assign the rest arguments
         for k, v in kwargs.items():
             setattr(self, str(k), v)
@@ -184,7 +823,7 @@ class Runner:
 
     @property
     def idf_py_cmd(self) -> t.List[str]:
-        return _get_call_cmd('idf.py')
+        return _get_call_cmd(self._idf_py or 'idf.py')
 
     @property
     def run_clang_tidy_py_cmd(self) -> t.List[str]:
@@ -196,9 +835,71 @@ class Runner:
             except FileNotFoundSystemExit:
                 return _get_call_cmd('run-clang-tidy.py')
 
-    def _run(self, folder, output_dir):
-        for func in self._call_chain:
-            func(folder, output_dir)
+    def _step(self, name: str) -> t.Callable:
+        # the undecorated function, ``chain`` only records the step name
+        return getattr(type(self), name).__wrapped__
+
+    def _stages(self) -> t.List[t.Tuple[bool, t.List[str]]]:
+        """
+        Split the call chain into stages. Each ``@chain_all`` step is a stage on its own,
+        consecutive ``@chain`` steps are grouped into one stage that runs per folder.
+        """
+        stages = []
+        for name in self._call_chain:
+            all_dirs = getattr(self._step(name), 'all_dirs', False)
+            if stages and not all_dirs and not stages[-1][0]:
+                stages[-1][1].append(name)
+            else:
+                stages.append((all_dirs, [name]))
+
+        return stages
+
+    def _get_output_dir(self, folder: str) -> str:
+        if self.output_path:
+            output_dir = os.path.join(self.output_path, os.path.basename(folder))
+            os.makedirs(output_dir, exist_ok=True)
+        else:
+            output_dir = folder
+
+        return output_dir
+
+    @property
+    def clang_tidy_cmd(self) -> t.List[str]:
+        return _get_call_cmd(self._clang_tidy or self._split_clang_extra_args()[0])
+
+    @property
+    def clangd_cmd(self) -> t.List[str]:
+        return _get_call_cmd(self._clangd or 'clangd')
+
+    def _run(self, folder, output_dir, steps):
+        for name in steps:
+            self._step(name)(self, folder, output_dir)
+
+    def _run_folder(self, folder: str, steps: t.List[str], log_fn: t.Optional[str] = None) -> None:
+        log_file = None
+        if log_fn:
+            log_file = open(log_fn, 'a')
+            log.set_console_options(file=log_file)
+
+        try:
+            self._run(folder, self._get_output_dir(folder), steps)
+        finally:
+            if log_file is not None:
+                log_file.close()
+            log.set_console_options()
+
+    def _run_all_dirs(self, name: str, log_fn: t.Optional[str] = None) -> None:
+        log_file = None
+        if log_fn:
+            log_file = open(log_fn, 'a')
+            log.set_console_options(file=log_file)
+
+        try:
+            self._step(name)(self, [(folder, self._get_output_dir(folder)) for folder in self.dirs])
+        finally:
+            if log_file is not None:
+                log_file.close()
+            log.set_console_options()
 
     def __call__(self):
         """
@@ -206,36 +907,48 @@ class Runner:
         - folder: folder that need to run clang-tidy check
         - output_dir: output folder
 
+        Functions decorated with `@chain_all` get a list of (folder, output_dir) tuples instead.
+
+        Each folder runs the `@chain` steps in its own process, at most ``cores`` folders at the same time.
+        The `@chain_all` steps run in the main process once all folders finished the previous steps.
+
         Pipeline trace output is routed via `log.set_console_options`: to a
         per-folder log file when `--log-path` is set, otherwise to stdout.
         """
-        for folder in self.dirs:
-            log_file = None
-            if self.log_path:
-                log_file = open(
-                    os.path.join(
-                        self.log_path,
-                        '{}_{}.log'.format(
-                            datetime.now().strftime('%Y-%m-%d_%H:%M:%S'),
-                            os.path.basename(folder),
-                        ),
-                    ),
-                    'w',
+        log_fns = {}
+        if self.log_path:
+            timestamp = datetime.now().strftime('%Y-%m-%d_%H:%M:%S')
+            for folder in self.dirs:
+                log_fns[folder] = os.path.join(
+                    self.log_path,
+                    f'{timestamp}_{os.path.basename(folder)}.log',
                 )
-                log.set_console_options(file=log_file)
+            for name in self._call_chain:
+                if getattr(self._step(name), 'all_dirs', False):
+                    log_fns[name] = os.path.join(self.log_path, f'{timestamp}_{name}.log')
+
+        if any(name in self.ANALYSIS_DB_STEPS for name in self._call_chain):
+            for folder in self.dirs:
+                self._remove_analysis_db(folder)
+
+        workers = min(len(self.dirs), self.cores)
+        for all_dirs, steps in self._stages():
+            if all_dirs:
+                self._run_all_dirs(steps[0], log_fns.get(steps[0]))
+                continue
 
-            if self.output_path:
-                output_dir = os.path.join(self.output_path, os.path.basename(folder))
-                os.makedirs(output_dir, exist_ok=True)
-            else:
-                output_dir = folder
+            if workers <= 1:
+                for folder in self.dirs:
+                    self._run_folder(folder, steps, log_fns.get(folder))
+                continue
 
-            try:
-                self._run(folder, output_dir)
-            finally:
-                if log_file is not None:
-                    log_file.close()
-                log.set_console_options()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(self._run_folder, folder, steps, log_fns.get(folder)) for folder in self.dirs
+                ]
+                # re-raise the first failure in ``dirs`` order, the rest of the folders are still finished
+                for future in futures:
+                    future.result()
 
     def chain(func):
         """
@@ -244,18 +957,41 @@ class Runner:
         Restrictions:
             All the wrapped functions should only take argument ``folder``, return ``self``.
             ``folder`` must be optional to fool the interpreter and passed through this decorator
+
+        Only the function name is recorded, so the call chain could be pickled and sent to the worker processes.
         """
 
         @wraps(func)
         def wrapper(self):
-            def _f(*args, **kwargs):
-                return func(self, *args, **kwargs)
+            self._call_chain.append(func.__name__)
+            return self
+
+        return wrapper
 
-            self._call_chain.append(_f)
+    def chain_all(func):
+        """
+        Same as ``chain``, but the wrapped function is called only once, with a list of ``(folder, output_dir)``
+        tuples as the only argument, after all the folders finished the previous steps.
+        """
+        func.all_dirs = True
+
+        @wraps(func)
+        def wrapper(self):
+            self._call_chain.append(func.__name__)
             return self
 
         return wrapper
 
+    @staticmethod
+    @contextmanager
+    def _rewrite(filepath: str) -> t.Iterator[t.Tuple[t.TextIO, t.TextIO]]:
+        """
+        Read the file line by line and write the new content into a temp file,
+        which replaces the file if no exception is raised
+        """
+        with atomic_write(filepath) as fw, open(filepath) as fr:
+            yield fr, fw
+
     def get_check_warn_file(self, output_dir: str) -> str:
         warn_file = os.path.join(output_dir, self.WARN_FILENAME)
         if not os.path.isfile(warn_file):
@@ -269,31 +1005,136 @@ class Runner:
     def idf_reconfigure(self, *args):
         """
         Run "idf.py reconfigure" to get the compiled commands
+
+        Skipped if the compile commands exist and nothing affecting the CMake configuration changed
+        since the last reconfigure, unless ``force_reconfigure`` is set
         """
         folder = args[0]
+        build_dir = os.path.join(folder, self.build_dir)
+        stamp_fp = os.path.join(self.get_analysis_db_dir(folder), self.RECONFIGURE_STAMP_FILENAME)
+
+        if not self.force_reconfigure and os.path.isfile(os.path.join(build_dir, self.COMPILE_COMMANDS_FILENAME)):
+            try:
+                with open(stamp_fp) as fr:
+                    stamp = fr.read().strip()
+            except OSError:
+                stamp = None
+
+            if stamp and stamp == get_reconfigure_stamp(folder, build_dir):
+                log.print(f'Compile commands of {escape(folder)} are up to date, skip reconfigure')
+                return
 
         run_cmd(
             self.idf_py_cmd + ['-B', self.build_dir, 'reconfigure'],
             cwd=folder,
         )
 
+        # sdkconfig and CMakeCache.txt are rewritten by the reconfigure itself
+        os.makedirs(os.path.dirname(stamp_fp), exist_ok=True)
+        with open(stamp_fp, 'w') as fw:
+            fw.write(get_reconfigure_stamp(folder, build_dir))
+
+    def get_analysis_db_dir(self, folder: str) -> str:
+        return os.path.join(folder, self.build_dir, self.ANALYSIS_DB_DIRNAME)
+
+    def get_compile_commands_path(self, folder: str) -> str:
+        """
+        The analysis database if it's written, otherwise the one generated by CMake
+        """
+        analysis_db_fp = os.path.join(self.get_analysis_db_dir(folder), self.COMPILE_COMMANDS_FILENAME)
+        if os.path.isfile(analysis_db_fp):
+            return analysis_db_fp
+
+        return os.path.join(folder, self.build_dir, self.COMPILE_COMMANDS_FILENAME)
+
+    def _load_compile_commands(self, folder: str) -> t.List[t.Dict[str, t.Any]]:
+        with open(self.get_compile_commands_path(folder)) as fr:
+            return json.load(fr)
+
+    def _dump_compile_commands(self, folder: str, commands: t.List[t.Dict[str, t.Any]]) -> None:
+        analysis_db_dir = self.get_analysis_db_dir(folder)
+        os.makedirs(analysis_db_dir, exist_ok=True)
+        with open(os.path.join(analysis_db_dir, self.COMPILE_COMMANDS_FILENAME), 'w') as fw:
+            # much faster than streaming with ``json.dump``, which has no C implementation
+            fw.write(json.dumps(commands))
+
+    def _remove_analysis_db(self, folder: str) -> None:
+        analysis_db_fp = os.path.join(self.get_analysis_db_dir(folder), self.COMPILE_COMMANDS_FILENAME)
+        if os.path.isfile(analysis_db_fp):
+            os.remove(analysis_db_fp)
+
+    def _get_args_rewriter(self) -> t.Callable[[t.List[str]], t.List[str]]:
+        """
+        Compile ``GCC_FLAGS_MAPPING`` and ``PREFIX_MAP_MAPPING`` into a function mapping each argument once,
+        the arguments mapped to empty strings are dropped
+        """
+        flags_mapping = self.GCC_FLAGS_MAPPING
+        prefix_map_mapping = list(self.PREFIX_MAP_MAPPING.items())
+        # rejects most of the arguments with one match, before trying the patterns one by one
+        any_prefix_map = re.compile('|'.join(f'(?:{pattern.pattern})' for pattern, _ in prefix_map_mapping))
+
+        # the same include dirs and flags are in most of the commands
+        mapped: t.Dict[str, str] = {}
+
+        def _map(arg: str) -> str:
+            if arg in flags_mapping:
+                return flags_mapping[arg]
+            if prefix_map_mapping and any_prefix_map.fullmatch(arg):
+                for pattern, repl in prefix_map_mapping:
+                    if pattern.fullmatch(arg):
+                        return repl
+            return arg
+
+        def _rewrite(args: t.List[str]) -> t.List[str]:
+            res = []
+            for arg in args:
+                new_arg = mapped.get(arg)
+                if new_arg is None:
+                    new_arg = mapped[arg] = _map(arg)
+
+                if new_arg:
+                    res.append(new_arg)
+
+            return res
+
+        return _rewrite
+
     @chain
     def remove_command_flags(self, *args):
+        """
+        Rewrite the compiler arguments that clang doesn't understand, into the analysis database
+        """
         folder = args[0]
 
-        compiled_command_fp = os.path.join(
-            folder, self.build_dir, self.COMPILE_COMMANDS_FILENAME
-        )
-        with open(compiled_command_fp) as fr:
-            file_str = fr.read()
-            for k, v in self.GCC_FLAGS_MAPPING.items():
-                file_str = file_str.replace(f' {k} ', ' ' if not v else f' {v} ')
+        rewrite = self._get_args_rewriter()
+        commands = self._load_compile_commands(folder)
+        for command in commands:
+            command['arguments'] = rewrite(get_command_args(command))
+            command.pop('command', None)
+
+        self._dump_compile_commands(folder, commands)
 
-            for k, v in self.PREFIX_MAP_MAPPING.items():
-                file_str = k.sub(v, file_str)
+    def _get_affected_files(self, folder: str, commands: t.List[t.Dict[str, t.Any]]) -> t.Set[str]:
+        """
+        Get the files in the compile commands which are changed since ``changed_since``,
+        or include any changed file
+        """
+        changed_files = set()
+        # the included paths may be in other git repositories, like IDF_PATH
+        for path in [folder, *[str(p) for p in self.include_paths]]:
+            try:
+                changed_files |= get_changed_files(path, self.changed_since)
+            except (OSError, subprocess.CalledProcessError) as e:
+                if path == folder:
+                    raise FatalError(f'Failed to get the files changed since "{self.changed_since}" in {folder}: {e}')
+                log.warn(f'Failed to get the files changed since "{escape(self.changed_since)}" in {escape(path)}')
 
-        with open(compiled_command_fp, 'w') as fw:
-            fw.write(file_str)
+        affected_files = set()
+        for _file, deps in get_tu_dependencies(os.path.join(folder, self.build_dir), commands).items():
+            if not deps.isdisjoint(changed_files):
+                affected_files.add(_file)
+
+        return affected_files
 
     @chain
     def filter_cmd(self, *args):
@@ -313,70 +1154,458 @@ class Runner:
                     log.print(f'- > {escape(str(i))}')
 
         out = []
-        compiled_command_fp = os.path.join(
-            folder, self.build_dir, self.COMPILE_COMMANDS_FILENAME
-        )
-        with open(compiled_command_fp) as fr:
-            commands = json.load(fr)
+        commands = self._load_compile_commands(folder)
+
+        affected_files = None
+        if self.changed_since:
+            affected_files = self._get_affected_files(folder, commands)
+            log.print(f'{len(affected_files)} files affected by the changes since "{escape(self.changed_since)}"')
+
+        build_dir_index = PathPrefixIndex([to_path(folder, self.build_dir)])
+        include_index = PathPrefixIndex([*self.include_paths, to_path(folder)])
+        skipped = Counter()
 
-        log.print('Files to be analysed:')
+        if not self.filter_summary:
+            log.print('Files to be analysed:')
         for command in commands:
-            _file = to_path(command['file'])
-            if _file.suffix == '.S':  # assembly file
+            _file = resolve_file(os.path.join(command.get('directory', ''), command['file']))
+            if _file.endswith('.S'):  # assembly file
+                skipped['assembly'] += 1
                 continue
 
-            if to_path(folder, self.build_dir) in _file.parents:  # build dir
+            if affected_files is not None and _file not in affected_files:
+                skipped['not affected by the changes'] += 1
+                continue
+
+            if build_dir_index.contains(_file):  # build dir
+                skipped['in build dir'] += 1
                 continue
 
             if not self.all_files:
                 # skip files in exclude paths
-                if self.exclude_paths and any(
-                    i in _file.parents for i in self.exclude_paths
-                ):
+                if self.exclude_index.contains(_file):
+                    skipped['in excluded paths'] += 1
                     continue
                 # skip files not in include paths or project dir
-                if not (
-                    (
-                        self.include_paths
-                        and any(i in _file.parents for i in self.include_paths)
-                    )
-                    or to_path(folder) in _file.parents
-                ):
+                if not include_index.contains(_file):
+                    skipped['not in included paths'] += 1
                     continue
 
             out.append(command)
-            log.print(f"+ > {escape(command['file'])}")
+            if not self.filter_summary:
+                log.print(f"+ > {escape(command['file'])}")
+
+        self._dump_compile_commands(folder, out)
 
-        with open(compiled_command_fp, 'w') as fw:
-            json.dump(out, fw)
+        log.print(f'{len(out)} files to be analysed, {sum(skipped.values())} files skipped')
+        for reason, count in skipped.most_common():
+            log.print(f'\t{reason}: {count}')
         log.print('*' * 35)
 
-    @chain
-    def run_clang_tidy(self, *args):
-        folder = args[0]
-        output_dir = args[1]
+    # run-clang-tidy.py options that clang-tidy doesn't understand or are set by the runner, and if they take a value
+    RUN_CLANG_TIDY_ONLY_OPTIONS = {
+        '-j': True,
+        '-clang-tidy-binary': True,
+        '-clang-apply-replacements-binary': True,
+        '-format': False,
+        '-style': True,
+        '-p': True,
+    }
+
+    def _split_clang_extra_args(self) -> t.Tuple[str, t.List[str]]:
+        """
+        Split ``clang_extra_args`` (run-clang-tidy.py arguments) into the clang-tidy binary and the clang-tidy arguments
+        """
+        clang_tidy = 'clang-tidy'
+        clang_tidy_args = []
+
+        args = iter(shlex.split(self.clang_extra_args) if self.clang_extra_args else [])
+        for arg in args:
+            opt, sep, value = arg.partition('=')
+            if opt not in self.RUN_CLANG_TIDY_ONLY_OPTIONS and not (opt.startswith('-j') and opt[2:].isdigit()):
+                clang_tidy_args.append(arg)
+                continue
+
+            if self.RUN_CLANG_TIDY_ONLY_OPTIONS.get(opt) and not sep:
+                value = next(args, '')
+
+            if opt == '-clang-tidy-binary':
+                clang_tidy = value
+
+        return clang_tidy, clang_tidy_args
+
+    def _get_translation_units(self, folder: str) -> t.List[TranslationUnit]:
+        """
+        Collect the files of the filtered compile commands in the folder, which match ``check_files_regex``
+        """
+        files_regex = re.compile('|'.join(self.check_files_regex))
+
+        compiled_command_fp = self.get_compile_commands_path(folder)
+        with open(compiled_command_fp) as fr:
+            commands = json.load(fr)
+
+        tus = []
+        seen = set()
+        for command in commands:
+            _file = os.path.normpath(os.path.join(command['directory'], command['file']))
+            if _file in seen or not files_regex.search(_file):
+                continue
+
+            seen.add(_file)
+            tus.append(
+                TranslationUnit(
+                    _file,
+                    os.path.dirname(compiled_command_fp),
+                    folder,
+                    tuple(get_command_args(command)),
+                    command['directory'],
+                )
+            )
+
+        return tus
 
+    def _run_clang_tidy_py_in_folder(self, folder: str, output_dir: str) -> None:
         warn_file = os.path.join(output_dir, self.WARN_FILENAME)
 
         cmd = self.run_clang_tidy_py_cmd + [
             '-p',
-            self.build_dir,
+            os.path.dirname(self.get_compile_commands_path(folder)),
         ]
         if self.clang_extra_args:
             cmd.extend(shlex.split(self.clang_extra_args))
 
+        if not any(arg.startswith('-j') for arg in cmd):
+            cmd.extend(['-j', str(self.cores)])
+
         cmd.append(' '.join(self.check_files_regex))
 
-        with open(warn_file, 'w') as fw:
+        parser = DiagnosticParser()
+        counter = Counter()
+        # run-clang-tidy.py doesn't tell when a file is completed, only the diagnostics are counted
+        progress = ClangTidyProgress(None) if self.progress else None
+
+        def _count(diag: t.Optional[Diagnostic]) -> None:
+            if diag:
+                counter[diag.check] += 1
+                if progress:
+                    progress.add_checks([diag.check])
+
+        with open(warn_file, 'w') as fw, progress or nullcontext():
             # clang-tidy would return 1 when found issue, ignore this return code
             run_cmd(
                 cmd,
                 stream=fw,
                 cwd=folder,
                 expect_returncode=self.expect_returncode,
+                line_callback=lambda line: _count(parser.feed(line)),
+                echo=not self.progress,
             )
+        _count(parser.close())
 
         log.print(f'clang-tidy report generated: {escape(warn_file)}')
+        self._log_diagnostics_summary(counter)
+
+    @staticmethod
+    def _log_diagnostics_summary(counter: t.Counter[str]) -> None:
+        log.print(f'{sum(counter.values())} diagnostics found')
+        for check, count in counter.most_common():
+            log.print(f'\t{escape(check or "(no check)")}: {count}')
+
+    @chain_all
+    def run_clang_tidy(self, *args):
+        """
+        Run clang-tidy over the files of all the folders with one ``ClangTidyDriver`` of ``cores`` workers,
+        the output of each file is written into the "warnings.txt" of the folder it belongs to.
+
+        The same file compiled with the same flags in many folders is analysed only once,
+        the output is written into the "warnings.txt" of all these folders.
+
+        The resources used by each file are written into the "timings.json" of the folder, the slowest
+        ``profile_top`` files (and checks, if ``check_profile`` is set) are logged.
+
+        The files are analysed longest first, by the durations recorded in ``duration_history`` (by default
+        "~/.cache/pyclang/durations.json"), or the file sizes if not recorded. The history is updated after the run.
+
+        If ``shard_count`` is larger than 1, only the files of the ``shard_index`` shard are analysed, the files
+        are partitioned by the durations in ``duration_history``, or only the file sizes if it's not specified.
+        The files of each folder analysed in this shard are written into the "shard.json" of the folder.
+
+        Each clang-tidy process is limited by ``tu_timeout`` seconds and ``tu_memory_limit`` bytes, files exceeding
+        the limits are recorded as "timeout" or "oom" failures, and retried alone once if ``retry_isolated`` is set,
+        with twice the timeout.
+
+        If ``backend`` is "clangd", the files are analysed by a pool of clangd processes instead, see ``ClangdDriver``.
+        The check profile, the memory limit and the isolated retry are not supported then.
+
+        If ``run_clang_tidy_py`` is specified, run it in each folder one after another instead.
+        """
+        folders = args[0]
+
+        if self._run_clang_tidy_py and self.backend == 'clangd':
+            raise FatalError('The clangd backend is not supported when running with run-clang-tidy.py')
+
+        if self._run_clang_tidy_py:
+            if self.check_profile:
+                log.warn('check profile is not collected when running with run-clang-tidy.py')
+            if self.tu_timeout or self.tu_memory_limit:
+                log.warn('per file timeout and memory limit are not applied when running with run-clang-tidy.py')
+            if self.shard_count > 1:
+                raise FatalError('Sharding is not supported when running with run-clang-tidy.py')
+            for folder, output_dir in folders:
+                self._run_clang_tidy_py_in_folder(folder, output_dir)
+            return
+
+        # the includes and the digests of the files are shared by the grouping and the cache
+        scanner = IncludeScanner()
+        digests = FileDigests()
+        cache = ResultCache(self.cache_dir, self.cache_size, scanner, digests) if self.cache_dir else None
+        if self.backend == 'clangd':
+            if self.check_profile:
+                log.warn('check profile is not collected with the clangd backend')
+            if self.tu_memory_limit or self.retry_isolated:
+                log.warn('per file memory limit and isolated retry are not applied with the clangd backend')
+            driver = ClangdDriver(
+                self.clangd_cmd,
+                self._split_clang_extra_args()[1],
+                self.cores,
+                cache,
+                timeout=self.tu_timeout,
+            )
+        else:
+            driver = ClangTidyDriver(
+                self.clang_tidy_cmd,
+                self._split_clang_extra_args()[1],
+                self.cores,
+                cache,
+                check_profile=self.check_profile,
+                timeout=self.tu_timeout,
+                memory_limit=self.tu_memory_limit,
+                retry_isolated=self.retry_isolated,
+            )
+
+        warn_files = {}
+        tus = []
+        try:
+            for folder, output_dir in folders:
+                warn_files[folder] = open(os.path.join(output_dir, self.WARN_FILENAME), 'w')
+                tus.extend(self._get_translation_units(folder))
+
+            if len(folders) > 1:
+                # group the identical translation units of all the folders, analyse the first one of each group only
+                canonicalizer = TUCanonicalizer(scanner, digests)
+                groups: t.Dict[str, t.List[TranslationUnit]] = {}
+                for tu in tus:
+                    groups.setdefault(canonicalizer.get_key(tu.file, tu.arguments, tu.directory), []).append(tu)
+                duplicates = {group[0]: group[1:] for group in groups.values()}
+            else:
+                duplicates = {tu: [] for tu in tus}
+
+            history = DurationHistory(self.duration_history or get_default_history_path(), self.base_dir)
+            if self.shard_count > 1:
+                # the default history differs from machine to machine, all the shards must partition the same way
+                duplicates = self._select_shard(duplicates, history if self.duration_history else None)
+                for folder, output_dir in folders:
+                    self._dump_shard_manifest(os.path.join(output_dir, self.SHARD_MANIFEST_FILENAME), folder, duplicates)
+
+            log.print(
+                f'Running clang-tidy on {len(duplicates)} unique files ({len(tus)} in total) '
+                f'from {len(folders)} folders with {self.cores} {self.backend} workers'
+            )
+            returncode = 0
+            cached = 0
+            counters = {folder: Counter() for folder, _ in folders}
+            results: t.List[TUResult] = []
+            # diagnostics in headers are reported by every translation unit including them, write each one only once
+            deduplicators = {folder: DiagnosticDeduplicator() for folder, _ in folders}
+
+            def _ingest(_folder: str, output: str) -> t.List[str]:
+                """
+                :return: checks of the new diagnostics
+                """
+                checks = []
+                for diag in parse_lines(output.splitlines()):
+                    if deduplicators[_folder].add(diag):
+                        warn_files[_folder].write(diag.to_text())
+                        counters[_folder][diag.check] += 1
+                        checks.append(diag.check)
+
+                return checks
+
+            # in progress mode, the files are only logged into the log files
+            progress = ClangTidyProgress(len(duplicates)) if self.progress else None
+            log_files = not progress or self.log_path
+
+            # start the longest ones first, so no long one is left alone at the end of the run
+            with progress or nullcontext():
+                for i, res in enumerate(driver.run(longest_first(estimate_costs(duplicates, history))), start=1):
+                    checks = _ingest(res.tu.cwd, res.stdout)
+                    for tu in duplicates[res.tu]:
+                        # paths of the generated headers point to the build dir of the analysed one
+                        checks += _ingest(
+                            tu.cwd,
+                            res.stdout.replace(res.tu.directory + os.sep, tu.directory + os.sep)
+                            if tu.directory != res.tu.directory
+                            else res.stdout,
+                        )
+                    if progress:
+                        progress.advance_file(checks)
+
+                    if res.cached:
+                        cached += 1
+                        if log_files:
+                            log.print(f'[{i}/{len(duplicates)}] {escape(res.tu.file)} (cached)')
+                    elif log_files:
+                        log.print(
+                            f'[{i}/{len(duplicates)}] {escape(res.tu.file)} ({res.elapsed:.1f}s'
+                            f'{", retried alone" if res.retried else ""})'
+                        )
+                    if not res.ok:
+                        # clang-tidy would return 1 when found issue, same as run-clang-tidy.py
+                        returncode = 1
+                        log.warn(
+                            f'clang-tidy failed on "{escape(res.tu.file)}" with exit code {res.returncode}'
+                            f'{f" ({res.failure})" if res.failure else ""}:\n'
+                            f'{escape(res.stderr)}'
+                        )
+                    # the outputs are written already, don't keep the ones of every file in memory
+                    results.append(res._replace(stdout='', stderr=''))
+        finally:
+            for fw in warn_files.values():
+                fw.close()
+
+        if cache:
+            log.print(f'{cached}/{len(duplicates)} files replayed from cache "{escape(self.cache_dir)}"')
+            removed = cache.evict()
+            if removed:
+                log.print(f'{removed} least recently used cache entries evicted')
+
+        for folder, output_dir in folders:
+            self._dump_timings(
+                os.path.join(output_dir, self.TIMINGS_FILENAME),
+                [res for res in results if res.tu.cwd == folder],
+                {tu: res.tu for res in results for tu in duplicates[res.tu] if tu.cwd == folder},
+            )
+        self._log_timings_summary(results)
+
+        # the durations of the cached and the failed files are not representative
+        for res in results:
+            if not res.cached and not res.failure:
+                history.update(res.tu, res.elapsed)
+        try:
+            history.save()
+        except OSError as e:
+            log.warn(f'Failed to save the duration history "{escape(history.path)}": {escape(str(e))}')
+
+        failures = Counter(res.failure for res in results if res.failure)
+        if failures:
+            log.warn(
+                'clang-tidy exceeded the resource limits on '
+                + ', '.join(f'{count} files ({failure})' for failure, count in failures.items())
+            )
+
+        if returncode not in self.expect_returncode:
+            log.err(f'clang-tidy failed with exit code {returncode}')
+            raise SystemExit(returncode)
+
+        for folder, output_dir in folders:
+            with open(os.path.join(output_dir, self.TU_COUNTS_FILENAME), 'w') as fw:
+                json.dump(deduplicators[folder].duplicated_counts, fw)
+
+            log.print(f'clang-tidy report generated: {escape(os.path.join(output_dir, self.WARN_FILENAME))}')
+            self._log_diagnostics_summary(counters[folder])
+
+    def _select_shard(
+        self,
+        duplicates: t.Dict[TranslationUnit, t.List[TranslationUnit]],
+        history: t.Optional[DurationHistory],
+    ) -> t.Dict[TranslationUnit, t.List[TranslationUnit]]:
+        """
+        Keep the translation units of the current shard only. The unique translation units are partitioned into
+        ``shard_count`` shards of roughly equal estimated duration, the same way in all the shards.
+        """
+        costs = estimate_costs(duplicates, history)
+        shard = partition(costs, self.shard_count)[self.shard_index]
+
+        log.print(
+            f'Shard {self.shard_index + 1}/{self.shard_count}: {len(shard)}/{len(duplicates)} unique files, '
+            f'{sum(costs[tu] for tu in shard) / (sum(costs.values()) or 1):.1%} of the estimated cost'
+        )
+        return {tu: duplicates[tu] for tu in shard}
+
+    def _dump_shard_manifest(
+        self, filepath: str, folder: str, duplicates: t.Dict[TranslationUnit, t.List[TranslationUnit]]
+    ) -> None:
+        files = [tu.file for tu in duplicates if tu.cwd == folder] + [
+            dup.file for dups in duplicates.values() for dup in dups if dup.cwd == folder
+        ]
+        with open(filepath, 'w') as fw:
+            json.dump(
+                {'shard_index': self.shard_index, 'shard_count': self.shard_count, 'files': sorted(files)},
+                fw,
+                indent=2,
+            )
+
+    @staticmethod
+    def _sum_check_profiles(results: t.Iterable[TUResult]) -> t.Counter[str]:
+        check_times = Counter()
+        for res in results:
+            check_times.update(res.check_profile or {})
+
+        return check_times
+
+    def _dump_timings(
+        self, filepath: str, results: t.List[TUResult], duplicates: t.Dict[TranslationUnit, TranslationUnit]
+    ) -> None:
+        """
+        Write the resources used by each translation unit and the time spent in each check, slowest first.
+        The translation units analysed in another folder only record the folder they're analysed in.
+        """
+        timings = {
+            'translation_units': [
+                {
+                    'file': res.tu.file,
+                    'elapsed': round(res.elapsed, 3),
+                    'cpu_time': round(res.cpu_time, 3),
+                    'max_rss': res.max_rss,
+                    'returncode': res.returncode,
+                    'cached': res.cached,
+                    'failure': res.failure,
+                    'retried': res.retried,
+                }
+                for res in sorted(results, key=lambda r: r.elapsed, reverse=True)
+            ]
+            + [{'file': tu.file, 'analysed_in': analysed_tu.cwd} for tu, analysed_tu in duplicates.items()],
+        }
+        if self.check_profile:
+            timings['checks'] = {
+                check: round(elapsed, 6) for check, elapsed in self._sum_check_profiles(results).most_common()
+            }
+
+        with open(filepath, 'w') as fw:
+            json.dump(timings, fw, indent=2)
+
+    def _log_timings_summary(self, results: t.List[TUResult]) -> None:
+        analysed = [res for res in results if not res.cached]
+        if not analysed or not self.profile_top:
+            return
+
+        log.print(
+            f'clang-tidy took {sum(res.elapsed for res in analysed):.1f}s wall time, '
+            f'{sum(res.cpu_time for res in analysed):.1f}s CPU time in total, '
+            f'peak RSS {max(res.max_rss for res in analysed) / 1024 / 1024:.1f} MiB'
+        )
+
+        log.print(f'Top {self.profile_top} slowest files:')
+        for res in sorted(analysed, key=lambda r: r.elapsed, reverse=True)[: self.profile_top]:
+            log.print(
+                f'\t{escape(res.tu.file)}: {res.elapsed:.1f}s wall, {res.cpu_time:.1f}s CPU, '
+                f'{res.max_rss / 1024 / 1024:.1f} MiB'
+            )
+
+        if self.check_profile:
+            log.print(f'Top {self.profile_top} slowest checks:')
+            for check, elapsed in self._sum_check_profiles(analysed).most_common(self.profile_top):
+                log.print(f'\t{escape(check)}: {elapsed:.2f}s')
 
     @chain
     def check_limits(self, *args):
@@ -387,22 +1616,24 @@ class Runner:
             return
 
         warn_file = self.get_check_warn_file(output_dir)
-        with open(warn_file) as fr:
-            warnings_str = fr.read()
         res = {check: [] for check in self.checks_limitations.keys()}
-        for path, line, col, severity, msg, code in self.CLANG_TIDY_WARNING_REGEX.findall(
-            warnings_str
-        ):
-            if code not in res:  # error identifier not in limit field
-                continue
+        deduplicator = DiagnosticDeduplicator()
+        for diag in parse_file(warn_file):
+            if deduplicator.add(diag):
+                self._add_limit_strike(res, diag)
 
-            if any(
-                i in to_path(path).parents for i in self.exclude_paths
-            ):  # path in ignore list
-                continue
+        self._report_limits(res)
 
-            res[code].append(f'{path}:{line}:{col}: {severity}: {msg}')
+    def _add_limit_strike(self, res: t.Dict[str, t.List[str]], diag: Diagnostic) -> None:
+        if diag.check not in res:  # error identifier not in limit field
+            return
+
+        if self.exclude_index.contains(resolve_file(diag.path)):  # path in ignore list
+            return
 
+        res[diag.check].append(f'{diag.location}: {diag.severity}: {diag.message}')
+
+    def _report_limits(self, res: t.Dict[str, t.List[str]]) -> None:
         passed = True
         for code, messages in res.items():
             strikes = len(messages) if messages else 0
@@ -423,71 +1654,60 @@ class Runner:
         output_dir = args[1]
 
         warn_file = self.get_check_warn_file(output_dir)
-        with open(warn_file) as fr:
-            warnings_str = fr.read()
-            warnings_str = self.ANSI_ESCAPE_REGEX.sub('', warnings_str)
-
-        with open(warn_file, 'w') as fw:
-            fw.write(warnings_str)
+        with self._rewrite(warn_file) as (fr, fw):
+            for line in fr:
+                fw.write(self.ANSI_ESCAPE_REGEX.sub('', line))
 
         log.print(f'color outputs in "{escape(warn_file)}" are eliminated.')
 
+    def _iter_report_diagnostics(self, output_dir: str) -> t.Iterator[Diagnostic]:
+        """
+        Stream the diagnostics in "warnings.txt" sorted by path, through a temporary database if "results.db"
+        is not up to date
+        """
+        warn_file = self.get_check_warn_file(output_dir)
+        db_path = self._get_fresh_results_db(output_dir, warn_file)
+        if db_path:
+            with ResultsStore(db_path) as store:
+                yield from store.query()
+            return
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with ResultsStore(os.path.join(tmp_dir, self.RESULTS_DB_FILENAME)) as store:
+                store.add(parse_file(warn_file))
+                yield from store.query()
+
     @chain
     def make_html_report(self, *args):
+        """
+        Generate the html report from "warnings.txt" into the "html_report" folder,
+        only the pages of the files whose source or findings changed since the last report are generated again
+        """
         output_dir = args[1]
 
-        try:
-            from codereport import ReportItem
-        except ImportError as e:
-            raise FatalError(
-                f'Please run `pip install "pyclang[html]"` to install this optional dependency for this feature '
-                f'(import error: {e})'
-            ) from e
+        def _diagnostics() -> t.Iterator[Diagnostic]:
+            for diag in self._iter_report_diagnostics(output_dir):
+                if not diag.check:
+                    continue
 
-        warn_file = self.get_check_warn_file(output_dir)
-        with open(warn_file) as fr:
-            warnings_str = fr.read()
-
-        res = []
-        for path, line, col, severity, msg, code in self.CLANG_TIDY_WARNING_REGEX.findall(
-            warnings_str
-        ):
-            if self.ignore_clang_checks and any(
-                i for i in self.ignore_clang_checks if code in i
-            ):
-                continue
+                if self.ignore_clang_checks and any(
+                    i for i in self.ignore_clang_checks if diag.check in i
+                ):
+                    continue
 
-            if self.exclude_paths and any(
-                i in to_path(path).parents for i in self.exclude_paths
-            ):
-                continue
+                # normalized paths are relative to the base dir
+                if self.exclude_index.contains(resolve_file(os.path.join(self.base_dir, diag.path))):
+                    continue
 
-            res.append(ReportItem(path, line, severity, msg, code, col).dict())
+                yield diag
 
-        if not res:
+        report = HtmlReport(os.path.join(output_dir, 'html_report'), self.base_dir)
+        if not report.write(_diagnostics()):
             log.print('No issue found')
             return
 
-        report_json_fn = os.path.join(output_dir, 'report.json')
-        with open(report_json_fn, 'w') as fw:
-            json.dump(res, fw, indent=2)
-
-        html_report_folder = os.path.join(output_dir, 'html_report')
-        if os.path.isdir(html_report_folder):
-            shutil.rmtree(html_report_folder)
-
-        known_issue = run_cmd(
-            ['codereport', '--prefix', self.base_dir, report_json_fn, 'html_report'],
-            cwd=output_dir,
-            ignore_error='AssertionError: No existing files found',
-            expect_returncode=self.expect_returncode,
-        )
-        # KnownIssue means codereport hit the expected "no files" assertion; a plain
-        # int return code (0 or accepted non-zero) means the report was generated.
-        if isinstance(known_issue, KnownIssue):
-            log.print('No issue found')
-        else:
-            log.print(f'Please open {escape(output_dir)}/html_report/index.html to view the report')
+        log.print(f'{report.written} html report pages generated, {report.skipped} unchanged ones kept')
+        log.print(f'Please open {escape(output_dir)}/html_report/index.html to view the report')
 
     @chain
     def normalize(self, *args):
@@ -497,21 +1717,244 @@ class Runner:
         output_dir = args[1]
 
         warn_file = os.path.join(output_dir, self.WARN_FILENAME)
-        with open(warn_file, 'r') as fr:
-            warnings = fr.readlines()
-
-        with open(warn_file, 'w') as fw:
-            for line in warnings:
-                result = self.CLANG_TIDY_PATH_REGEX.match(line)
-                if result:
-                    path = result.group(1)
-                    norm_path = os.path.relpath(
-                        _remove_prefix(os.path.normpath(path), '../'), self.base_dir
-                    )
-                    # if still have ../, then it's a system file, should not in idf path
-                    if '../' in norm_path:
-                        norm_path = '/' + _remove_prefix(norm_path, '../')
-
-                    line = line.replace(path, norm_path)
-                fw.write(line)
+        with self._rewrite(warn_file) as (fr, fw):
+            for line in fr:
+                fw.write(self._normalize_line(line))
+        log.print(f'Normalized file {escape(warn_file)}')
+
+    def _normalize_line(self, line: str) -> str:
+        result = self.CLANG_TIDY_PATH_REGEX.match(line)
+        if result:
+            path = result.group(1)
+            line = line.replace(path, _normalize_path(path, self.base_dir))
+
+        return line
+
+    def _get_fresh_results_db(self, output_dir: str, warn_file: str) -> t.Optional[str]:
+        """
+        :return: path of "results.db" in the output dir if it's up to date with "warnings.txt", otherwise None
+        """
+        db_path = os.path.join(output_dir, self.RESULTS_DB_FILENAME)
+        if os.path.isfile(db_path) and os.path.getmtime(db_path) >= os.path.getmtime(warn_file):
+            return db_path
+
+        return None
+
+    def _open_results_db(self, output_dir: str) -> ResultsStore:
+        """
+        Open a new results database in the output dir, the old one is removed
+        """
+        db_path = os.path.join(output_dir, self.RESULTS_DB_FILENAME)
+        if os.path.isfile(db_path):
+            os.remove(db_path)
+
+        return ResultsStore(db_path)
+
+    @chain
+    def make_results_db(self, *args):
+        """
+        Write the diagnostics in "warnings.txt" into the indexed database "results.db", which could be queried
+        by ``pyclang query``
+        """
+        output_dir = args[1]
+
+        warn_file = self.get_check_warn_file(output_dir)
+        with self._open_results_db(output_dir) as store:
+            count = store.add(parse_file(warn_file))
+
+        log.print(f'{count} diagnostics written into {escape(store.db_path)}')
+
+    def _load_tu_counts(self, output_dir: str) -> t.Dict[int, int]:
+        tu_counts_file = os.path.join(output_dir, self.TU_COUNTS_FILENAME)
+        if not os.path.isfile(tu_counts_file):
+            return {}
+
+        with open(tu_counts_file) as fr:
+            return {int(k): v for k, v in json.load(fr).items()}
+
+    @chain
+    def postprocess(self, *args):
+        """
+        Same as ``check_limits().remove_color_output().normalize().make_results_db()``,
+        but reads and writes "warnings.txt" only once:
+        the color outputs are eliminated, the paths are normalized and the limits are counted diagnostic by diagnostic.
+
+        Duplicated diagnostics are written only once, and counted only once in the limits.
+        """
+        output_dir = args[1]
+
+        warn_file = self.get_check_warn_file(output_dir)
+        res = {check: [] for check in (self.checks_limitations or {}).keys()}
+        tu_counts = self._load_tu_counts(output_dir)
+        parser = DiagnosticParser()
+        deduplicator = DiagnosticDeduplicator()
+        duplicated = 0
+
+        def _process(_diag: t.Optional[Diagnostic]) -> None:
+            nonlocal duplicated
+            if not _diag:
+                return
+
+            norm_diag = _diag._replace(
+                path=_normalize_path(_diag.path, self.base_dir),
+                notes=tuple(self._normalize_line(note) for note in _diag.notes),
+                tu_count=tu_counts.get(_diag.fingerprint, 1),
+            )
+            if not deduplicator.add(norm_diag):
+                duplicated += 1
+                return
+
+            if res:
+                self._add_limit_strike(res, _diag)
+
+            fw.write(norm_diag.to_text())
+            add(norm_diag)
+
+        with self._open_results_db(output_dir) as store:
+            with self._rewrite(warn_file) as (fr, fw), store.batched() as add:
+                for line in fr:
+                    _process(parser.feed(line))
+                _process(parser.close())
+
+            store.set_tu_counts(deduplicator.duplicated_counts)
+
+        if duplicated:
+            log.print(f'{duplicated} duplicated diagnostics in "{escape(warn_file)}" are removed.')
+        log.print(f'color outputs in "{escape(warn_file)}" are eliminated.')
         log.print(f'Normalized file {escape(warn_file)}')
+        log.print(f'Diagnostics written into {escape(store.db_path)}')
+
+        # check the limits after the file is written, so the normalized file is kept even if the limits are exceeded
+        if res:
+            self._report_limits(res)
+
+    def _iter_results(self, output_dir: str) -> t.Iterator[Diagnostic]:
+        """
+        Stream the diagnostics of the output dir, from "results.db" if it's up to date with "warnings.txt",
+        otherwise parse "warnings.txt" with the counts in "tu_counts.json".
+
+        Relative paths are kept as they are, since they're normalized already.
+        """
+        warn_file = self.get_check_warn_file(output_dir)
+        db_path = self._get_fresh_results_db(output_dir, warn_file)
+        if db_path:
+            with ResultsStore(db_path) as store:
+                yield from store.query()
+            return
+
+        tu_counts = self._load_tu_counts(output_dir)
+        for diag in parse_file(warn_file):
+            if not os.path.isabs(diag.path):
+                yield diag
+                continue
+
+            yield diag._replace(
+                path=_normalize_path(diag.path, self.base_dir),
+                notes=tuple(
+                    self._normalize_line(note) if os.path.isabs(note.split(':', 1)[0]) else note
+                    for note in diag.notes
+                ),
+                tu_count=tu_counts.get(diag.fingerprint, 1),
+            )
+
+    @chain_all
+    def merge_results(self, *args):
+        """
+        Merge the results of all the folders, like the ones of different projects or shards, into one deduplicated and
+        normalized "warnings.txt" and "results.db" in ``merge_dir``. The diagnostics reported in many folders are
+        written once, their translation unit counts are summed up.
+
+        The limits are checked once over the merged results, and the html report is generated from them if
+        ``merge_report`` is set. The results are streamed, memory is bounded by the deduplicator.
+        """
+        folders = args[0]
+
+        if not self.merge_dir:
+            raise FatalError('"merge_dir" is required to merge the results')
+        os.makedirs(self.merge_dir, exist_ok=True)
+
+        warn_file = os.path.join(self.merge_dir, self.WARN_FILENAME)
+        res = {check: [] for check in (self.checks_limitations or {}).keys()}
+        deduplicator = DiagnosticDeduplicator()
+        merged = 0
+        duplicated = 0
+
+        with self._open_results_db(self.merge_dir) as store:
+            with open(warn_file, 'w') as fw, store.batched() as add:
+                for _, output_dir in folders:
+                    for diag in self._iter_results(output_dir):
+                        merged += 1
+                        if not deduplicator.add(diag):
+                            duplicated += 1
+                            continue
+
+                        if res:
+                            self._add_limit_strike(res, diag._replace(path=os.path.join(self.base_dir, diag.path)))
+
+                        fw.write(diag.to_text())
+                        add(diag)
+
+            store.set_tu_counts(deduplicator.duplicated_counts)
+
+        log.print(
+            f'{merged - duplicated} diagnostics merged from {len(folders)} folders into {escape(warn_file)}, '
+            f'{duplicated} duplicated ones removed'
+        )
+        log.print(f'Diagnostics written into {escape(store.db_path)}')
+
+        if self.merge_report:
+            self._step('make_html_report')(self, self.merge_dir, self.merge_dir)
+
+        if res:
+            self._report_limits(res)
+
+    @chain_all
+    def check_baseline(self, *args):
+        """
+        Compare the diagnostics of all the folders with the accepted ones in the ``baseline`` file,
+        the new ones are written into the "new_warnings.txt" of each folder, and fail if there's any.
+
+        If ``update_baseline`` is set, or the baseline file doesn't exist, write all the diagnostics into it instead.
+        Skipped if ``baseline`` is not set.
+        """
+        folders = args[0]
+
+        if not self.baseline:
+            return
+
+        if self.update_baseline or not os.path.isfile(self.baseline):
+            baseline = Baseline(self.base_dir)
+            for _, output_dir in folders:
+                for diag in self._iter_results(output_dir):
+                    baseline.add(diag)
+
+            baseline.save(self.baseline)
+            log.print(f'{len(baseline)} diagnostics written into the baseline {escape(self.baseline)}')
+            return
+
+        try:
+            baseline = Baseline.load(self.baseline, self.base_dir)
+        except ValueError as e:
+            raise FatalError(str(e))
+
+        accepted = len(baseline)
+        new = 0
+        for _, output_dir in folders:
+            new_warn_file = os.path.join(output_dir, self.NEW_WARN_FILENAME)
+            counter = Counter()
+            with open(new_warn_file, 'w') as fw:
+                for diag in self._iter_results(output_dir):
+                    if baseline.consume(diag):
+                        continue
+
+                    fw.write(diag.to_text())
+                    counter[diag.check] += 1
+
+            if counter:
+                log.print(f'New diagnostics not in the baseline are written into {escape(new_warn_file)}')
+                self._log_diagnostics_summary(counter)
+            new += sum(counter.values())
+
+        log.print(f'{new} new diagnostics, {len(baseline)} of the {accepted} diagnostics in the baseline are fixed')
+        if new:
+            raise FatalError(f'{new} new diagnostics not in the baseline {self.baseline}')
@@ -0,0 +1,103 @@
+import heapq
+import json
+import os
+
+import typing as t
+
+from .utils import atomic_write
+
+if t.TYPE_CHECKING:
+    from .runner import TranslationUnit
+
+
+def get_default_history_path() -> str:
+    return os.path.join(
+        os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'pyclang', 'durations.json'
+    )
+
+
+class DurationHistory:
+    """
+    Persistent clang-tidy durations of the translation units, in seconds, stored as a JSON file.
+
+    The translation units are keyed by their folder and file relative to ``base_dir``,
+    so the history could be shared between machines checking out the projects to different paths.
+    """
+
+    def __init__(self, path: str, base_dir: str) -> None:
+        self.path = path
+        self.base_dir = base_dir
+
+        self.durations: t.Dict[str, float] = {}
+        try:
+            with open(self.path) as fr:
+                self.durations = json.load(fr)['durations']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def get_key(self, tu: 'TranslationUnit') -> str:
+        return f'{os.path.relpath(tu.cwd, self.base_dir)}:{os.path.relpath(tu.file, self.base_dir)}'
+
+    def get(self, tu: 'TranslationUnit') -> t.Optional[float]:
+        return self.durations.get(self.get_key(tu))
+
+    def update(self, tu: 'TranslationUnit', duration: float) -> None:
+        self.durations[self.get_key(tu)] = round(duration, 3)
+
+    def save(self) -> None:
+        with atomic_write(self.path) as fw:
+            json.dump({'durations': dict(sorted(self.durations.items()))}, fw, indent=2)
+
+
+def estimate_costs(
+    tus: t.Iterable['TranslationUnit'], history: t.Optional[DurationHistory] = None
+) -> t.Dict['TranslationUnit', float]:
+    """
+    Estimate the clang-tidy duration of each translation unit from the history.
+    The ones not in the history are estimated by the file size, scaled by the average duration per byte
+    of the ones in the history. Without any history the costs are the file sizes.
+    """
+    sizes = {}
+    for tu in tus:
+        try:
+            sizes[tu] = max(os.path.getsize(tu.file), 1)
+        except OSError:
+            sizes[tu] = 1
+
+    known = {}
+    if history:
+        for tu in sizes:
+            duration = history.get(tu)
+            if duration is not None:
+                known[tu] = duration
+
+    rate = 1.0
+    if known and sum(known.values()) > 0:
+        rate = sum(known.values()) / sum(sizes[tu] for tu in known)
+
+    return {tu: known.get(tu, size * rate) for tu, size in sizes.items()}
+
+
+def longest_first(costs: t.Dict['TranslationUnit', float]) -> t.List['TranslationUnit']:
+    """
+    Sort the translation units by the cost in descending order, ties are broken by the path
+    """
+    return sorted(costs, key=lambda tu: (-costs[tu], tu.file, tu.cwd))
+
+
+def partition(costs: t.Dict['TranslationUnit', float], count: int) -> t.List[t.List['TranslationUnit']]:
+    """
+    Split the translation units into ``count`` parts of roughly equal total cost,
+    by assigning the most expensive one to the least loaded part first (longest processing time first).
+
+    The result only depends on the costs and the files, not on the iteration order.
+    """
+    parts: t.List[t.List['TranslationUnit']] = [[] for _ in range(count)]
+    loads = [(0.0, i) for i in range(count)]
+
+    for tu in longest_first(costs):
+        load, i = heapq.heappop(loads)
+        parts[i].append(tu)
+        heapq.heappush(loads, (load + costs[tu], i))
+
+    return parts
@@ -0,0 +1,149 @@
+import json
+import os
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+import rich_click as click
+from esp_pylib.errors import FatalError
+from esp_pylib.excepthook import install_exception_reporting
+from esp_pylib.logger import log
+from rich.markup import escape
+
+from pyclang import Runner
+from pyclang.store import ResultsStore
+from pyclang.utils import find_files
+
+
+@click.group(context_settings=dict(help_option_names=['-h', '--help']))
+def main():
+    """
+    Tools for the results generated by idf_clang_tidy
+    """
+    install_exception_reporting()
+
+
+@main.command()
+@click.argument('paths', nargs=-1, type=click.Path(exists=True, resolve_path=True))
+@click.option(
+    '--check',
+    default=None,
+    help='Check name, glob patterns are supported, e.g. "bugprone-*".',
+)
+@click.option(
+    '--path',
+    default=None,
+    help='File path, or directory path to match all the files under it, e.g. "components/esp_wifi". '
+    'Paths are relative to the base dir if the results are normalized.',
+)
+@click.option(
+    '--severity',
+    default=None,
+    help='Severity, e.g. "warning".',
+)
+@click.option(
+    '--count',
+    is_flag=True,
+    default=False,
+    help='Print the number of diagnostics of each check instead.',
+)
+@click.option(
+    '--json',
+    'as_json',
+    is_flag=True,
+    default=False,
+    help='Print the results in JSON lines.',
+)
+def query(paths, check, path, severity, count, as_json):
+    """
+    Query the diagnostics in the results databases, PATHS could be "results.db" files,
+    or directories containing them (searched recursively).
+    """
+    db_paths = find_files(paths, Runner.RESULTS_DB_FILENAME)
+    if not db_paths:
+        raise click.UsageError(f'No "{Runner.RESULTS_DB_FILENAME}" found.')
+
+    for db_path in db_paths:
+        with ResultsStore(db_path) as store:
+            if count:
+                counts = store.count(check, path, severity)
+                if as_json:
+                    click.echo(json.dumps({'db': db_path, 'counts': counts}))
+                    continue
+
+                log.print(f'{escape(db_path)}:')
+                for check_name, number in counts.items():
+                    click.echo(f'\t{check_name or "(no check)"}: {number}')
+                continue
+
+            for diag in store.query(check, path, severity):
+                if as_json:
+                    click.echo(json.dumps({'db': db_path, **diag._asdict()}))
+                else:
+                    click.echo(diag.to_text(), nl=False)
+
+
+@main.command()
+@click.argument('paths', nargs=-1, type=click.Path(exists=True, resolve_path=True))
+@click.option(
+    '-o',
+    '--output-dir',
+    required=True,
+    type=click.Path(resolve_path=True),
+    help='Where the merged "warnings.txt" and "results.db" are written to.',
+)
+@click.option(
+    '--limit-file',
+    default=None,
+    help='Definitions of ignore checks and files/directories to skip, the limits are checked over the merged results.',
+)
+@click.option(
+    '--html',
+    is_flag=True,
+    default=False,
+    help='Generate the html report of the merged results.',
+)
+@click.option(
+    '--base-dir',
+    default=None,
+    help='Base directory to translate the absolute paths to relative paths, '
+    'will use IDF_PATH (if set) or current dir if not specified.',
+)
+def merge(paths, output_dir, limit_file, html, base_dir):
+    """
+    Merge the results of many projects or shards into one. PATHS could be the output dirs of idf_clang_tidy,
+    or directories containing them (searched recursively).
+    """
+    warn_files = [
+        fp
+        for fp in find_files(paths, Runner.WARN_FILENAME)
+        if os.path.dirname(fp) != output_dir
+    ]
+    if not warn_files:
+        raise click.UsageError(f'No "{Runner.WARN_FILENAME}" found.')
+
+    kwargs = {'merge_dir': output_dir, 'merge_report': html}
+    if base_dir:
+        kwargs['base_dir'] = base_dir
+
+    if limit_file and os.path.isfile(limit_file):
+        if yaml is None:
+            log.die('please run "pip install pyyaml" to use --limit-file')
+        with open(limit_file) as fr:
+            limit_file_dict = yaml.load(fr, Loader=yaml.FullLoader)
+        kwargs['exclude_paths'] = limit_file_dict.get('skip')
+        kwargs['ignore_clang_checks'] = limit_file_dict.get('ignore')
+        kwargs['checks_limitations'] = limit_file_dict.get('limits')
+
+    try:
+        runner = Runner([os.path.dirname(fp) for fp in warn_files], **kwargs)
+        runner.merge_results()
+        runner()
+    except FatalError as e:
+        log.die(escape(str(e)))
+
+
+if __name__ == '__main__':
+    main()
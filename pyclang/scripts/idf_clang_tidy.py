@@ -34,6 +34,25 @@ from pyclang import Runner
     type=click.Path(resolve_path=True),
     help='Where the log files will be written to, will use stdout if not specified.',
 )
+@click.option(
+    '--progress',
+    is_flag=True,
+    default=False,
+    help='Show the progress of clang-tidy instead of logging every file and echoing the output of run-clang-tidy.py. '
+    'The output is still written into "warnings.txt", and the files are still logged into --log-path.',
+)
+@click.option(
+    '--force-reconfigure',
+    is_flag=True,
+    default=False,
+    help='Always run "idf.py reconfigure". By default it\'s skipped when the compile commands exist '
+    'and no CMake input, sdkconfig file, CMakeCache.txt or the ESP-IDF version changed since the last run.',
+)
+@click.option(
+    '--idf-py',
+    default=None,
+    help='idf.py path. Will use "idf.py" in your PATH if not specified.',
+)
 @click.option(
     '--exit-code',
     is_flag=True,
@@ -46,6 +65,32 @@ from pyclang import Runner
     default=None,
     help='Definitions of ignore checks and files/directories to skip.',
 )
+@click.option(
+    '--baseline',
+    default=None,
+    type=click.Path(resolve_path=True),
+    help='Baseline file of the accepted diagnostics. Fail only if there are new diagnostics not in it, '
+    'which are written into "new_warnings.txt" of each output dir. Created if it doesn\'t exist.',
+)
+@click.option(
+    '--update-baseline',
+    is_flag=True,
+    default=False,
+    help='Accept all the current diagnostics, by writing them into the --baseline file.',
+)
+@click.option(
+    '--changed-since',
+    default=None,
+    help='Only analyse the files changed since this git revision, and the files including any changed file. '
+    'Will analyse all the files if not specified.',
+)
+@click.option(
+    '--filter-summary',
+    is_flag=True,
+    default=False,
+    help='Only log the number of the analysed and skipped files when filtering the compile commands, '
+    'instead of logging every analysed file.',
+)
 @click.option(
     '--xtensa-include-dir',
     default=None,
@@ -66,7 +111,41 @@ from pyclang import Runner
     '--run-clang-tidy-py',
     default=None,
     help='run-clang-tidy.py path, this file could be downloaded from llvm. '
-    'Will use "run-clang-tidy.py" if not specified.',
+    'If specified, it will be run in each dir one after another, '
+    'instead of running clang-tidy over the files of all dirs with one shared pool of workers.',
+)
+@click.option(
+    '--clang-tidy',
+    default=None,
+    help='clang-tidy path. Will use "clang-tidy" in your PATH if not specified.',
+)
+@click.option(
+    '--backend',
+    type=click.Choice(Runner.BACKENDS),
+    default=None,
+    help='How the files are analysed. "clang-tidy" runs one clang-tidy process per file. '
+    '"clangd" drives a pool of clangd processes with the clang-tidy checks enabled, only the diagnostics in the '
+    'source files are reported, and the ones in the headers only if they are errors. [default: clang-tidy]',
+)
+@click.option(
+    '--clangd',
+    default=None,
+    help='clangd path, used by --backend clangd. Will use "clangd" in your PATH if not specified.',
+)
+@click.option(
+    '--cache-dir',
+    default=None,
+    type=click.Path(resolve_path=True),
+    help='Where the clang-tidy results of the files are cached. '
+    'Unchanged files would be replayed from the cache instead of running clang-tidy again. '
+    'Will not use cache if not specified.',
+)
+@click.option(
+    '--cache-size',
+    default=None,
+    type=int,
+    help='Maximum size of the cache dir in MB, the least recently used results would be evicted. '
+    'Will use 512 if not specified.',
 )
 @click.option(
     '--clang-extra-args',
@@ -77,6 +156,61 @@ from pyclang import Runner
     '-bugprone-macro-parentheses,readability-*,performance-*,-readability-magic-numbers,'
     '-readability-avoid-const-params-in-decls"',
 )
+@click.option(
+    '--tu-timeout',
+    type=float,
+    default=None,
+    help='Kill clang-tidy if it runs longer than this many seconds on one file. '
+    'Not supported with --run-clang-tidy-py.',
+)
+@click.option(
+    '--tu-memory-limit',
+    type=int,
+    default=None,
+    help='Limit the address space of clang-tidy on one file to this many MB. Not supported with --run-clang-tidy-py.',
+)
+@click.option(
+    '--retry-isolated',
+    is_flag=True,
+    default=False,
+    help='Retry the files exceeding --tu-timeout or --tu-memory-limit once, alone, without the memory limit and '
+    'with twice the timeout, after all the other files are analysed.',
+)
+@click.option(
+    '--shard-index',
+    type=int,
+    default=None,
+    help='Index of the shard to analyse, starting from 0. Used with --shard-count.',
+)
+@click.option(
+    '--shard-count',
+    type=int,
+    default=None,
+    help='Split the files of all the dirs into this many shards of roughly equal duration, '
+    'and only analyse the one of --shard-index. Not supported with --run-clang-tidy-py.',
+)
+@click.option(
+    '--duration-history',
+    default=None,
+    type=click.Path(resolve_path=True),
+    help='JSON file recording the clang-tidy duration of each file, used to start the longest files first '
+    'and to balance the shards. Updated with the durations of the analysed files after each run. '
+    'Will use "~/.cache/pyclang/durations.json" if not specified, except for balancing the shards, '
+    'since all the shards of a run should read the same history.',
+)
+@click.option(
+    '--enable-check-profile',
+    is_flag=True,
+    default=False,
+    help='Record the time spent in each clang-tidy check, written into "timings.json" of each output dir. '
+    'Not supported with --run-clang-tidy-py.',
+)
+@click.option(
+    '--profile-top',
+    type=int,
+    default=None,
+    help='Number of the slowest files and checks to log after running clang-tidy, 0 to disable. [default: 10]',
+)
 @click.option(
     '--base-dir',
     default=None,
@@ -88,12 +222,32 @@ def main(
     build_dir,
     output_path,
     log_path,
+    progress,
+    force_reconfigure,
+    idf_py,
     exit_code,
     limit_file,
+    baseline,
+    update_baseline,
+    changed_since,
+    filter_summary,
     xtensa_include_dir,
     check_files_regex,
     run_clang_tidy_py,
+    clang_tidy,
+    backend,
+    clangd,
+    cache_dir,
+    cache_size,
     clang_extra_args,
+    tu_timeout,
+    tu_memory_limit,
+    retry_isolated,
+    shard_index,
+    shard_count,
+    duration_history,
+    enable_check_profile,
+    profile_top,
     base_dir,
 ):
     install_exception_reporting()
@@ -106,17 +260,53 @@ def main(
         'build_dir': build_dir,
         'output_path': output_path,
         'log_path': log_path,
+        'idf_py': idf_py,
+        'changed_since': changed_since,
+        'baseline': baseline,
         'xtensa_include_dirs': xtensa_include_dir,
         'run_clang_tidy_py': run_clang_tidy_py,
+        'clang_tidy': clang_tidy,
+        'backend': backend,
+        'clangd': clangd,
+        'cache_dir': cache_dir,
+        'tu_timeout': tu_timeout,
+        'shard_index': shard_index,
+        'shard_count': shard_count,
+        'duration_history': duration_history,
         'clang_extra_args': clang_extra_args,
+        'profile_top': profile_top,
         'base_dir': base_dir,
     }.items():
         if val is not None:
             useful_kwargs[key] = val
 
+    if update_baseline:
+        useful_kwargs['update_baseline'] = True
+
+    if force_reconfigure:
+        useful_kwargs['force_reconfigure'] = True
+
+    if progress:
+        useful_kwargs['progress'] = True
+
     if exit_code:
         useful_kwargs['exit_code'] = True
 
+    if filter_summary:
+        useful_kwargs['filter_summary'] = True
+
+    if enable_check_profile:
+        useful_kwargs['check_profile'] = True
+
+    if cache_size is not None:
+        useful_kwargs['cache_size'] = cache_size * 1024 * 1024
+
+    if tu_memory_limit is not None:
+        useful_kwargs['tu_memory_limit'] = tu_memory_limit * 1024 * 1024
+
+    if retry_isolated:
+        useful_kwargs['retry_isolated'] = True
+
     if check_files_regex:
         useful_kwargs['check_files_regex'] = list(check_files_regex)
 
@@ -131,7 +321,7 @@ def main(
 
     try:
         runner = Runner(list(dirs), **useful_kwargs)
-        runner.idf_reconfigure().remove_command_flags().filter_cmd().run_clang_tidy().check_limits().remove_color_output().normalize()
+        runner.idf_reconfigure().remove_command_flags().filter_cmd().run_clang_tidy().postprocess().check_baseline()
         runner()
     except FatalError as e:
         log.die(escape(str(e)))
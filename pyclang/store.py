@@ -0,0 +1,185 @@
+import re
+import sqlite3
+from contextlib import contextmanager
+
+import typing as t
+
+from .diagnostics import Diagnostic
+
+GLOB_WILDCARD_REGEX = re.compile(r'[*?\[]')
+
+
+def _prefix_range(prefix: str) -> t.Tuple[str, str]:
+    """
+    :return: (lower, upper) bounds of all the strings starting with ``prefix``, for an indexed range scan
+    """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class ResultsStore:
+    """
+    SQLite database of the diagnostics, indexed by path, check name and severity, so the queries don't need
+    to scan all the results.
+
+    >> with ResultsStore('results.db') as store:
+    >>     store.add(diagnostics)
+    >>     for diag in store.query(check='bugprone-*', path='components/esp_wifi'):
+    >>         ...
+    """
+
+    SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS diagnostics (
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL,
+        line INTEGER NOT NULL,
+        col INTEGER NOT NULL,
+        severity TEXT NOT NULL,
+        message TEXT NOT NULL,
+        check_name TEXT NOT NULL,
+        notes TEXT NOT NULL,
+        tu_count INTEGER NOT NULL DEFAULT 1,
+        fingerprint INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_path ON diagnostics (path);
+    CREATE INDEX IF NOT EXISTS idx_check_path ON diagnostics (check_name, path);
+    CREATE INDEX IF NOT EXISTS idx_severity ON diagnostics (severity);
+    CREATE INDEX IF NOT EXISTS idx_fingerprint ON diagnostics (fingerprint);
+    '''
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path)
+        self._conn.executescript(self.SCHEMA)
+
+    def __enter__(self) -> 'ResultsStore':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def add(self, diags: t.Iterable[Diagnostic]) -> int:
+        """
+        :return: number of added diagnostics
+        """
+        before = self._conn.total_changes
+        with self._conn:
+            self._conn.executemany(
+                'INSERT INTO diagnostics (path, line, col, severity, message, check_name, notes, tu_count, fingerprint) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    (
+                        d.path,
+                        d.line,
+                        d.col,
+                        d.severity,
+                        d.message,
+                        d.check,
+                        '\n'.join(d.notes),
+                        d.tu_count,
+                        d.fingerprint,
+                    )
+                    for d in diags
+                ),
+            )
+        return self._conn.total_changes - before
+
+    @contextmanager
+    def batched(self, batch_size: int = 10000) -> t.Iterator[t.Callable[[Diagnostic], None]]:
+        """
+        Add the diagnostics one by one while streaming them, they're inserted ``batch_size`` at a time
+
+        >> with store.batched() as add:
+        >>     for diag in diagnostics:
+        >>         add(diag)
+        """
+        batch: t.List[Diagnostic] = []
+
+        def _add(diag: Diagnostic) -> None:
+            batch.append(diag)
+            if len(batch) >= batch_size:
+                self.add(batch)
+                batch.clear()
+
+        yield _add
+        self.add(batch)
+
+    def set_tu_counts(self, tu_counts: t.Dict[int, int]) -> None:
+        """
+        :param tu_counts: dict of diagnostic fingerprint: number of translation units reporting it
+        """
+        with self._conn:
+            self._conn.executemany(
+                'UPDATE diagnostics SET tu_count = ? WHERE fingerprint = ?',
+                ((count, fingerprint) for fingerprint, count in tu_counts.items()),
+            )
+
+    @staticmethod
+    def _where(
+        check: t.Optional[str] = None,
+        path: t.Optional[str] = None,
+        severity: t.Optional[str] = None,
+    ) -> t.Tuple[str, t.List[t.Any]]:
+        clauses = []
+        params = []
+        if check:
+            # the literal prefix of the pattern narrows the index range, GLOB checks the rest
+            prefix = GLOB_WILDCARD_REGEX.split(check, 1)[0]
+            if prefix:
+                clauses.append('check_name >= ? AND check_name < ?')
+                params.extend(_prefix_range(prefix))
+            if prefix != check:
+                clauses.append('check_name GLOB ?')
+                params.append(check)
+        if path:
+            path = path.rstrip('/')
+            clauses.append('(path = ? OR (path >= ? AND path < ?))')
+            params.append(path)
+            params.extend(_prefix_range(path + '/'))
+        if severity:
+            clauses.append('severity = ?')
+            params.append(severity)
+
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def query(
+        self,
+        check: t.Optional[str] = None,
+        path: t.Optional[str] = None,
+        severity: t.Optional[str] = None,
+    ) -> t.Iterator[Diagnostic]:
+        """
+        :param check: check name, glob patterns like ``bugprone-*`` are supported
+        :param path: file path, or directory path to match all the files under it
+        :param severity: severity, like ``warning``
+        """
+        where, params = self._where(check, path, severity)
+        for row in self._conn.execute(
+            'SELECT path, line, col, severity, message, check_name, notes, tu_count FROM diagnostics'
+            + where
+            + ' ORDER BY path, line, col',
+            params,
+        ):
+            _path, line, col, _severity, message, _check, notes, tu_count = row
+            yield Diagnostic(
+                _path, line, col, _severity, message, _check, tuple(notes.split('\n')) if notes else (), tu_count
+            )
+
+    def count(
+        self,
+        check: t.Optional[str] = None,
+        path: t.Optional[str] = None,
+        severity: t.Optional[str] = None,
+    ) -> t.Dict[str, int]:
+        """
+        Same as ``query``, but returns the number of diagnostics of each check
+        """
+        where, params = self._where(check, path, severity)
+        return dict(
+            self._conn.execute(
+                'SELECT check_name, COUNT(*) FROM diagnostics' + where + ' GROUP BY check_name ORDER BY 2 DESC',
+                params,
+            )
+        )
@@ -1,7 +1,13 @@
+import codecs
+import hashlib
 import os
 import shlex
 import subprocess
 import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache, partial
 from pathlib import Path
 
 import typing as t
@@ -9,6 +15,9 @@ import typing as t
 from rich.markup import escape
 from esp_pylib.logger import log
 
+PUMP_CHUNK_SIZE = 64 * 1024
+STDERR_LIMIT = 1024 * 1024
+
 
 def to_path(*args: str) -> Path:
     return Path(os.path.expanduser(os.path.join(*args))).resolve()
@@ -18,6 +27,120 @@ def to_realpath(filepath: str) -> str:
     return os.path.realpath(os.path.expanduser(filepath))
 
 
+@lru_cache(maxsize=None)
+def _realpath_dir(dirpath: str) -> str:
+    return os.path.realpath(dirpath)
+
+
+def resolve_file(filepath: str) -> str:
+    """
+    Same as ``str(to_path(filepath))``, but only the directory is resolved, memoized per directory,
+    so resolving many files in the same directory hits the filesystem only once.
+    """
+    dirpath, filename = os.path.split(os.path.expanduser(filepath))
+    return os.path.join(_realpath_dir(dirpath or os.curdir), filename)
+
+
+class PathPrefixIndex:
+    """
+    Check if paths are under any of the given directories.
+    Each directory is checked only once, then memoized, so checking a path is usually one dict lookup.
+
+    >> index = PathPrefixIndex([to_path('components')])
+    >> index.contains(resolve_file('components/foo/bar.c'))
+    True
+    """
+
+    def __init__(self, prefixes: t.Iterable[t.Union[str, Path]]) -> None:
+        self._prefixes = set(str(p) for p in prefixes)
+        self._dirs: t.Dict[str, bool] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._prefixes)
+
+    def _is_under(self, dirpath: str) -> bool:
+        if dirpath not in self._dirs:
+            parent = os.path.dirname(dirpath)
+            self._dirs[dirpath] = dirpath in self._prefixes or (parent != dirpath and self._is_under(parent))
+
+        return self._dirs[dirpath]
+
+    def contains(self, path: str) -> bool:
+        """
+        :param path: resolved path
+        :return: True if any of the prefixes is a parent directory of the path
+        """
+        if not self._prefixes:
+            return False
+
+        return self._is_under(os.path.dirname(path))
+
+
+@contextmanager
+def atomic_write(filepath: str, mode: str = 'w') -> t.Iterator[t.IO]:
+    """
+    Write into a temp file in the same dir, which replaces the file if no exception is raised,
+    so a concurrent reader never sees a partial file. The dir is created if it doesn't exist.
+    """
+    folder = os.path.dirname(os.path.abspath(filepath))
+    os.makedirs(folder, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as fw:
+            yield fw
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def file_digest(filepath: str) -> str:
+    """
+    sha256 hex digest of the file content, digest of empty content if the file can't be read
+    """
+    h = hashlib.sha256()
+    try:
+        with open(filepath, 'rb') as fr:
+            for chunk in iter(lambda: fr.read(1024 * 1024), b''):
+                h.update(chunk)
+    except OSError:
+        pass
+
+    return h.hexdigest()
+
+
+class FileDigests(t.Dict[str, str]):
+    """
+    ``file_digest`` of the files, each file is read once
+
+    >> digests = FileDigests()
+    >> digests['/path/to/file.h']
+    """
+
+    def __missing__(self, path: str) -> str:
+        digest = self[path] = file_digest(path)
+        return digest
+
+
+def find_files(paths: t.Iterable[str], filename: str) -> t.List[str]:
+    """
+    Find the files named ``filename``, ``paths`` could be the files themselves or directories containing them
+    (searched recursively)
+    """
+    res = []
+    for path in paths:
+        if os.path.isfile(path):
+            res.append(path)
+            continue
+
+        for root, _, files in os.walk(path):
+            if filename in files:
+                res.append(os.path.join(root, filename))
+
+    return sorted(res)
+
+
 def to_str(bytes_str: t.AnyStr) -> str:
     if isinstance(bytes_str, bytes):
         return bytes_str.decode('utf-8', errors='ignore')
@@ -28,25 +151,104 @@ class KnownIssue(Exception):
     """KnownIssue"""
 
 
+class _BoundedBuffer:
+    """
+    Keep the first and the last ``limit // 2`` bytes written, drop the middle.
+    Whether ``needle`` is ever written is tracked over all the bytes, including the dropped ones.
+    """
+
+    def __init__(self, limit: int, needle: t.Optional[str] = None) -> None:
+        self.limit = limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.dropped = 0
+
+        self.needle = needle.encode() if needle else None
+        self.found = False
+        self._last = b''  # the needle could be split between chunks
+
+    def write(self, chunk: bytes) -> None:
+        if self.needle and not self.found:
+            self.found = self.needle in self._last + chunk
+            self._last = (self._last + chunk)[-(len(self.needle) - 1) :] if len(self.needle) > 1 else b''
+
+        half = self.limit // 2
+        if len(self.head) < half:
+            n = half - len(self.head)
+            self.head += chunk[:n]
+            chunk = chunk[n:]
+
+        self.tail += chunk
+        if len(self.tail) > half:
+            self.dropped += len(self.tail) - half
+            del self.tail[: len(self.tail) - half]
+
+    def getvalue(self) -> str:
+        if not self.dropped:
+            return to_str(bytes(self.head + self.tail))
+
+        return f'{to_str(bytes(self.head))}\n... {self.dropped} bytes truncated ...\n{to_str(bytes(self.tail))}'
+
+
+def _pump(pipe: t.BinaryIO, write: t.Callable[[bytes], None]) -> None:
+    with pipe:
+        for chunk in iter(partial(pipe.read1, PUMP_CHUNK_SIZE), b''):
+            write(chunk)
+
+
 def run_cmd(
     cmd: t.Union[t.List[str], str],
     stream: t.TextIO = sys.stdout,
     ignore_error: t.Optional[str] = None,
     expect_returncode: t.Optional[t.Union[t.List[int], int]] = None,
+    line_callback: t.Optional[t.Callable[[str], None]] = None,
+    stderr_limit: int = STDERR_LIMIT,
+    echo: bool = True,
     **kwargs,
 ) -> t.Union[KnownIssue, int]:
+    """
+    Run the command, write the stdout into ``stream`` and echo it live, unless ``echo`` is False.
+    Each stdout line is passed to ``line_callback`` as well, if specified.
+
+    stdout and stderr are drained concurrently in large chunks, so the command never blocks on a full pipe.
+    At most ``stderr_limit`` bytes of stderr are kept, the beginning and the end.
+    """
     if isinstance(cmd, str):
         cmd = shlex.split(cmd)
     cmd_str = ' '.join(cmd)
 
     log.print(f'Running command: "{escape(cmd_str)}"...')
     p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs)
-    # live print the stdout as well
-    for line in p.stdout:
-        line = to_str(line)
-        stream.write(line)
-        if stream != sys.stdout:
-            sys.stdout.write(line)
+
+    stderr = _BoundedBuffer(stderr_limit, ignore_error)
+    stderr_thread = threading.Thread(target=_pump, args=(p.stderr, stderr.write), daemon=True)
+    stderr_thread.start()
+
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    echo = echo and stream != sys.stdout
+    pending = ''
+
+    def _write(text: str) -> None:
+        nonlocal pending
+
+        if not text:
+            return
+
+        # live print the stdout as well
+        stream.write(text)
+        if echo:
+            sys.stdout.write(text)
+
+        if line_callback:
+            lines = (pending + text).split('\n')
+            pending = lines.pop()
+            for line in lines:
+                line_callback(line + '\n')
+
+    _pump(p.stdout, lambda chunk: _write(decoder.decode(chunk)))
+    _write(decoder.decode(b'', final=True))
+    if line_callback and pending:
+        line_callback(pending)
 
     if expect_returncode is None:
         expect_returncode = [0]
@@ -55,7 +257,8 @@ def run_cmd(
         expect_returncode = [expect_returncode]
 
     returncode = p.wait()
-    raw_stderr = to_str(p.stderr.read())
+    stderr_thread.join()
+    raw_stderr = stderr.getvalue()
     if returncode not in expect_returncode:
         log.err(f'Command "{escape(cmd_str)}" failed with exit code {returncode}')
         if raw_stderr:
@@ -63,7 +266,7 @@ def run_cmd(
         raise SystemExit(returncode)
 
     if raw_stderr:
-        if ignore_error and ignore_error in raw_stderr:
+        if stderr.found:
             return KnownIssue()  # nothing happens
 
         log.warn(
@@ -75,3 +278,38 @@ def run_cmd(
 
 class FileNotFoundSystemExit(SystemExit):
     """System Exit for FileNotFoundError"""
+
+
+def get_command_args(command: t.Dict[str, t.Any]) -> t.List[str]:
+    """
+    Get the arguments of an entry in compile_commands.json, which has either ``arguments`` or ``command``
+    """
+    if 'arguments' in command:
+        return list(command['arguments'])
+
+    return split_command(command['command'])
+
+
+def split_command(cmd: str) -> t.List[str]:
+    """
+    ``shlex.split`` the command, which is slow, only on the whitespace separated tokens with quotes or backslashes.
+    Falls back to the whole command if a token is not complete by itself, like a quoted string with spaces.
+    """
+    res = []
+    for token in cmd.split():
+        if '"' not in token and "'" not in token and '\\' not in token:
+            res.append(token)
+            continue
+
+        try:
+            res.extend(_split_token(token))
+        except ValueError:
+            return shlex.split(cmd)
+
+    return res
+
+
+@lru_cache(maxsize=4096)
+def _split_token(token: str) -> t.Tuple[str, ...]:
+    # the same defines and flags are in most of the commands
+    return tuple(shlex.split(token))
@@ -24,17 +24,15 @@ setuptools.setup(
     description='A python clang-tidy runner',
     long_description=read('README.md'),
     long_description_content_type='text/markdown',
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=['benchmarks', 'benchmarks.*']),
     python_requires='>=3.7',
     install_requires=[
         'esp-pylib[cli]>=1.1.1',
-        'rich',
+        'rich>=12.0',
     ],
     extras_require={
-        # codereport 0.4.x → fs 2.x → pkg_resources (removed in setuptools 82).
-        # Pin setuptools<82 so pkg_resources remains importable until codereport
-        # is replaced (tracked in IDF-11109).
-        'html': ['codereport~=0.4', 'setuptools<82'],
+        # the html report is generated natively now, kept for the existing "pyclang[html]" installs
+        'html': [],
     },
     classifiers=[
         'Programming Language :: Python',
@@ -50,6 +48,9 @@ setuptools.setup(
         'License :: OSI Approved :: MIT License',
     ],
     entry_points={
-        'console_scripts': ['idf_clang_tidy = pyclang.scripts.idf_clang_tidy:main'],
+        'console_scripts': [
+            'idf_clang_tidy = pyclang.scripts.idf_clang_tidy:main',
+            'pyclang = pyclang.scripts.cli:main',
+        ],
     },
 )
@@ -0,0 +1,64 @@
+import pytest
+
+from pyclang.baseline import BASELINE_MAGIC, Baseline
+from pyclang.diagnostics import Diagnostic
+
+SOURCE = 'int a;\nint b = a;\nint c;\n'
+
+
+def _diag(line, message='foo'):
+    return Diagnostic('main.c', line, 5, 'warning', message, 'bugprone-foo')
+
+
+def test_save_and_load(tmp_path):
+    (tmp_path / 'main.c').write_text(SOURCE)
+    baseline = Baseline(str(tmp_path))
+    for diag in (_diag(2), _diag(2), _diag(3)):
+        baseline.add(diag)
+    baseline.save(str(tmp_path / 'baseline.bin'))
+
+    data = (tmp_path / 'baseline.bin').read_bytes()
+    assert data.startswith(BASELINE_MAGIC)
+    # one little endian int64 per accepted diagnostic
+    assert len(data) == len(BASELINE_MAGIC) + 3 * 8
+
+    loaded = Baseline.load(str(tmp_path / 'baseline.bin'), str(tmp_path))
+    assert len(loaded) == 3
+    assert loaded.counts == baseline.counts
+
+
+def test_load_rejects_other_files(tmp_path):
+    (tmp_path / 'baseline.bin').write_bytes(b'not a baseline')
+
+    with pytest.raises(ValueError):
+        Baseline.load(str(tmp_path / 'baseline.bin'), str(tmp_path))
+
+
+def test_matched_after_the_code_above_moves(tmp_path):
+    (tmp_path / 'main.c').write_text(SOURCE)
+    baseline = Baseline(str(tmp_path))
+    baseline.add(_diag(2))
+    baseline.save(str(tmp_path / 'baseline.bin'))
+
+    (tmp_path / 'main.c').write_text('#include <stdio.h>\n\n' + SOURCE)
+    loaded = Baseline.load(str(tmp_path / 'baseline.bin'), str(tmp_path))
+    assert not loaded.consume(_diag(4, message='other'))
+    assert loaded.consume(_diag(4))
+
+
+def test_each_accepted_diagnostic_matches_once(tmp_path):
+    (tmp_path / 'main.c').write_text(SOURCE)
+    baseline = Baseline(str(tmp_path))
+    baseline.add(_diag(2))
+
+    assert baseline.consume(_diag(2))
+    assert not baseline.consume(_diag(2))
+
+
+def test_changed_code_is_not_matched(tmp_path):
+    (tmp_path / 'main.c').write_text(SOURCE)
+    baseline = Baseline(str(tmp_path))
+    baseline.add(_diag(2))
+
+    (tmp_path / 'main.c').write_text(SOURCE.replace('int b = a;', 'int b = c;'))
+    assert not Baseline(str(tmp_path), baseline.counts).consume(_diag(2))
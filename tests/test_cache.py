@@ -0,0 +1,90 @@
+import os
+
+from pyclang.cache import ResultCache
+from pyclang.deps import TUCanonicalizer
+from pyclang.runner import TranslationUnit
+from pyclang.utils import FileDigests
+
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    return str(path)
+
+
+def _tu(tmp_path, *extra_args):
+    source = str(tmp_path / 'main.c')
+    args = ('gcc', f'-I{tmp_path / "include"}', *extra_args, '-c', source)
+    return TranslationUnit(source, str(tmp_path / 'build'), str(tmp_path), args, str(tmp_path / 'build'))
+
+
+def test_key_depends_on_the_included_headers(tmp_path):
+    _write(tmp_path / 'main.c', '#include "foo.h"\nint main(void) { return FOO; }\n')
+    _write(tmp_path / 'include' / 'foo.h', '#define FOO 0\n')
+    _write(tmp_path / 'include' / 'unused.h', '#define BAR 0\n')
+
+    key = ResultCache(str(tmp_path / 'cache')).get_key(_tu(tmp_path), 'salt')
+    assert ResultCache(str(tmp_path / 'cache')).get_key(_tu(tmp_path), 'salt') == key
+    assert ResultCache(str(tmp_path / 'cache')).get_key(_tu(tmp_path), 'other salt') != key
+
+    _write(tmp_path / 'include' / 'unused.h', '#define BAR 1\n')
+    assert ResultCache(str(tmp_path / 'cache')).get_key(_tu(tmp_path), 'salt') == key
+
+    _write(tmp_path / 'include' / 'foo.h', '#define FOO 1\n')
+    assert ResultCache(str(tmp_path / 'cache')).get_key(_tu(tmp_path), 'salt') != key
+
+
+def test_key_ignores_the_output_file(tmp_path):
+    _write(tmp_path / 'main.c', 'int main(void) { return 0; }\n')
+    cache = ResultCache(str(tmp_path / 'cache'))
+
+    key = cache.get_key(_tu(tmp_path, '-o', 'a.o'), 'salt')
+    assert cache.get_key(_tu(tmp_path, '-o', 'b.o'), 'salt') == key
+    assert cache.get_key(_tu(tmp_path, '-DFOO'), 'salt') != key
+
+
+def test_key_depends_on_the_clang_tidy_configs(tmp_path):
+    _write(tmp_path / 'main.c', 'int main(void) { return 0; }\n')
+    key = ResultCache(str(tmp_path / 'cache')).get_key(_tu(tmp_path), 'salt')
+
+    _write(tmp_path / '.clang-tidy', 'Checks: "-*,bugprone-*"\n')
+    assert ResultCache(str(tmp_path / 'cache')).get_key(_tu(tmp_path), 'salt') != key
+
+
+def test_digests_are_shared_with_the_canonicalizer(tmp_path):
+    source = _write(tmp_path / 'main.c', '#include "foo.h"\n')
+    _write(tmp_path / 'build' / 'foo.h', '#define FOO 0\n')
+    digests = FileDigests()
+    tu = _tu(tmp_path)._replace(arguments=('gcc', f'-I{tmp_path / "build"}', '-c', source))
+
+    TUCanonicalizer(digests=digests).get_key(tu.file, tu.arguments, tu.directory)
+    assert list(digests) == [str(tmp_path / 'build' / 'foo.h')]
+
+    ResultCache(str(tmp_path / 'cache'), digests=digests).get_key(tu, 'salt')
+    assert sorted(digests) == [str(tmp_path / 'build' / 'foo.h'), source]
+
+
+def test_put_and_get(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    assert cache.get('a' * 64) is None
+
+    cache.put('a' * 64, 'main.c:1:1: warning: foo [bar]\n')
+    assert cache.get('a' * 64) == 'main.c:1:1: warning: foo [bar]\n'
+    assert not [fn for _, _, files in os.walk(cache.cache_dir) for fn in files if fn.endswith('.tmp')]
+
+
+def test_evict_the_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), max_size=0)
+    for i, key in enumerate(('a' * 64, 'b' * 64, 'c' * 64)):
+        cache.put(key, 'x' * 100)
+        path = cache._get_path(key)
+        os.utime(path, (1000 + i, 1000 + i))
+    entry_size = os.path.getsize(cache._get_path('a' * 64))
+
+    # "a" is the oldest, but used recently
+    cache.get('a' * 64)
+    cache.max_size = entry_size * 2
+    assert cache.evict() == 1
+    assert cache.get('b' * 64) is None
+    assert cache.get('a' * 64) is not None
+    assert cache.get('c' * 64) is not None
@@ -0,0 +1,190 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+from pyclang.clangd import ClangdClient, ClangdError, format_diagnostics, get_clangd_config
+from pyclang.runner import ClangdDriver
+
+# LSP server publishing the diagnostics written in the opened file as JSON,
+# it hangs on "hang" and exits on "crash", the initialize request fails with "--fail-initialize"
+FAKE_CLANGD = r'''
+import json, sys
+
+def read():
+    length = None
+    while True:
+        line = sys.stdin.buffer.readline()
+        if not line:
+            sys.exit(0)
+        if not line.strip():
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    return json.loads(sys.stdin.buffer.read(length))
+
+def send(message):
+    body = json.dumps(dict(message, jsonrpc='2.0')).encode()
+    sys.stdout.buffer.write(b'Content-Length: %d\r\n\r\n' % len(body) + body)
+    sys.stdout.buffer.flush()
+
+while True:
+    message = read()
+    method = message.get('method')
+    if method == 'initialize' and '--fail-initialize' in sys.argv:
+        send({'id': message['id'], 'error': {'code': -32603, 'message': 'broken'}})
+    elif method == 'initialize':
+        # a request from the server, answered by the client
+        send({'id': 'progress', 'method': 'window/workDoneProgress/create', 'params': {'token': 1}})
+        send({'id': message['id'], 'result': {'capabilities': {}}})
+    elif method == 'textDocument/didOpen':
+        document = message['params']['textDocument']
+        if document['text'] == 'crash':
+            sys.exit(3)
+        if document['text'] != 'hang':
+            send({
+                'method': 'textDocument/publishDiagnostics',
+                'params': {'uri': document['uri'], 'version': document['version'], 'diagnostics': json.loads(document['text'])},
+            })
+    elif method == 'shutdown':
+        send({'id': message['id'], 'result': None})
+    elif method == 'exit':
+        sys.exit(0)
+    elif 'id' in message and method:
+        send({'id': message['id'], 'error': {'code': -32601, 'message': 'unknown method ' + method}})
+'''
+
+DIAG = {
+    'range': {'start': {'line': 1, 'character': 4}, 'end': {'line': 1, 'character': 5}},
+    'severity': 2,
+    'source': 'clang-tidy',
+    'code': 'bugprone-foo',
+    'message': 'foo is bad',
+}
+
+
+@pytest.fixture
+def client():
+    _client = ClangdClient([sys.executable, '-c', FAKE_CLANGD])
+    yield _client
+    _client.close()
+
+
+def test_analyse(client, tmp_path):
+    (tmp_path / 'a.c').write_text(json.dumps([DIAG]))
+    (tmp_path / 'b.c').write_text('[]')
+
+    assert client.analyse(str(tmp_path / 'a.c'), timeout=10) == [DIAG]
+    assert client.analyse(str(tmp_path / 'b.c'), timeout=10) == []
+    assert client.analyse(str(tmp_path / 'a.c'), timeout=10) == [DIAG]
+
+
+def test_analyse_timeout(client, tmp_path):
+    (tmp_path / 'hang.c').write_text('hang')
+    (tmp_path / 'a.c').write_text('[]')
+
+    with pytest.raises(TimeoutError):
+        client.analyse(str(tmp_path / 'hang.c'), timeout=0.2)
+    assert client.alive
+    assert client.analyse(str(tmp_path / 'a.c'), timeout=10) == []
+
+
+def test_analyse_crash(client, tmp_path):
+    (tmp_path / 'crash.c').write_text('crash')
+
+    with pytest.raises(ClangdError, match='exited with code 3'):
+        client.analyse(str(tmp_path / 'crash.c'), timeout=10)
+    assert not client.alive
+
+
+def test_error_response(client):
+    with pytest.raises(ClangdError, match='unknown method'):
+        client.request('textDocument/hover', {}, timeout=10)
+
+
+def test_close():
+    client = ClangdClient([sys.executable, '-c', FAKE_CLANGD])
+    client.close()
+
+    assert client.proc.returncode == 0
+
+
+def test_process_is_killed_if_initialize_fails(monkeypatch):
+    procs = []
+    popen = subprocess.Popen
+
+    def _popen(*args, **kwargs):
+        procs.append(popen(*args, **kwargs))
+        return procs[-1]
+
+    monkeypatch.setattr(subprocess, 'Popen', _popen)
+    with pytest.raises(ClangdError, match='initialize failed: broken'):
+        ClangdClient([sys.executable, '-c', FAKE_CLANGD, '--fail-initialize'])
+
+    assert procs[0].returncode == -signal.SIGKILL
+
+
+def test_driver_keeps_one_client_per_worker(tmp_path):
+    driver = ClangdDriver([sys.executable, '-c', FAKE_CLANGD])
+    env = dict(os.environ)
+    clients = {}
+
+    first = driver._get_client(clients, str(tmp_path / 'a'), env)
+    assert driver._get_client(clients, str(tmp_path / 'a'), env) is first
+
+    second = driver._get_client(clients, str(tmp_path / 'b'), env)
+    assert not first.alive
+    assert clients == {str(tmp_path / 'b'): second}
+    second.close()
+
+
+def test_format_diagnostics(tmp_path):
+    source = tmp_path / 'main.c'
+    header = tmp_path / 'foo.h'
+    source.write_text('#include "foo.h"\nint x = 1;\n')
+    header.write_text('int y;\n')
+
+    def _location(path, line, col):
+        return {'uri': path.as_uri(), 'range': {'start': {'line': line, 'character': col}}}
+
+    diagnostics = [
+        dict(DIAG, relatedInformation=[{'location': _location(header, 0, 4), 'message': 'declared here'}]),
+        # clangd reports the diagnostics in the headers at the include line
+        {
+            'range': {'start': {'line': 0, 'character': 0}},
+            'severity': 1,
+            'source': 'clang',
+            'message': 'In included file: unknown type name',
+            'relatedInformation': [{'location': _location(header, 0, 0), 'message': 'error here'}],
+        },
+        # not reported by clang-tidy by default
+        dict(DIAG, source='clang', severity=2),
+        dict(DIAG, severity=3),
+    ]
+
+    assert format_diagnostics(str(source), diagnostics) == (
+        f'{source}:2:5: warning: foo is bad [bugprone-foo]\n'
+        'int x = 1;\n'
+        '    ^\n'
+        f'{header}:1:5: note: declared here\n'
+        'int y;\n'
+        '    ^\n'
+        f'{header}:1:1: error: unknown type name [clang-diagnostic-error]\n'
+        'int y;\n'
+        '^\n'
+    )
+
+
+def test_clangd_config_keeps_the_order_of_the_checks():
+    config = get_clangd_config(['-p', 'build', '--checks=-*,bugprone-*,-bugprone-foo,readability-*', '--quiet'])
+    documents = [json.loads(document) for document in config.split('---\n')]
+
+    assert [document['Diagnostics']['ClangTidy'] for document in documents] == [
+        {'Add': [], 'Remove': ['*'], 'FastCheckFilter': 'None'},
+        {'Add': ['bugprone-*'], 'Remove': ['bugprone-foo']},
+        {'Add': ['readability-*'], 'Remove': []},
+    ]
@@ -0,0 +1,130 @@
+import os
+import stat
+
+from pyclang.deps import get_reconfigure_stamp, get_tu_dependencies, parse_depfile, read_cmake_inputs, read_ninja_deps
+
+NINJA_DEPS = '''\
+main.c.obj: #deps 3, deps mtime 1700000000 (VALID)
+    ../main.c
+    ../include/foo.h
+    /opt/sdk/bar.h
+
+other.c.obj: #deps 1, deps mtime 1700000000 (STALE)
+    ../other.c
+
+'''
+
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    return str(path)
+
+
+def _fake_ninja(tmp_path, monkeypatch, stdout):
+    bin_dir = tmp_path / 'bin'
+    ninja = _write(bin_dir / 'ninja', f'#!/bin/sh\ncat <<"EOF"\n{stdout}EOF\n')
+    os.chmod(ninja, os.stat(ninja).st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', str(bin_dir), prepend=os.pathsep)
+
+
+def test_parse_depfile():
+    content = (
+        'main.c.obj: ../main.c ../include/foo.h \\\n'
+        ' ../include/with\\ space.h\n'
+        'other.c.obj: ../other.c\n'
+        'main.c.obj: ../include/bar.h\n'
+        'not a rule\n'
+    )
+
+    assert parse_depfile(content) == {
+        'main.c.obj': ['../main.c', '../include/foo.h', '../include/with space.h', '../include/bar.h'],
+        'other.c.obj': ['../other.c'],
+    }
+
+
+def test_read_ninja_deps(tmp_path, monkeypatch):
+    _fake_ninja(tmp_path, monkeypatch, NINJA_DEPS)
+    build_dir = tmp_path / 'build'
+
+    # not a ninja build dir
+    build_dir.mkdir()
+    assert read_ninja_deps(str(build_dir)) == {}
+
+    _write(build_dir / '.ninja_deps', '')
+    assert read_ninja_deps(str(build_dir)) == {
+        'main.c.obj': ['../main.c', '../include/foo.h', '/opt/sdk/bar.h'],
+        'other.c.obj': ['../other.c'],
+    }
+
+
+def test_get_tu_dependencies(tmp_path):
+    tmp_path = tmp_path.resolve()
+    build_dir = tmp_path / 'build'
+    main = _write(tmp_path / 'main.c', '#include "foo.h"\n')
+    foo = _write(tmp_path / 'include' / 'foo.h', '')
+    # not built yet, scanned
+    other = _write(tmp_path / 'other.c', '#include "foo.h"\n#include "missing.h"\n')
+    _write(build_dir / 'main.c.obj.d', 'main.c.obj: ../main.c ../include/recorded.h\n')
+
+    commands = [
+        {'directory': str(build_dir), 'file': '../main.c', 'command': f'gcc -I{tmp_path / "include"} -o main.c.obj -c ../main.c'},
+        {'directory': str(build_dir), 'file': other, 'arguments': ['gcc', '-I../include', '-o', 'other.c.obj', '-c', other]},
+    ]
+
+    assert get_tu_dependencies(str(build_dir), commands) == {
+        main: {main, str(tmp_path / 'include' / 'recorded.h')},
+        other: {other, foo},
+    }
+
+
+def test_read_cmake_inputs(tmp_path):
+    build_dir = tmp_path / 'build'
+    assert read_cmake_inputs(str(build_dir)) == []
+
+    _write(
+        build_dir / 'build.ninja',
+        'build all: phony app.elf\n'
+        'build build.ninja: RERUN_CMAKE | ../CMakeLists.txt ../main/CMakeLists.txt ../with$ space/x.cmake $\n'
+        '    /opt/sdk/tools/cmake/idf.cmake || cmake_object_order_depends_target\n'
+        '  pool = console\n',
+    )
+
+    assert read_cmake_inputs(str(build_dir)) == [
+        str(tmp_path / 'CMakeLists.txt'),
+        str(tmp_path / 'main' / 'CMakeLists.txt'),
+        str(tmp_path / 'with space' / 'x.cmake'),
+        '/opt/sdk/tools/cmake/idf.cmake',
+    ]
+
+
+def test_reconfigure_stamp(tmp_path, monkeypatch):
+    monkeypatch.delenv('IDF_PATH', raising=False)
+    project_dir = tmp_path / 'project'
+    build_dir = project_dir / 'build'
+    _write(project_dir / 'sdkconfig', 'CONFIG_FOO=y\n')
+    _write(build_dir / 'CMakeCache.txt', '')
+    main_dir = project_dir / 'main'
+    cmakelists = _write(main_dir / 'CMakeLists.txt', 'idf_component_register(SRCS "main.c")\n')
+    _write(build_dir / 'build.ninja', 'build build.ninja: RERUN_CMAKE | ../main/CMakeLists.txt\n')
+    os.utime(str(main_dir), (1000, 1000))
+
+    def _stamp():
+        return get_reconfigure_stamp(str(project_dir), str(build_dir))
+
+    stamp = _stamp()
+    assert _stamp() == stamp
+
+    # a new file in the dir of a CMake input, like a new component
+    (main_dir / 'new').mkdir()
+    assert _stamp() != stamp
+    os.utime(str(main_dir), (1000, 1000))
+    assert _stamp() == stamp
+
+    _write(project_dir / 'sdkconfig', 'CONFIG_FOO=n\n')
+    assert _stamp() != stamp
+    _write(project_dir / 'sdkconfig', 'CONFIG_FOO=y\n')
+    assert _stamp() == stamp
+
+    os.utime(cmakelists, (2000, 2000))
+    assert _stamp() != stamp
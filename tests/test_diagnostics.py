@@ -0,0 +1,115 @@
+from pyclang.diagnostics import Diagnostic, DiagnosticDeduplicator, DiagnosticParser, parse_lines
+
+OUTPUT = '''\
+/src/main.c:3:5: warning: narrowing conversion [bugprone-narrowing-conversions]
+  int x = y;
+    ^
+/src/main.c:10:1: error: unknown type name 'foo' [clang-diagnostic-error]
+   10 | foo bar;
+      | ^~~
+      | int
+/src/foo.h:1:9: note: expanded from macro 'FOO'
+    1 | #define FOO 1
+      |         ^
+clang-tidy -p=build /src/other.c
+/src/other.c:2:2: warning: no check
+[2/3] Processing file /src/last.c.
+2 warnings and 1 error generated.
+'''
+
+
+def test_parse_the_notes_excerpts_and_carets():
+    diags = list(parse_lines(OUTPUT.splitlines()))
+
+    assert [d.location for d in diags] == ['/src/main.c:3:5', '/src/main.c:10:1', '/src/other.c:2:2']
+    assert diags[0] == Diagnostic(
+        '/src/main.c',
+        3,
+        5,
+        'warning',
+        'narrowing conversion',
+        'bugprone-narrowing-conversions',
+        ('  int x = y;', '    ^'),
+    )
+    assert diags[1].severity == 'error'
+    assert diags[1].notes == (
+        '   10 | foo bar;',
+        '      | ^~~',
+        '      | int',
+        "/src/foo.h:1:9: note: expanded from macro 'FOO'",
+        '    1 | #define FOO 1',
+        '      |         ^',
+    )
+    assert diags[2].check == ''
+    assert diags[2].notes == ()
+
+
+def test_other_output_is_not_part_of_any_diagnostic():
+    lines = [
+        '/src/main.c:3:5: warning: foo [bar]',
+        '/usr/bin/clang-tidy -p=build /src/next.c',
+        '  int x = y;',
+        '    ^',
+    ]
+    diags = list(parse_lines(lines))
+
+    assert len(diags) == 1
+    assert diags[0].notes == ()
+
+
+def test_color_codes_are_stripped():
+    lines = [
+        '\x1b[1m/src/main.c:3:5: \x1b[0m\x1b[0;1;35mwarning: \x1b[0m\x1b[1mfoo [bar]\x1b[0m\n',
+        '  int x = y;\n',
+        '\x1b[0;1;32m    ^\n',
+        '\x1b[0m1 warning generated.\n',
+    ]
+    diags = list(parse_lines(lines))
+
+    assert [d.to_text() for d in diags] == ['/src/main.c:3:5: warning: foo [bar]\n  int x = y;\n    ^\n']
+
+
+def test_feed_returns_the_previous_diagnostic():
+    parser = DiagnosticParser()
+    assert parser.feed('/src/a.c:1:1: warning: a [x]') is None
+    assert parser.feed('/src/b.c:1:1: warning: b [x]').path == '/src/a.c'
+    assert parser.close().path == '/src/b.c'
+    assert parser.close() is None
+
+
+def test_fingerprint_ignores_the_notes():
+    diag = Diagnostic('/src/main.c', 3, 5, 'warning', 'foo', 'bar', ('  int x = y;', '    ^'))
+
+    assert diag.fingerprint == diag._replace(notes=(), tu_count=3).fingerprint
+    assert -(2**63) <= diag.fingerprint < 2**63
+    for changed in (
+        diag._replace(path='/src/other.c'),
+        diag._replace(line=4),
+        diag._replace(col=6),
+        diag._replace(check='baz'),
+        diag._replace(message='foo2'),
+    ):
+        assert changed.fingerprint != diag.fingerprint
+
+
+def test_deduplicator_counts_the_translation_units():
+    diag = Diagnostic('/src/foo.h', 1, 1, 'warning', 'foo', 'bar')
+    other = diag._replace(line=2)
+    deduplicator = DiagnosticDeduplicator()
+
+    assert deduplicator.add(diag)
+    assert not deduplicator.add(diag._replace(tu_count=2))
+    assert deduplicator.add(other)
+    assert deduplicator.duplicated_counts == {diag.fingerprint: 3}
+
+
+def test_deduplicator_forgets_the_least_recently_seen():
+    diags = [Diagnostic('/src/main.c', i, 1, 'warning', 'foo', 'bar') for i in range(3)]
+    deduplicator = DiagnosticDeduplicator(max_size=2)
+
+    assert all(deduplicator.add(diag) for diag in diags[:2])
+    # seen again, so the second one is the least recently seen
+    assert not deduplicator.add(diags[0])
+    assert deduplicator.add(diags[2])
+    assert not deduplicator.add(diags[0])
+    assert deduplicator.add(diags[1])
@@ -0,0 +1,61 @@
+import os
+
+from pyclang.diagnostics import Diagnostic
+from pyclang.report import HtmlReport
+
+
+def _diag(path, line, check='bugprone-branch-clone', severity='warning'):
+    return Diagnostic(path, line, 1, severity, f'issue at {line}', check)
+
+
+def _write_report(tmp_path, diags, page_size=100):
+    report = HtmlReport(str(tmp_path / 'report'), str(tmp_path), page_size=page_size)
+    assert report.write(diags) == len({d.path for d in diags})
+    return report
+
+
+def _read(report, name):
+    with open(os.path.join(report.report_dir, name)) as fr:
+        return fr.read()
+
+
+def test_file_page_shows_the_findings_inline(tmp_path):
+    (tmp_path / 'main.c').write_text('int a;\nint <b>;\n')
+    diags = [_diag('main.c', 2, severity='error'), _diag('main.c', 9)]
+    report = _write_report(tmp_path, diags)
+
+    page = _read(report, report.get_file_page_name('main.c'))
+    assert '<td class="ln">2</td><td>int &lt;b&gt;;</td></tr>\n<tr class="diag error">' in page
+    # out of the source, listed first
+    assert page.index('main.c:9:1') < page.index('id="L1"')
+
+    index = _read(report, HtmlReport.INDEX_FILENAME)
+    assert '2 findings in 1 files' in index
+    assert '1 error, 1 warning' in index
+
+
+def test_index_is_paginated(tmp_path):
+    diags = [_diag(f'file_{i}.c', 1) for i in range(5)]
+    report = _write_report(tmp_path, diags, page_size=2)
+
+    assert os.path.isfile(os.path.join(report.report_dir, 'index_3.html'))
+    assert not os.path.isfile(os.path.join(report.report_dir, 'index_4.html'))
+    assert 'file_4.c' in _read(report, 'index_3.html')
+    assert 'file_4.c' not in _read(report, HtmlReport.INDEX_FILENAME)
+
+
+def test_only_the_changed_pages_are_written_again(tmp_path):
+    for name in ('a.c', 'b.c', 'c.c'):
+        (tmp_path / name).write_text('int a;\n')
+    diags = [_diag('a.c', 1), _diag('b.c', 1), _diag('c.c', 1)]
+    report = _write_report(tmp_path, diags)
+    assert (report.written, report.skipped) == (4, 0)
+
+    report = _write_report(tmp_path, diags)
+    assert (report.written, report.skipped) == (0, 4)
+
+    # the source of "a.c" changed, "b.c" has a new finding, "c.c" has no finding anymore
+    (tmp_path / 'a.c').write_text('int b;\n')
+    report = _write_report(tmp_path, [_diag('a.c', 1), _diag('b.c', 1), _diag('b.c', 1, check='other')])
+    assert (report.written, report.skipped) == (3, 0)
+    assert not os.path.isfile(os.path.join(report.report_dir, report.get_file_page_name('c.c')))
@@ -0,0 +1,108 @@
+import json
+import os
+import signal
+import sys
+import time
+
+import pytest
+
+from pyclang.runner import ClangTidyDriver, Runner, TranslationUnit, _WaitedProcess, _run_with_rusage
+from pyclang.store import ResultsStore
+
+
+def test_args_rewriter():
+    rewrite = Runner([])._get_args_rewriter()
+
+    args = ['gcc', '-mlongcalls', '-fstrict-volatile-bitfields', '-fmacro-prefix-map=/src=.', '-DFOO', '-c', 'main.c']
+    assert rewrite(args) == ['gcc', '-mlong-calls', '-DFOO', '-c', 'main.c']
+    # memoized per argument
+    assert rewrite(args) == ['gcc', '-mlong-calls', '-DFOO', '-c', 'main.c']
+
+
+def test_remove_command_flags_writes_the_analysis_db(tmp_path):
+    runner = Runner([str(tmp_path)])
+    build_dir = tmp_path / runner.build_dir
+    build_dir.mkdir()
+    commands = [
+        {'directory': str(build_dir), 'file': 'main.c', 'command': 'gcc -mlongcalls -DSTR="foo bar" -c main.c'},
+        {'directory': str(build_dir), 'file': 'other.c', 'arguments': ['gcc', '-fno-test-coverage', '-c', 'other.c']},
+    ]
+    (build_dir / Runner.COMPILE_COMMANDS_FILENAME).write_text(json.dumps(commands))
+
+    runner._step('remove_command_flags')(runner, str(tmp_path), str(tmp_path))
+
+    analysis_db = tmp_path / runner.build_dir / Runner.ANALYSIS_DB_DIRNAME / Runner.COMPILE_COMMANDS_FILENAME
+    assert runner.get_compile_commands_path(str(tmp_path)) == str(analysis_db)
+    assert json.loads(analysis_db.read_text()) == [
+        {'directory': str(build_dir), 'file': 'main.c', 'arguments': ['gcc', '-mlong-calls', '-DSTR=foo bar', '-c', 'main.c']},
+        {'directory': str(build_dir), 'file': 'other.c', 'arguments': ['gcc', '-c', 'other.c']},
+    ]
+    # the one of CMake is kept, so it's not rewritten again
+    assert json.loads((build_dir / Runner.COMPILE_COMMANDS_FILENAME).read_text()) == commands
+
+
+def test_merge_results(tmp_path):
+    # the header is reported by both folders
+    shared = '/src/components/foo/foo.h:1:1: warning: shared [bugprone-foo]\n'
+    warnings = {
+        'a': shared + 'main/a.c:2:1: warning: only a [bugprone-bar]\n',
+        'b': shared + 'main/b.c:3:1: error: only b [clang-diagnostic-error]\n',
+    }
+    output_dirs = []
+    for name, content in warnings.items():
+        output_dir = tmp_path / name
+        output_dir.mkdir()
+        (output_dir / Runner.WARN_FILENAME).write_text(content)
+        output_dirs.append((str(output_dir), str(output_dir)))
+
+    runner = Runner([], base_dir='/src', merge_dir=str(tmp_path / 'merged'))
+    runner._step('merge_results')(runner, output_dirs)
+
+    assert (tmp_path / 'merged' / Runner.WARN_FILENAME).read_text() == (
+        'components/foo/foo.h:1:1: warning: shared [bugprone-foo]\n'
+        'main/a.c:2:1: warning: only a [bugprone-bar]\n'
+        'main/b.c:3:1: error: only b [clang-diagnostic-error]\n'
+    )
+    with ResultsStore(str(tmp_path / 'merged' / Runner.RESULTS_DB_FILENAME)) as store:
+        assert [(d.path, d.tu_count) for d in store.query()] == [('components/foo/foo.h', 2), ('main/a.c', 1), ('main/b.c', 1)]
+
+
+def test_run_with_rusage_timeout():
+    res = _run_with_rusage([sys.executable, '-c', 'import time; time.sleep(30)'], timeout=0.5)
+
+    assert res.timed_out
+    assert res.returncode == -signal.SIGKILL
+
+
+def test_reaped_process_is_not_killed(monkeypatch):
+    proc = _WaitedProcess([sys.executable, '-c', ''])
+    assert proc.wait4()[0] == 0
+
+    # the pid may be reused by another process already
+    signals = []
+    monkeypatch.setattr(os, 'kill', lambda *args: signals.append(args))
+    proc.kill()
+    assert signals == []
+
+
+def test_process_reaped_by_popen():
+    proc = _WaitedProcess([sys.executable, '-c', 'raise SystemExit(3)'])
+    proc.popen.wait()
+
+    assert proc.wait4() == (3, None)
+
+
+def test_driver_stops_when_the_consumer_stops(tmp_path):
+    # "fast.c" is done right away, the others take 30 seconds
+    fake_clang_tidy = [sys.executable, '-c', 'import sys, time; time.sleep(0 if sys.argv[-1].endswith("fast.c") else 30)']
+    driver = ClangTidyDriver(fake_clang_tidy, jobs=2)
+    tus = [TranslationUnit(str(tmp_path / name), str(tmp_path), str(tmp_path)) for name in ('fast.c', *(f'{i}.c' for i in range(10)))]
+
+    start = time.monotonic()
+    with pytest.raises(ValueError):
+        for res in driver.run(tus):
+            assert res.tu.file.endswith('fast.c')
+            raise ValueError
+
+    # the running ones are killed, the pending ones are not started
+    assert time.monotonic() - start < 10
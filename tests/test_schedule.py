@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from pyclang.runner import TranslationUnit
+from pyclang.schedule import DurationHistory, estimate_costs, longest_first, partition
+
+
+def _tu(tmp_path, name, size):
+    (tmp_path / name).write_text('x' * size)
+    return TranslationUnit(str(tmp_path / name), str(tmp_path / 'build'), str(tmp_path))
+
+
+def test_estimate_costs_without_history(tmp_path):
+    tus = [_tu(tmp_path, 'a.c', 100), _tu(tmp_path, 'b.c', 0)]
+    missing = TranslationUnit(str(tmp_path / 'missing.c'), str(tmp_path / 'build'), str(tmp_path))
+
+    assert estimate_costs([*tus, missing]) == {tus[0]: 100, tus[1]: 1, missing: 1}
+
+
+def test_estimate_costs_scaled_by_the_history(tmp_path):
+    known, unknown = _tu(tmp_path, 'known.c', 100), _tu(tmp_path, 'unknown.c', 300)
+    history = DurationHistory(str(tmp_path / 'durations.json'), str(tmp_path))
+    history.update(known, 2.0)
+
+    assert estimate_costs([known, unknown], history) == {known: 2.0, unknown: pytest.approx(6.0)}
+
+
+def test_history_is_saved(tmp_path):
+    tu = _tu(tmp_path, 'a.c', 1)
+    history = DurationHistory(str(tmp_path / 'cache' / 'durations.json'), str(tmp_path))
+    history.update(tu, 1.23456)
+    history.save()
+
+    assert DurationHistory(str(tmp_path / 'cache' / 'durations.json'), str(tmp_path)).get(tu) == 1.235
+
+
+def test_partition_balances_the_costs(tmp_path):
+    costs = {_tu(tmp_path, f'{i}.c', 1): cost for i, cost in enumerate((1, 5, 3, 4, 2, 3))}
+    parts = partition(costs, 3)
+
+    assert sorted(p for part in parts for p in part) == sorted(costs)
+    assert sorted(sum(costs[tu] for tu in part) for part in parts) == [6, 6, 6]
+
+
+def test_partition_ignores_the_iteration_order(tmp_path):
+    costs = {_tu(tmp_path, f'{i}.c', 1): cost for i, cost in enumerate((3, 3, 2, 2, 1, 1, 1))}
+    items = list(costs.items())
+    random.Random(0).shuffle(items)
+
+    assert partition(dict(items), 2) == partition(costs, 2)
+
+
+def test_longest_first(tmp_path):
+    a, b, c = (_tu(tmp_path, name, 1) for name in ('a.c', 'b.c', 'c.c'))
+
+    # ties are broken by the path
+    assert longest_first({c: 1.0, b: 2.0, a: 1.0}) == [b, a, c]
@@ -0,0 +1,67 @@
+import pytest
+
+from pyclang.diagnostics import Diagnostic
+from pyclang.store import ResultsStore
+
+DIAGS = [
+    Diagnostic('components/wifi/wifi.c', 10, 3, 'warning', 'foo', 'bugprone-branch-clone', ('  if (a)', '  ^')),
+    Diagnostic('components/wifi/wifi.c', 2, 1, 'warning', 'bar', 'readability-else-after-return'),
+    Diagnostic('components/wifi_prov/prov.c', 5, 1, 'error', 'baz', 'clang-diagnostic-error'),
+    Diagnostic('main/main.c', 1, 1, 'warning', 'qux', 'bugprone-narrowing-conversions', tu_count=4),
+    Diagnostic('main/main.c', 7, 1, 'warning', 'no check', ''),
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    with ResultsStore(str(tmp_path / 'results.db')) as _store:
+        assert _store.add(DIAGS) == len(DIAGS)
+        yield _store
+
+
+def test_query_all_sorted_by_location(store):
+    assert list(store.query()) == sorted(DIAGS, key=lambda d: (d.path, d.line, d.col))
+
+
+@pytest.mark.parametrize(
+    'kwargs, expected',
+    [
+        ({'check': 'bugprone-*'}, [DIAGS[0], DIAGS[3]]),
+        ({'check': 'bugprone-branch-clone'}, [DIAGS[0]]),
+        ({'check': '*-error'}, [DIAGS[2]]),
+        # a directory matches the files under it, not the ones sharing the prefix
+        ({'path': 'components/wifi'}, [DIAGS[1], DIAGS[0]]),
+        ({'path': 'components/wifi/'}, [DIAGS[1], DIAGS[0]]),
+        ({'path': 'main/main.c'}, [DIAGS[3], DIAGS[4]]),
+        ({'severity': 'error'}, [DIAGS[2]]),
+        ({'check': 'bugprone-*', 'path': 'main'}, [DIAGS[3]]),
+    ],
+)
+def test_query(store, kwargs, expected):
+    assert list(store.query(**kwargs)) == expected
+
+
+def test_count(store):
+    assert store.count(path='components') == {
+        'bugprone-branch-clone': 1,
+        'readability-else-after-return': 1,
+        'clang-diagnostic-error': 1,
+    }
+    assert store.count(check='bugprone-*', severity='error') == {}
+
+
+def test_set_tu_counts(store):
+    store.set_tu_counts({DIAGS[0].fingerprint: 3})
+
+    assert [d.tu_count for d in store.query(path='components/wifi')] == [1, 3]
+
+
+def test_batched(tmp_path):
+    with ResultsStore(str(tmp_path / 'results.db')) as store:
+        with store.batched(batch_size=2) as add:
+            for diag in DIAGS:
+                add(diag)
+            # the full batches are inserted while streaming
+            assert len(list(store.query())) == 4
+
+        assert len(list(store.query())) == len(DIAGS)
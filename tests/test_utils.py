@@ -0,0 +1,93 @@
+import os
+import shlex
+
+import pytest
+
+from pyclang.utils import PathPrefixIndex, _BoundedBuffer, get_command_args, resolve_file, split_command, to_path
+
+
+def test_resolve_file_resolves_the_dir_only(tmp_path):
+    (tmp_path / 'real').mkdir()
+    os.symlink(str(tmp_path / 'real'), str(tmp_path / 'link'))
+    (tmp_path / 'real' / 'main.c').write_text('')
+    os.symlink(str(tmp_path / 'real' / 'main.c'), str(tmp_path / 'real' / 'main_link.c'))
+
+    assert resolve_file(str(tmp_path / 'link' / 'main.c')) == str(to_path(str(tmp_path / 'link' / 'main.c')))
+    # the file itself is not resolved
+    assert resolve_file(str(tmp_path / 'link' / 'main_link.c')) == str(tmp_path.resolve() / 'real' / 'main_link.c')
+
+
+def test_path_prefix_index():
+    index = PathPrefixIndex(['/src/components', '/src/main'])
+
+    assert index
+    assert index.contains('/src/components/foo/bar.c')
+    assert index.contains('/src/main/main.c')
+    # shares the prefix, but not under the dir
+    assert not index.contains('/src/components_extra/foo.c')
+    assert not index.contains('/src/main.c')
+    assert not index.contains('/other/main/main.c')
+
+
+def test_empty_path_prefix_index():
+    index = PathPrefixIndex([])
+
+    assert not index
+    assert not index.contains('/src/main.c')
+
+
+@pytest.mark.parametrize(
+    'cmd',
+    [
+        'gcc -DFOO=1 -Iinclude -c main.c',
+        'gcc  -c\tmain.c ',
+        'gcc -DSTR=\\"foo\\" -DCHAR="\'a\'" -c main.c',
+        "gcc '-DSTR=\"foo\"' -c main.c",
+        # quoted strings with whitespace
+        'gcc -DSTR="foo bar" -c main.c',
+        "gcc '-DA=a  b' -c 'my file.c'",
+        'gcc -DPATH=C:\\\\dir -c main.c',
+    ],
+)
+def test_split_command_same_as_shlex(cmd):
+    assert split_command(cmd) == shlex.split(cmd)
+
+
+def test_get_command_args():
+    assert get_command_args({'arguments': ['gcc', '-c', 'main.c'], 'command': 'ignored'}) == ['gcc', '-c', 'main.c']
+    assert get_command_args({'command': 'gcc -DSTR="foo bar" -c main.c'}) == ['gcc', '-DSTR=foo bar', '-c', 'main.c']
+
+
+def test_bounded_buffer_keeps_the_head_and_the_tail():
+    buffer = _BoundedBuffer(8)
+    for chunk in (b'abc', b'defgh', b'ijklmn'):
+        buffer.write(chunk)
+
+    assert (bytes(buffer.head), bytes(buffer.tail), buffer.dropped) == (b'abcd', b'klmn', 6)
+    assert buffer.getvalue() == 'abcd\n... 6 bytes truncated ...\nklmn'
+
+
+def test_bounded_buffer_under_the_limit():
+    buffer = _BoundedBuffer(8)
+    buffer.write(b'abc')
+    buffer.write(b'de')
+
+    assert buffer.getvalue() == 'abcde'
+
+
+def test_bounded_buffer_finds_the_needle_in_the_dropped_bytes():
+    buffer = _BoundedBuffer(8, 'AssertionError')
+    for chunk in (b'x' * 10, b'AssertionError: foo', b'y' * 10):
+        buffer.write(chunk)
+
+    assert 'AssertionError' not in buffer.getvalue()
+    assert buffer.found
+
+
+def test_bounded_buffer_finds_the_needle_split_between_chunks():
+    buffer = _BoundedBuffer(1024, 'AssertionError')
+    # the middle chunk is shorter than the needle
+    for chunk in (b'xx Assert', b'ionE', b'rror: No existing files'):
+        buffer.write(chunk)
+
+    assert buffer.found